@@ -0,0 +1,4 @@
+"""Performance benchmarks of pydoca.
+
+Run with `python -m benchmarks`, see `python -m benchmarks --help`.
+"""
@@ -0,0 +1,54 @@
+"""Runs the benchmarks and outputs JSON results.
+
+python -m benchmarks --output before.json
+python -m benchmarks --output after.json --compare before.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+from . import bench_budget as bench_budget  # noqa: F401  Registers the benchmarks
+from . import bench_codec as bench_codec  # noqa: F401
+from . import bench_core as bench_core  # noqa: F401
+from . import bench_inmemory as bench_inmemory  # noqa: F401
+from . import bench_memory as bench_memory  # noqa: F401
+from . import bench_sqlite as bench_sqlite  # noqa: F401
+from .runner import compare, load, run
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "selected", nargs="*", help="Only run benchmarks containing these strings"
+    )
+    parser.add_argument("--output", "-o", help="JSON results file, stdout if not set")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="Seconds per repeat"
+    )
+    parser.add_argument("--compare", help="Baseline JSON results file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Median time ratio increase considered a regression",
+    )
+    args = parser.parse_args()
+
+    results = run(args.selected, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+    if args.compare:
+        regressions = compare(load(args.compare), results, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""End-to-end benchmarks of the budget reference application, driven in-process."""
+import decimal
+import itertools
+import logging
+
+import pydoca
+
+from .runner import Operation, benchmark
+
+# Importing the application bootstraps it and configures a DEBUG root logger
+import tests.integration.test_app.budget as budget  # isort: skip
+import tests.integration.test_app.budget.application as application  # isort: skip
+import tests.integration.test_app.budget.domain as domain  # isort: skip
+import tests.integration.test_app.budget.providers.inmemory_budget_repo as inmemory  # isort: skip
+
+logging.getLogger().setLevel(logging.WARNING)
+
+OPERATIONS = [
+    application.add_to_budget.Operation(
+        source=f"source {i}",
+        frequency=domain.FrequencyPerYear.MONTHLY,
+        amount=decimal.Decimal(100 + i),
+        type="income" if i % 2 else "expense",
+    )
+    for i in range(10)
+]
+
+
+def _bootstrap() -> None:
+    pydoca.unfreeze()
+    pydoca.bootstrap(adapters_config=budget.Configuration)
+    inmemory.BudgetDatabase.drop()
+
+
+def _store(budget: domain.Budget) -> None:
+    repo = inmemory.InMemoryBudgetRepo()
+    repo.store(budget)
+    budget.version = 1  # As the unit of work does
+    repo.session.commit()
+
+
+@benchmark("budget.create_budget")
+def create_budget() -> Operation:
+    _bootstrap()
+    titles = (f"budget {i}" for i in itertools.count())
+
+    def operation() -> None:
+        application.CreateBudget().exec(
+            application.CreateBudgetCmd(
+                budget_title=next(titles), budget_currency=domain.Currency.CAD
+            )
+        )
+
+    return operation
+
+
+@benchmark("budget.add_to_budget.10_operations")
+def add_to_budget() -> Operation:
+    _bootstrap()
+    titles = (f"budget {i}" for i in itertools.count())
+
+    def operation() -> None:
+        title = next(titles)
+        _store(domain.Budget(title=title, currency=domain.Currency.CAD))
+        application.AddToBudget().exec(
+            application.AddToBudgetCmd(budget_id=title, operations=OPERATIONS)
+        )
+
+    return operation
+
+
+@benchmark("budget.add_to_budget.idempotent_retry")
+def add_to_budget_retry() -> Operation:
+    """A client retry of an executed command, answered from the result store."""
+    _bootstrap()
+    _store(domain.Budget(title="retried", currency=domain.Currency.CAD))
+    cmd = application.AddToBudgetCmd(
+        budget_id="retried", operations=OPERATIONS, idempotency_key="retry"
+    )
+    application.AddToBudget().exec(cmd)
+    return lambda: application.AddToBudget().exec(cmd)
+
+
+@benchmark("budget.calculate_cashflow.10_operations")
+def calculate_cashflow() -> Operation:
+    _bootstrap()
+    application.CreateBudget().exec(
+        application.CreateBudgetCmd(
+            budget_title="budget", budget_currency=domain.Currency.CAD
+        )
+    )
+    application.AddToBudget().exec(
+        application.AddToBudgetCmd(budget_id="budget", operations=OPERATIONS)
+    )
+    cmd = application.CalculateCashflowCmd(
+        budget_id="budget", currency=domain.Currency.USD
+    )
+    return lambda: application.CalculateCashFlow().exec(cmd)
+
+
+@benchmark("budget.load_scenario")
+def load_scenario() -> Operation:
+    """A request mix: one budget creation, one addition and ten cash flow reads."""
+    _bootstrap()
+    titles = (f"budget {i}" for i in itertools.count())
+
+    def operation() -> None:
+        title = next(titles)
+        application.CreateBudget().exec(
+            application.CreateBudgetCmd(
+                budget_title=title, budget_currency=domain.Currency.CAD
+            )
+        )
+        application.AddToBudget().exec(
+            application.AddToBudgetCmd(budget_id=title, operations=OPERATIONS)
+        )
+        cmd = application.CalculateCashflowCmd(
+            budget_id=title, currency=domain.Currency.EUR
+        )
+        for _ in range(10):
+            application.CalculateCashFlow().exec(cmd)
+
+    return operation
@@ -0,0 +1,47 @@
+"""Save and load throughput of a large Budget, with its codec and with pydantic JSON serialization."""
+import decimal
+
+import pydoca
+
+from .runner import Operation, benchmark
+
+import tests.integration.test_app.budget.domain as domain  # isort: skip
+
+
+def _large_budget() -> domain.Budget:
+    budget = domain.Budget(title="large", currency=domain.Currency.CAD)
+    for i in range(1000):
+        budget.add_income(
+            f"income {i}", domain.FrequencyPerYear.MONTHLY, decimal.Decimal(i) / 4
+        )
+        budget.add_expense(
+            f"expense {i}", domain.FrequencyPerYear.WEEKLY, decimal.Decimal(i) / 8
+        )
+    budget.clear_events()
+    return budget
+
+
+@benchmark("codec.budget.encode.2000_entities")
+def codec_encode() -> Operation:
+    budget = _large_budget()
+    codec = pydoca.codec(domain.Budget)
+    return lambda: codec.encode(budget)
+
+
+@benchmark("codec.budget.decode.2000_entities")
+def codec_decode() -> Operation:
+    codec = pydoca.codec(domain.Budget)
+    data = codec.encode(_large_budget())
+    return lambda: codec.decode(data)
+
+
+@benchmark("codec.budget.model_dump_json.2000_entities")
+def model_dump_json() -> Operation:
+    budget = _large_budget()
+    return budget.model_dump_json
+
+
+@benchmark("codec.budget.model_validate_json.2000_entities")
+def model_validate_json() -> Operation:
+    data = _large_budget().model_dump_json()
+    return lambda: domain.Budget.model_validate_json(data)
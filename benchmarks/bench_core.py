@@ -0,0 +1,387 @@
+"""Benchmarks of pydoca core primitives, isolated from any real adapter."""
+import abc
+import functools
+import itertools
+import time
+from typing import Any, Callable, Self
+
+import pydoca
+from pydoca import ID
+
+from .runner import Operation, benchmark
+
+
+class Tire(pydoca.Entity):
+    reference: str
+    position: str
+    wear: float = 1.0
+
+    def _id(self) -> ID:
+        return f"{self.reference}-{self.position}"
+
+
+class Dimensions(pydoca.ValueObject):
+    width: int
+    ratio: int
+    diameter: int
+
+
+class TireChanged(pydoca.Event):
+    position: str
+    reference: str
+
+
+class Car(pydoca.AggregateRoot):
+    vin: str
+    tires: list[Tire] = []
+
+    def _id(self) -> ID:
+        return self.vin
+
+
+class CarRepo(pydoca.Repository):
+    @abc.abstractmethod
+    def save(self, car: Car) -> None:
+        """Saves the car."""
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        """Counts the cars."""
+
+
+class NullSession(pydoca.Session):
+    @classmethod
+    def start(cls) -> Self:
+        return cls()
+
+    @classmethod
+    def url(cls) -> str:
+        return "//null"
+
+    def commit(self) -> None:
+        return
+
+    def rollback(self) -> None:
+        return
+
+
+class NullCarRepo(CarRepo):
+    sessionT = NullSession
+
+    def save(self, car: Car) -> None:
+        return
+
+    def count(self) -> int:
+        return 0
+
+
+class Notifier(pydoca.Service):
+    @abc.abstractmethod
+    def notify(self) -> None:
+        """Notifies."""
+
+
+class NullNotifier(Notifier):
+    def notify(self) -> None:
+        return
+
+
+class NoDependency(pydoca.UseCase):
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+class WithDependency(pydoca.UseCase):
+    notifier: Notifier
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+class WithUnitOfWork(pydoca.UseCase):
+    class UnitOfWork:
+        car_repo: CarRepo
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+class Ping(pydoca.Command):
+    pass
+
+
+class Pong(pydoca.Command):
+    pass
+
+
+class PingUseCase(pydoca.UseCase):
+    def exec(self, cmd: Ping) -> None:
+        return
+
+
+class PassThrough(pydoca.Middleware):
+    def __call__(
+        self, use_case: Any, cmd: pydoca.Command, call_next: Callable[..., Any]
+    ) -> Any:
+        return call_next(use_case, cmd)
+
+
+class PongOnly(PassThrough):
+    __commands__ = (Pong,)
+
+
+def _bind() -> None:
+    pydoca.set_middlewares([])
+    pydoca.set_profiler(None)
+    pydoca.unfreeze()
+    pydoca.bind(CarRepo, NullCarRepo)
+    pydoca.bind(Notifier, NullNotifier)
+
+
+@benchmark("core.entity.construct")
+def entity_construct() -> Operation:
+    return lambda: Tire(reference="michelin", position="front-left")
+
+
+@benchmark("core.value_object.construct")
+def value_object_construct() -> Operation:
+    return lambda: Dimensions(width=205, ratio=55, diameter=16)
+
+
+@benchmark("core.event.construct")
+def event_construct() -> Operation:
+    return lambda: TireChanged(position="front-left", reference="michelin")
+
+
+@benchmark("core.entity.eq")
+def entity_eq() -> Operation:
+    tire1 = Tire(reference="michelin", position="front-left")
+    tire2 = Tire(reference="michelin", position="front-left")
+    return lambda: tire1 == tire2
+
+
+@benchmark("core.entity.hash")
+def entity_hash() -> Operation:
+    tire = Tire(reference="michelin", position="front-left")
+    return lambda: hash(tire)
+
+
+@benchmark("core.inject.factory")
+def inject_factory() -> Operation:
+    _bind()
+    return lambda: pydoca.inject(Notifier)
+
+
+@benchmark("core.inject.instance")
+def inject_instance() -> Operation:
+    _bind()
+    pydoca.bind(Notifier, NullNotifier())
+    return lambda: pydoca.inject(Notifier)
+
+
+@benchmark("core.inject.frozen_singleton")
+def inject_frozen_singleton() -> Operation:
+    _bind()
+    pydoca.freeze(singletons=[Notifier])
+
+    def operation() -> None:
+        pydoca.inject(Notifier)
+
+    return operation
+
+
+@benchmark("core.use_case.construct.no_dependency")
+def use_case_no_dependency() -> Operation:
+    _bind()
+    return NoDependency
+
+
+@benchmark("core.use_case.construct.with_dependency")
+def use_case_with_dependency() -> Operation:
+    _bind()
+    return WithDependency
+
+
+@benchmark("core.use_case.exec.no_middleware")
+def use_case_exec() -> Operation:
+    _bind()
+    use_case, cmd = PingUseCase(), Ping()
+    return lambda: use_case.exec(cmd)
+
+
+@benchmark("core.use_case.exec.filtered_middlewares.3")
+def use_case_exec_filtered_middlewares() -> Operation:
+    _bind()
+    pydoca.set_middlewares([PongOnly(), PongOnly(), PongOnly()])
+    use_case, cmd = PingUseCase(), Ping()
+    return lambda: use_case.exec(cmd)
+
+
+@benchmark("core.use_case.exec.middlewares.3")
+def use_case_exec_middlewares() -> Operation:
+    _bind()
+    pydoca.set_middlewares([PassThrough(), PassThrough(), PassThrough()])
+    use_case, cmd = PingUseCase(), Ping()
+    return lambda: use_case.exec(cmd)
+
+
+@benchmark("core.use_case.exec.profiled.0.001")
+def use_case_exec_profiled() -> Operation:
+    # 1 call in 1000 sampled, stacks only
+    _bind()
+    pydoca.set_profiler(pydoca.Profiler(rate=0.001))
+    use_case, cmd = PingUseCase(), Ping()
+    return lambda: use_case.exec(cmd)
+
+
+@benchmark("core.use_case.exec.hand_wrapped.3")
+def use_case_exec_hand_wrapped() -> Operation:
+    # Wrapping decorators, as actors did before middlewares
+    _bind()
+
+    def wrap(func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    use_case, cmd = PingUseCase(), Ping()
+    exec = wrap(wrap(wrap(use_case.exec)))
+    return lambda: exec(cmd)
+
+
+@benchmark("core.uow.construct")
+def uow_construct() -> Operation:
+    _bind()
+    use_case = WithUnitOfWork()
+    return lambda: use_case.uow
+
+
+@benchmark("core.uow.enter_commit")
+def uow_enter_commit() -> Operation:
+    _bind()
+    use_case = WithUnitOfWork()
+
+    def operation() -> None:
+        with use_case.uow:
+            pass
+
+    return operation
+
+
+@benchmark("core.repository.untracked_call")
+def repository_untracked_call() -> Operation:
+    _bind()
+    return NullCarRepo().count
+
+
+@benchmark("core.repository.track_events")
+def repository_track_events() -> Operation:
+    _bind()
+    repo = NullCarRepo()
+    car = Car(vin="vin")
+    event = TireChanged(position="front-left", reference="michelin")
+
+    def operation() -> None:
+        car.add_event(event)
+        repo.save(car)
+        repo.events.clear()
+
+    return operation
+
+
+@benchmark("core.event_bus.publish_drain.100")
+def event_bus_publish() -> Operation:
+    events = [TireChanged(position="front-left", reference=str(i)) for i in range(100)]
+
+    def operation() -> None:
+        pydoca.EventBus.publish_events(iter(events))
+        for _ in itertools.repeat(None, len(events)):
+            pydoca.EventBus.get_event()
+
+    return operation
+
+
+class TiresChanged(pydoca.Event):
+    references: list[str]
+
+
+class MergedTireChanged(pydoca.Event):
+    __compaction__ = pydoca.Merge(
+        lambda events: TiresChanged(references=[e.reference for e in events])
+    )
+    position: str
+    reference: str
+
+
+def _drain(events: list[pydoca.Event]) -> None:
+    pydoca.EventBus.publish_events(iter(events))
+    while pydoca.EventBus.get_event():
+        pass
+
+
+@benchmark("core.event_bus.publish_drain.1000")
+def event_bus_publish_1000() -> Operation:
+    events: list[pydoca.Event] = [
+        TireChanged(position="front-left", reference=str(i), aggregate_id="vin")
+        for i in range(1000)
+    ]
+    return lambda: _drain(events)
+
+
+@benchmark("core.event_bus.compact_publish_drain.1000")
+def event_bus_compact_publish_1000() -> Operation:
+    # 1000 events merged into one before publish
+    events: list[pydoca.Event] = [
+        MergedTireChanged(position="front-left", reference=str(i), aggregate_id="vin")
+        for i in range(1000)
+    ]
+    return lambda: _drain(list(pydoca.compact_events(events)))
+
+
+def _consume(workers: int) -> Operation:
+    # 200 events of 50 aggregates, handlers waiting on I/O (releasing the GIL)
+    events: list[pydoca.Event] = [
+        TireChanged(position="front-left", reference=str(i), aggregate_id=str(i % 50))
+        for i in range(200)
+    ]
+    consumer = pydoca.PartitionedConsumer(
+        lambda event: time.sleep(0.0001), lanes=16, workers=workers
+    )
+    consumer.start()
+
+    def operation() -> None:
+        consumer.submit(events)
+        consumer.join()
+
+    return operation
+
+
+@benchmark("core.consumer.io_bound.workers.1")
+def consumer_1_worker() -> Operation:
+    return _consume(1)
+
+
+@benchmark("core.consumer.io_bound.workers.4")
+def consumer_4_workers() -> Operation:
+    return _consume(4)
+
+
+def _tires() -> list[Tire]:
+    return [
+        Tire(reference=str(i), position="front-left", wear=i / 100_000)
+        for i in range(100_000)
+    ]
+
+
+@benchmark("core.entity_list.sum.100000")
+def entity_list_sum() -> Operation:
+    tires = pydoca.EntityList(_tires())
+    return lambda: tires.sum("wear")
+
+
+@benchmark("core.list.loop_sum.100000")
+def list_loop_sum() -> Operation:
+    tires = _tires()
+    return lambda: sum(tire.wear for tire in tires)
@@ -0,0 +1,161 @@
+"""Queries of the in-memory repository, with secondary indexes and with linear scans of the rows.
+
+Sizes are set by the PYDOCA_BENCH_INMEMORY_SIZES environment variable (default: 100000,1000000). Each size
+is stored once for all its benchmarks, 10000000 accounts need about 4GB.
+"""
+import functools
+import os
+import random
+import tempfile
+
+import pydoca
+
+from .runner import Operation, benchmark
+
+SIZES = [
+    int(size)
+    for size in os.environ.get("PYDOCA_BENCH_INMEMORY_SIZES", "100000,1000000").split(
+        ","
+    )
+]
+
+REGIONS = 1000
+
+
+class Account(pydoca.AggregateRoot):
+    number: int
+    region: str
+    opened: int
+
+    def _id(self) -> int:
+        return self.number
+
+
+class BenchDatabase(pydoca.InMemorySession):
+    database = "bench"
+
+
+class AccountRepo(pydoca.InMemoryRepository[Account]):
+    sessionT = BenchDatabase
+    aggregateT = Account
+    __indexes__ = {"region": pydoca.HASH, "opened": pydoca.SORTED}
+
+
+@functools.cache
+def _repo(size: int) -> AccountRepo:
+    class SizedDatabase(BenchDatabase):
+        database = f"bench-{size}"
+
+    class SizedAccountRepo(AccountRepo):
+        sessionT = SizedDatabase
+
+    repo = SizedAccountRepo()
+    for account in _accounts(size):
+        repo.store(account)
+        account.version = 1
+    repo.session.commit()
+    repo.reset()
+    return repo
+
+
+def _accounts(size: int) -> list[Account]:
+    rng = random.Random(size)
+    return [
+        Account(
+            number=number,
+            region=f"region-{rng.randrange(REGIONS)}",
+            opened=rng.randrange(size),
+        )
+        for number in range(size)
+    ]
+
+
+def _scan(repo: AccountRepo, field: str, start: int, stop: int) -> list[Account]:
+    # Best linear scan: compares the row values, only decodes the matching rows
+    index = pydoca.codec(Account).fields.index(field)
+    load = pydoca.codec(Account).load
+    return [
+        load(version.row)
+        for version in repo._table().rows.values()
+        if start <= version.row[index] < stop
+    ]
+
+
+def _register(size: int) -> None:
+    # About 0.1% of the accounts
+    region = "region-7"
+    start, stop = size // 2, size // 2 + size // REGIONS
+
+    @benchmark(f"inmemory.find.hash_index.{size}")
+    def find_indexed() -> Operation:
+        repo = _repo(size)
+        return lambda: repo.find("region", region)
+
+    @benchmark(f"inmemory.find.scan.{size}")
+    def find_scan() -> Operation:
+        repo = _repo(size)
+        return lambda: repo._rows(list(repo._table().rows), {"region": region})
+
+    @benchmark(f"inmemory.range.sorted_index.{size}")
+    def range_indexed() -> Operation:
+        repo = _repo(size)
+        return lambda: repo.range("opened", start, stop)
+
+    @benchmark(f"inmemory.range.scan.{size}")
+    def range_scan() -> Operation:
+        repo = _repo(size)
+        return lambda: _scan(repo, "opened", start, stop)
+
+    @benchmark(f"inmemory.commit.indexed.{size}")
+    def commit() -> Operation:
+        repo = _repo(size)
+        accounts = [repo.load(number) for number in range(0, size, size // 100)]
+
+        def operation() -> None:
+            for account in accounts:
+                assert account is not None
+                account.opened = (account.opened + 1) % size
+                repo.store(account)
+                account.version += 1  # As the unit of work does
+            repo.session.commit()
+            repo.reset()
+
+        return operation
+
+    # Restart of a process serving the accounts, until it answers its first read
+    class RestartDatabase(BenchDatabase):
+        database = f"bench-restart-{size}"
+
+    class RestartAccountRepo(pydoca.InMemoryRepository[Account]):
+        sessionT = RestartDatabase
+        aggregateT = Account
+
+    @benchmark(f"inmemory.restart.replay.{size}")
+    def restart_replay() -> Operation:
+        accounts = _accounts(size)
+
+        def operation() -> None:
+            RestartDatabase.drop()
+            repo = RestartAccountRepo()
+            for account in accounts:
+                repo.store(account)
+            repo.session.commit()
+            assert repo.load(0) is not None
+
+        return operation
+
+    @benchmark(f"inmemory.restart.snapshot.{size}")
+    def restart_snapshot() -> Operation:
+        path = os.path.join(tempfile.mkdtemp(prefix="pydoca-bench-"), "bench.snapshot")
+        repo = _repo(size)
+        pydoca.save_snapshot(repo.sessionT, path)
+
+        def operation() -> None:
+            pydoca.load_snapshot(RestartDatabase, path)
+            assert RestartAccountRepo().load(0) is not None
+
+        return operation
+
+
+for _size in SIZES:
+    _register(_size)
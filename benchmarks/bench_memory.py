@@ -0,0 +1,69 @@
+"""Memory used per instance, measured with tracemalloc, of default and compact domain objects.
+
+Measure values are in bytes per instance.
+"""
+import decimal
+from typing import Callable
+
+import pydoca
+
+from .runner import bytes_per_instance, measure
+
+
+class Income(pydoca.Entity):
+    source: str
+    frequency: int
+    amount: decimal.Decimal
+
+    def _id(self) -> str:
+        return self.source.lower()
+
+
+class CompactIncome(pydoca.CompactEntity):
+    source: str
+    frequency: int
+    amount: decimal.Decimal
+
+    def _id(self) -> str:
+        return self.source.lower()
+
+
+class Budget(pydoca.AggregateRoot):
+    title: str
+
+    def _id(self) -> str:
+        return self.title.lower()
+
+
+class CompactBudget(pydoca.CompactAggregateRoot):
+    title: str
+
+    def _id(self) -> str:
+        return self.title.lower()
+
+
+AMOUNT = decimal.Decimal("1000.00")
+
+
+def _income(cls: type[pydoca.Entity]) -> Callable[[], pydoca.Entity]:
+    return lambda: cls(source="work", frequency=12, amount=AMOUNT)
+
+
+@measure("memory.entity.default")
+def entity_default() -> dict[str, float]:
+    return {"value": bytes_per_instance(_income(Income))}
+
+
+@measure("memory.entity.compact")
+def entity_compact() -> dict[str, float]:
+    return {"value": bytes_per_instance(_income(CompactIncome))}
+
+
+@measure("memory.aggregate_root.default")
+def aggregate_root_default() -> dict[str, float]:
+    return {"value": bytes_per_instance(lambda: Budget(title="budget"))}
+
+
+@measure("memory.aggregate_root.compact")
+def aggregate_root_compact() -> dict[str, float]:
+    return {"value": bytes_per_instance(lambda: CompactBudget(title="budget"))}
@@ -0,0 +1,152 @@
+"""Benchmarks of the SQLite adapters on a temporary database file, the baseline of a real store."""
+import itertools
+import os
+import tempfile
+import threading
+
+import pydoca
+
+from .bench_core import Car, CarRepo, Tire
+from .runner import Operation, benchmark
+
+
+class BenchDatabase(pydoca.SQLiteSession):
+    database = os.path.join(tempfile.mkdtemp(prefix="pydoca-bench-"), "bench.db")
+
+
+class SQLiteCarRepo(pydoca.SQLiteRepository[Car], CarRepo):
+    sessionT = BenchDatabase
+    aggregateT = Car
+
+    def save(self, car: Car) -> None:
+        self.store(car)
+
+
+class SaveCars(pydoca.UseCase):
+    class UnitOfWork:
+        car_repo: CarRepo
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+def _bind() -> None:
+    pydoca.unfreeze()
+    pydoca.bind(CarRepo, SQLiteCarRepo)
+
+
+def _car(vin: str) -> Car:
+    return Car(
+        vin=vin,
+        tires=[Tire(reference="michelin", position=str(i)) for i in range(4)],
+    )
+
+
+@benchmark("sqlite.uow.insert.100")
+def uow_insert() -> Operation:
+    _bind()
+    vins = (f"insert-{i}" for i in itertools.count())
+    use_case = SaveCars()
+
+    def operation() -> None:
+        with use_case.uow as uow:
+            for _ in range(100):
+                uow.car_repo.save(_car(next(vins)))
+
+    return operation
+
+
+@benchmark("sqlite.uow.load_update")
+def uow_load_update() -> Operation:
+    _bind()
+    use_case = SaveCars()
+    with use_case.uow as uow:
+        uow.car_repo.save(_car("update"))
+
+    def operation() -> None:
+        with use_case.uow as uow:
+            uow.car_repo.save(uow.car_repo.load("update"))
+
+    return operation
+
+
+@benchmark("sqlite.repository.load")
+def repository_load() -> Operation:
+    _bind()
+    use_case = SaveCars()
+    with use_case.uow as uow:
+        uow.car_repo.save(_car("load"))
+    repo = SQLiteCarRepo()
+    return lambda: repo.load("load")
+
+
+class CachedSQLiteCarRepo(SQLiteCarRepo):
+    __cache__ = pydoca.AggregateCache(maxsize=1000)
+
+
+@benchmark("sqlite.repository.load.cached")
+def repository_load_cached() -> Operation:
+    """Hot aggregate answered by the aggregate cache, a copy decoded from its encoded row."""
+    _bind()
+    use_case = SaveCars()
+    with use_case.uow as uow:
+        uow.car_repo.save(_car("cached"))
+    repo = CachedSQLiteCarRepo()
+    repo.load("cached")
+    return lambda: repo.load("cached")
+
+
+class DurableDatabase(BenchDatabase):
+    database = os.path.join(os.path.dirname(BenchDatabase.database), "durable.db")
+    __synchronous__ = "FULL"
+
+
+class DurableCarRepo(SQLiteCarRepo):
+    sessionT = DurableDatabase
+
+
+class GroupCommitDatabase(DurableDatabase):
+    database = os.path.join(os.path.dirname(BenchDatabase.database), "group.db")
+    __group_commit__ = pydoca.GroupCommit()
+
+
+class GroupCommitCarRepo(SQLiteCarRepo):
+    sessionT = GroupCommitDatabase
+
+
+def _concurrent_commits(repo: type[SQLiteCarRepo]) -> Operation:
+    """8 threads committing 25 units of work each, updating their own car, synced to disk."""
+    pydoca.unfreeze()
+    pydoca.bind(CarRepo, repo)
+    use_case = SaveCars()
+    with use_case.uow as uow:
+        for thread in range(8):
+            uow.car_repo.save(_car(f"thread-{thread}"))
+
+    def commits(vin: str) -> None:
+        for _ in range(25):
+            with use_case.uow as uow:
+                uow.car_repo.save(uow.car_repo.load(vin))
+        repo.sessionT.close()
+
+    def operation() -> None:
+        threads = [
+            threading.Thread(target=commits, args=(f"thread-{thread}",))
+            for thread in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return operation
+
+
+@benchmark("sqlite.uow.concurrent_commits.200.per_request")
+def concurrent_commits() -> Operation:
+    return _concurrent_commits(DurableCarRepo)
+
+
+@benchmark("sqlite.uow.concurrent_commits.200.group_commit")
+def concurrent_group_commits() -> Operation:
+    return _concurrent_commits(GroupCommitCarRepo)
@@ -0,0 +1,162 @@
+"""Benchmarks registry, runner and comparison of results across commits."""
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Optional
+
+Operation = Callable[[], Any]
+BenchmarkFactory = Callable[[], Operation]
+
+Measure = Callable[[], dict[str, float]]
+
+_BENCHMARKS: dict[str, BenchmarkFactory] = {}
+_MEASURES: dict[str, Measure] = {}
+
+
+def benchmark(name: str) -> Callable[[BenchmarkFactory], BenchmarkFactory]:
+    """Registers a benchmark.
+
+    The decorated function does the setup and returns the operation to time, called without arguments.
+
+    @benchmark("entity.construct")
+    def entity_construct() -> Operation:
+        return lambda: Wheel(reference="ref", position="front")
+    """
+
+    def decorator(factory: BenchmarkFactory) -> BenchmarkFactory:
+        if name in _BENCHMARKS:
+            raise ValueError(f"Benchmark {name} already registered")
+        _BENCHMARKS[name] = factory
+        return factory
+
+    return decorator
+
+
+def measure(name: str) -> Callable[[Measure], Measure]:
+    """Registers a measure, a function returning metrics other than timings (e.g. memory usage).
+
+    Measures regress when their `value` metric increases more than the threshold.
+    """
+
+    def decorator(func: Measure) -> Measure:
+        if name in _MEASURES:
+            raise ValueError(f"Measure {name} already registered")
+        _MEASURES[name] = func
+        return func
+
+    return decorator
+
+
+def benchmarks() -> dict[str, BenchmarkFactory]:
+    return dict(_BENCHMARKS)
+
+
+def bytes_per_instance(factory: Callable[[], Any], number: int = 10_000) -> float:
+    """Measures with tracemalloc the memory allocated per instance returned by the factory."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [factory() for _ in range(number)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # Do not count the list holding the instances
+    return (after - before - sys.getsizeof(instances)) / len(instances)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_operation(
+    operation: Operation, repeat: int = 5, min_time: float = 0.2
+) -> dict[str, float]:
+    """Times the operation, returning per-call statistics in nanoseconds."""
+    timer = timeit.Timer(operation)
+    number, _ = timer.autorange()
+    # autorange targets 0.2 seconds, scale it to the requested min time per repeat
+    number = max(1, int(number * min_time / 0.2))
+    timings = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min_ns": min(timings),
+        "median_ns": statistics.median(timings),
+        "mean_ns": statistics.mean(timings),
+        "stdev_ns": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "ops_per_sec": 1e9 / statistics.median(timings),
+    }
+
+
+def run(
+    selected: Optional[list[str]] = None, repeat: int = 5, min_time: float = 0.2
+) -> dict[str, Any]:
+    """Runs the registered benchmarks whose name contains one of the selected strings."""
+    results: dict[str, dict[str, float]] = {}
+    # Adapters printing on commit must not pollute the output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, factory in sorted(_BENCHMARKS.items()):
+            if selected and not any(s in name for s in selected):
+                continue
+            results[name] = time_operation(factory(), repeat, min_time)
+            print(
+                f"{name:<45} {results[name]['median_ns']:>14,.0f} ns/op",
+                file=sys.stderr,
+            )
+        for name, func in sorted(_MEASURES.items()):
+            if selected and not any(s in name for s in selected):
+                continue
+            results[name] = func()
+            print(f"{name:<45} {results[name]['value']:>14,.1f}", file=sys.stderr)
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float = 0.1
+) -> list[str]:
+    """Returns the benchmarks whose median time (or measure value) regressed more than the threshold ratio."""
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        metric = "median_ns" if "median_ns" in result else "value"
+        ratio = result[metric] / previous[metric]
+        print(
+            f"{name:<45} {previous[metric]:>14,.1f} -> {result[metric]:>14,.1f} ({ratio - 1:+.1%})",
+            file=sys.stderr,
+        )
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def load(path: str) -> dict[str, Any]:
+    with open(path) as file:
+        results: dict[str, Any] = json.load(file)
+    return results
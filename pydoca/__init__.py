@@ -1,32 +1,98 @@
 """Python Domain-Oriented Clean Architecture library."""
-
 __version__ = "1.0.0-alpha"
 
 from .aggregate_root import AggregateRoot as AggregateRoot
+from .aggregate_root import CompactAggregateRoot as CompactAggregateRoot
+from .bootstrap import WarmUpReport as WarmUpReport
 from .bootstrap import bootstrap as bootstrap
+from .bootstrap import warm_up as warm_up
+from .bulkhead import Bulkhead as Bulkhead
+from .bulkhead import BulkheadFullError as BulkheadFullError
+from .cache import AggregateCache as AggregateCache
+from .cache import CacheStats as CacheStats
+from .codec import Codec as Codec
+from .codec import codec as codec
+from .collection import EntityList as EntityList
+from .collection import LazyList as LazyList
+from .collection import LazyLoadError as LazyLoadError
+from .consumer import LaneLag as LaneLag
+from .consumer import PartitionedConsumer as PartitionedConsumer
+from .deadlines import DeadlineExceededError as DeadlineExceededError
+from .deadlines import check_deadline as check_deadline
+from .deadlines import deadline as deadline
+from .deadlines import remaining_time as remaining_time
 from .entity import ID as ID
+from .entity import CompactEntity as CompactEntity
 from .entity import Entity as Entity
 from .entity import EntityAlreadyExistError as EntityAlreadyExistError
 from .entity import EntityError as EntityError
 from .entity import EntityNotFoundError as EntityNotFoundError
+from .event import Compaction as Compaction
 from .event import Event as Event
+from .event import LatestWins as LatestWins
+from .event import Merge as Merge
+from .event import compact_events as compact_events
+from .group_commit import GroupCommit as GroupCommit
+from .group_commit import GroupCommitError as GroupCommitError
+from .idempotency import IdempotencyKeyReusedError as IdempotencyKeyReusedError
+from .idempotency import InMemoryResultStore as InMemoryResultStore
+from .idempotency import ResultStore as ResultStore
+from .idempotency import SessionResultStore as SessionResultStore
+from .idempotency import StoredResult as StoredResult
+from .instrumentation import InMemorySink as InMemorySink
+from .instrumentation import OpenTelemetrySink as OpenTelemetrySink
+from .instrumentation import Sink as Sink
+from .instrumentation import Span as Span
+from .instrumentation import set_sink as set_sink
+from .memory import HASH as HASH
+from .memory import SORTED as SORTED
+from .memory import InMemoryMappingSession as InMemoryMappingSession
+from .memory import InMemoryRepository as InMemoryRepository
+from .memory import InMemorySession as InMemorySession
 from .port_adapter import Adapter as Adapter
 from .port_adapter import AdapterNotConfiguredError as AdapterNotConfiguredError
 from .port_adapter import AdaptersConfig as AdaptersConfig
+from .port_adapter import AdaptersFrozenError as AdaptersFrozenError
+from .port_adapter import AdaptersScope as AdaptersScope
 from .port_adapter import Port as Port
 from .port_adapter import PortNotFoundError as PortNotFoundError
 from .port_adapter import bind as bind
 from .port_adapter import clear as clear
+from .port_adapter import freeze as freeze
 from .port_adapter import inject as inject
+from .port_adapter import is_frozen as is_frozen
+from .port_adapter import scope as scope
+from .port_adapter import unfreeze as unfreeze
+from .profiling import Profiler as Profiler
+from .profiling import UseCaseProfile as UseCaseProfile
+from .projection import EventStore as EventStore
+from .projection import InMemoryEventStore as InMemoryEventStore
+from .projection import InMemoryReadModelStore as InMemoryReadModelStore
+from .projection import Projection as Projection
+from .projection import Projector as Projector
+from .projection import ReadModelStore as ReadModelStore
+from .projection import SessionReadModelStore as SessionReadModelStore
+from .repository import LazyLoadNotSupportedError as LazyLoadNotSupportedError
+from .repository import Page as Page
+from .repository import QueryNotSupportedError as QueryNotSupportedError
 from .repository import Repository as Repository
 from .repository import Session as Session
+from .snapshot import PeriodicSnapshot as PeriodicSnapshot
+from .snapshot import load_snapshot as load_snapshot
+from .snapshot import save_snapshot as save_snapshot
+from .sqlite import SQLiteRepository as SQLiteRepository
+from .sqlite import SQLiteSession as SQLiteSession
+from .unit_of_work import ConcurrencyConflictError as ConcurrencyConflictError
 from .unit_of_work import DifferentSessionsError as DifferentSessionsError
 from .unit_of_work import EventBus as EventBus
 from .unit_of_work import NotARepositoryError as NotARepositoryError
 from .unit_of_work import UnitOfWorkBase as UnitOfWorkBase
 from .use_case import Command as Command
+from .use_case import Middleware as Middleware
 from .use_case import Service as Service
 from .use_case import UnitOfWorkNotDefined as UnitOfWorkNotDefined
 from .use_case import UseCase as UseCase
+from .use_case import set_middlewares as set_middlewares
+from .use_case import set_profiler as set_profiler
 from .utils import utc_now as utc_now
 from .value_object import ValueObject as ValueObject
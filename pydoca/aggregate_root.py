@@ -1,9 +1,10 @@
 """Domain-Driven Design Aggregate Root."""
 import abc
+from typing import Any
 
 import pydantic
 
-from .entity import Entity
+from .entity import CompactEntity, Entity
 from .event import Event
 
 
@@ -25,17 +26,24 @@ class AggregateRoot(Entity, abc.ABC):
     The Aggregate Root is responsible for maintaining the integrity of the entire Aggregate by enforcing business rules and invariants.
 
     Attributes:
+        version: Number of committed changes, incremented by the unit of work for optimistic concurrency.
         _events: A list of domain events associated with the aggregate.
     """
 
+    version: int = pydantic.Field(default=0, ge=0)
     _events: list[Event] = pydantic.PrivateAttr(default_factory=list)
 
+    def _stamp(self, event: Event) -> Event:
+        if event.aggregate_id is None:
+            event._set_aggregate_id(self.id)
+        return event
+
     def add_event(self, event: Event) -> None:
-        self._events.append(event)
+        self._events.append(self._stamp(event))
         return None
 
     def add_events(self, events: list[Event]) -> None:
-        self._events.extend(events)
+        self._events.extend(self._stamp(event) for event in events)
         return None
 
     def get_events(self) -> list[Event]:
@@ -44,3 +52,41 @@ class AggregateRoot(Entity, abc.ABC):
     def clear_events(self) -> None:
         self._events.clear()
         return None
+
+
+class CompactAggregateRoot(CompactEntity, AggregateRoot, abc.ABC):
+    """AggregateRoot using less memory, for large in-memory working sets.
+
+    On top of CompactEntity savings, the private attributes holding the events list are only allocated
+    when the first event is added. Events must be accessed through the methods, not the `_events` attribute.
+    """
+
+    def model_post_init(self, context: Any, /) -> None:
+        super().model_post_init(context)
+        private = self.__pydantic_private__
+        if private is not None and len(private) == 1 and not private["_events"]:
+            # No other private attribute and no event yet
+            object.__setattr__(self, "__pydantic_private__", None)
+
+    def _ensure_events(self) -> list[Event]:
+        if self.__pydantic_private__ is None:
+            object.__setattr__(self, "__pydantic_private__", {"_events": []})
+        return self._events
+
+    def add_event(self, event: Event) -> None:
+        self._ensure_events().append(self._stamp(event))
+        return None
+
+    def add_events(self, events: list[Event]) -> None:
+        self._ensure_events().extend(self._stamp(event) for event in events)
+        return None
+
+    def get_events(self) -> list[Event]:
+        if self.__pydantic_private__ is None:
+            return []
+        return self._events
+
+    def clear_events(self) -> None:
+        if self.__pydantic_private__ is not None:
+            self._events.clear()
+        return None
@@ -1,9 +1,140 @@
-from typing import Optional
+import inspect
+import logging
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
 
-from .port_adapter import AdaptersConfig
+import pydantic
 
+from .aggregate_root import AggregateRoot
+from .codec import codec
+from .collection import lazy_fields
+from .entity import Entity
+from .port_adapter import (
+    _ADAPTERS_CONFIGURATION,
+    AdaptersConfig,
+    Port,
+    PortNotFoundError,
+    freeze,
+)
+from .use_case import MiddlewareFn, UseCase, set_middlewares
+from .value_object import ValueObject
 
-def bootstrap(adapters_config: Optional[type[AdaptersConfig]] = None) -> None:
+logger = logging.getLogger(__name__)
+
+# Nanoseconds spent warming up each class, by qualified name
+WarmUpReport = dict[str, int]
+
+
+def bootstrap(
+    adapters_config: Optional[type[AdaptersConfig]] = None,
+    frozen: bool = False,
+    warm_up: bool = False,
+    middlewares: Optional[Iterable[MiddlewareFn]] = None,
+) -> WarmUpReport:
+    """Binds the adapters configuration, then optionally freezes it and warms up the application.
+
+    Args:
+        adapters_config: Configuration binding the ports to their adapters.
+        frozen: Compiles the bindings with `freeze`, instantiating the `__singletons__` adapters.
+        warm_up: Builds ahead of the first requests what pydoca and pydantic would build on them,
+            see `warm_up`. The singleton adapters instantiation times are part of the report.
+        middlewares: Middlewares chained around the execution of the use cases, see `Middleware`.
+
+    Returns:
+        The warm-up time of each class, empty without warm-up.
+
+    Raises:
+        PortNotFoundError: If a `__singletons__` name is not a port.
+    """
     if adapters_config:
         adapters_config()
-    return None
+    if middlewares is not None:
+        set_middlewares(middlewares)
+    timings: dict[type[Port], int] = {}
+    if frozen:
+        singletons = adapters_config.__singletons__ if adapters_config else ()
+        freeze(singletons=[_port(name) for name in singletons], timings=timings)
+    if not warm_up:
+        return {}
+    report = {_name(port): duration for port, duration in timings.items()}
+    report.update(_warm_up())
+    return report
+
+
+def warm_up() -> WarmUpReport:
+    """Builds the schemas, validators and codecs of the application classes defined so far.
+
+    Walks the Entity (AggregateRoot), ValueObject (Command, Event) and UseCase subclasses,
+    completing the models whose annotations could not be resolved when they were defined, and
+    building the unit of work models, the aggregates codecs and LazyList fields, as well as the
+    pydantic adapters bound to the ports. Only the modules imported before are warmed up.
+
+    Returns:
+        The warm-up time of each class.
+    """
+    return _warm_up()
+
+
+def _warm_up() -> WarmUpReport:
+    start = time.perf_counter_ns()
+    report: WarmUpReport = {}
+    for cls in _subclasses(Entity, ValueObject, UseCase):
+        report[_name(cls)] = _timed(_warm_model, cls)
+    for port in Port._registry.values():
+        adapter = _ADAPTERS_CONFIGURATION.get(port)
+        if inspect.isclass(adapter) and issubclass(adapter, pydantic.BaseModel):
+            report[_name(port)] = report.get(_name(port), 0) + _timed(
+                _warm_model, adapter
+            )
+    logger.info(
+        f"Warm up {len(report)} classes in {(time.perf_counter_ns() - start) / 1e6:.1f}ms"
+    )
+    return report
+
+
+def _subclasses(*bases: type) -> Iterator[type[pydantic.BaseModel]]:
+    seen: set[type] = set()
+    stack: list[type] = list(bases)
+    while stack:
+        subclasses: list[type] = stack.pop().__subclasses__()
+        for cls in subclasses:
+            if cls in seen:
+                continue
+            seen.add(cls)
+            stack.append(cls)
+            # pydoca bases and parametrized generics are never instantiated as such
+            if not cls.__module__.startswith("pydoca.") and not getattr(
+                cls, "__pydantic_generic_metadata__", {}
+            ).get("origin"):
+                yield cls
+
+
+def _warm_model(model: type[pydantic.BaseModel]) -> None:
+    if not model.__pydantic_complete__:
+        # Annotations not resolvable when the class was defined, pydantic builds it on first use
+        model.model_rebuild(raise_errors=False)
+        if not model.__pydantic_complete__:
+            logger.warning(f"{_name(model)} cannot be built, it is not warmed up")
+            return
+    if issubclass(model, UseCase) and model.__uow__ is not None:
+        _warm_model(model.__uow__)
+    if issubclass(model, AggregateRoot):
+        codec(model)
+        for entity_class in lazy_fields(model).values():
+            codec(entity_class)
+
+
+def _port(name: str) -> type[Port]:
+    if name not in Port._registry:
+        raise PortNotFoundError(name)
+    return Port._registry[name]
+
+
+def _timed(fn: Callable[..., Any], *args: Any) -> int:
+    start = time.perf_counter_ns()
+    fn(*args)
+    return time.perf_counter_ns() - start
+
+
+def _name(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
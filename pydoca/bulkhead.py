@@ -0,0 +1,199 @@
+"""Concurrency limits isolating the use cases from each other under overload."""
+import asyncio
+import collections
+import threading
+import time
+from typing import Optional
+
+from .deadlines import DeadlineExceededError, check_deadline, remaining_time
+from .instrumentation import Attributes, Span, count, get_sink
+
+_NO_ATTRIBUTES: Attributes = {}
+
+
+class BulkheadFullError(Exception):
+    """If a call is rejected because the bulkhead queue is full, or it waited longer than its timeout.
+
+    Attributes:
+        reason: "queue_full" or "timeout".
+    """
+
+    def __init__(self, bulkhead: "Bulkhead", reason: str) -> None:
+        super().__init__(
+            f"Bulkhead full ({reason}): {bulkhead.in_flight}/{bulkhead.max_in_flight} in flight, "
+            f"{bulkhead.queued}/{bulkhead.max_queued} queued"
+        )
+        self.reason = reason
+
+
+class _Waiter:
+    """Queued call, granted a slot by the call releasing it."""
+
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(
+        self,
+        event: Optional[threading.Event] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        future: Optional["asyncio.Future[None]"] = None,
+    ) -> None:
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None and self.future is not None:
+            self.loop.call_soon_threadsafe(_set_result, self.future)
+
+
+def _set_result(future: "asyncio.Future[None]") -> None:
+    # Cancelled meanwhile, the cancelled call sees it was granted and releases the slot
+    if not future.done():
+        future.set_result(None)
+
+
+class Bulkhead:
+    """Limits the calls in flight, queuing the next ones up to `max_queued` and rejecting the others.
+
+    class ConvertBudget(pydoca.UseCase):
+        __bulkhead__ = pydoca.Bulkhead(max_in_flight=4, max_queued=16, timeout=0.5)
+
+    The threads and the asyncio tasks share the same limits, queued calls are admitted in their
+    arrival order. Asyncio tasks wait in the event loop, not holding any thread while queued.
+    Calls with a deadline (see `pydoca.deadline`) wait until it at most, then raise DeadlineExceededError.
+
+    Spans emitted, with the caller attributes:
+        bulkhead.queue_wait: Time spent queued by the admitted calls (0 for the calls admitted at once).
+
+    Counters emitted:
+        bulkhead.rejected: Rejected calls, with the reason ("queue_full", "timeout", "deadline") as attribute.
+
+    Attributes:
+        max_in_flight: Maximum number of calls executed concurrently.
+        max_queued: Maximum number of calls waiting for a slot, the next ones are rejected (default: 0).
+        timeout: Seconds a call waits for a slot before being rejected (default: None, no timeout).
+    """
+
+    def __init__(
+        self, max_in_flight: int, max_queued: int = 0, timeout: Optional[float] = None
+    ) -> None:
+        if max_in_flight < 1 or max_queued < 0:
+            raise ValueError(
+                "max_in_flight must be positive and max_queued not negative"
+            )
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters: collections.deque[_Waiter] = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _try_acquire(self, attributes: Attributes) -> bool:
+        # Called with the lock held, raises if the call can not be queued
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queued:
+            self._reject("queue_full", attributes)
+        return False
+
+    def acquire(self, attributes: Attributes = _NO_ATTRIBUTES) -> None:
+        """Waits for a slot, to be released by `release`.
+
+        Raises:
+            BulkheadFullError: If the queue is full or the timeout expired.
+        """
+        check_deadline()
+        start_ns = time.perf_counter_ns()
+        with self._lock:
+            admitted = self._try_acquire(attributes)
+            if not admitted:
+                waiter = _Waiter(event=threading.Event())
+                self._waiters.append(waiter)
+        if admitted:
+            self._record_wait(start_ns, attributes)
+            return
+        if not waiter.event.wait(self._wait_timeout()):  # type: ignore[union-attr]
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    self._expired(attributes)
+        self._record_wait(start_ns, attributes)
+
+    async def acquire_async(self, attributes: Attributes = _NO_ATTRIBUTES) -> None:
+        """Waits for a slot in the running event loop, to be released by `release`.
+
+        Raises:
+            BulkheadFullError: If the queue is full or the timeout expired.
+        """
+        check_deadline()
+        start_ns = time.perf_counter_ns()
+        with self._lock:
+            admitted = self._try_acquire(attributes)
+            if not admitted:
+                loop = asyncio.get_running_loop()
+                waiter = _Waiter(loop=loop, future=loop.create_future())
+                self._waiters.append(waiter)
+        if admitted:
+            self._record_wait(start_ns, attributes)
+            return
+        try:
+            await asyncio.wait_for(waiter.future, self._wait_timeout())  # type: ignore[arg-type]
+        except BaseException as exc:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                if not isinstance(exc, asyncio.TimeoutError):
+                    self.release()  # Cancelled after being granted the slot
+                    raise
+            elif isinstance(exc, asyncio.TimeoutError):
+                self._expired(attributes)
+            else:
+                raise
+        self._record_wait(start_ns, attributes)
+
+    def release(self) -> None:
+        """Releases a slot, handed over to the first queued call if any."""
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().grant()
+            else:
+                self.in_flight -= 1
+
+    def _wait_timeout(self) -> Optional[float]:
+        remaining = remaining_time()
+        if remaining is None:
+            return self.timeout
+        remaining = max(remaining, 0)
+        return remaining if self.timeout is None else min(self.timeout, remaining)
+
+    def _expired(self, attributes: Attributes) -> None:
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            count("bulkhead.rejected", 1, {**attributes, "reason": "deadline"})
+            raise DeadlineExceededError(-remaining)
+        self._reject("timeout", attributes)
+
+    def _reject(self, reason: str, attributes: Attributes) -> None:
+        count("bulkhead.rejected", 1, {**attributes, "reason": reason})
+        raise BulkheadFullError(self, reason)
+
+    @staticmethod
+    def _record_wait(start_ns: int, attributes: Attributes) -> None:
+        sink = get_sink()
+        if sink is not None:
+            end_ns = time.time_ns()
+            wait_ns = time.perf_counter_ns() - start_ns
+            sink.record_span(
+                Span("bulkhead.queue_wait", attributes, end_ns - wait_ns, end_ns)
+            )
@@ -0,0 +1,230 @@
+"""Process-wide cache of the aggregates read by the repositories, invalidated by the units of work."""
+import collections
+import functools
+import threading
+import time
+import weakref
+from typing import Any, Callable, Hashable, Iterable, NamedTuple, Optional, TypeVar
+
+from .aggregate_root import AggregateRoot
+from .codec import codec
+from .entity import ID
+from .instrumentation import count
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+AggregateKey = tuple[type[AggregateRoot], ID]
+
+# Caches to invalidate at commit, whatever the repository which loaded the aggregates
+_CACHES: "weakref.WeakSet[AggregateCache]" = weakref.WeakSet()
+
+
+class CacheStats(NamedTuple):
+    """Counters of an AggregateCache since it was created or cleared.
+
+    Attributes:
+        hits: Reads answered by the cache.
+        misses: Reads passed to the repository.
+        evictions: Entries removed because the cache was full or they expired.
+        invalidations: Entries removed because their aggregate was committed.
+        size: Number of entries.
+        bytes: Encoded size of the entries.
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    size: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        reads = self.hits + self.misses
+        return self.hits / reads if reads else 0.0
+
+
+class _Entry(NamedTuple):
+    aggregate_key: AggregateKey
+    data: bytes
+    expires: float
+
+
+class AggregateCache:
+    """Least recently used aggregates read by the repositories declaring it, shared by their instances.
+
+    class InMemoryBudgetRepo(pydoca.InMemoryRepository[Budget], BudgetRepository):
+        __cache__ = pydoca.AggregateCache(maxsize=1000, ttl=60)
+        __cached_reads__ = ("get_by_id",)
+
+    The aggregates are kept encoded with their codec, each read returns a new copy that the caller can
+    change without altering the cache. Units of work invalidate the aggregates they commit, written or
+    having events, in every cache. Reads of a repository having written aggregates in its unit of work
+    are not cached, nor are the reads of an aggregate invalidated since the unit of work started. These
+    units of work do not read the entries of such aggregates either, which can be newer than the snapshot
+    of their session. The last invalidations of as many aggregates as `maxsize` are kept, older ones are
+    considered as recent as the last one forgotten.
+    The TTL bounds the staleness of aggregates committed by other processes.
+
+    Counters emitted, with the repository name as attribute:
+        aggregate_cache.hits: Reads answered by the cache.
+        aggregate_cache.misses: Reads passed to the repository.
+
+    Attributes:
+        maxsize: Maximum number of entries, the least recently used ones are evicted (default: 10 000).
+        ttl: Seconds an entry is kept (default: None, until evicted or invalidated).
+        generation: Number of invalidations, the reads compare the one they started at with the
+            invalidations of their aggregate.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: Optional[float] = None) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: collections.OrderedDict[Hashable, _Entry] = (
+            collections.OrderedDict()
+        )
+        # Entries of each aggregate, an aggregate can be read by different methods
+        self._keys: dict[AggregateKey, set[Hashable]] = {}
+        # Generation of the last invalidation of the aggregates, oldest first, and of the last one forgotten
+        self._invalidated: collections.OrderedDict[AggregateKey, int] = (
+            collections.OrderedDict()
+        )
+        self._floor = 0
+        self._lock = threading.Lock()
+        self._reset_stats()
+        _CACHES.add(self)
+
+    def _reset_stats(self) -> None:
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.bytes = 0
+
+    def get(
+        self, key: Hashable, generation: Optional[int] = None
+    ) -> Optional[AggregateRoot]:
+        """Returns a copy of the cached aggregate, None if not cached, expired or invalidated after the generation."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                entry = None
+            if entry is not None and generation is not None:
+                if self._invalidated_at(entry.aggregate_key) > generation:
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        aggregate: AggregateRoot = codec(entry.aggregate_key[0]).decode(entry.data)
+        return aggregate
+
+    def put(self, key: Hashable, aggregate: AggregateRoot, generation: int) -> bool:
+        """Caches the aggregate if it was not invalidated since the generation, returns if it was."""
+        data = codec(aggregate.__class__).encode(aggregate)
+        aggregate_key: AggregateKey = (aggregate.__class__, aggregate.id)
+        expires = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if self._invalidated_at(aggregate_key) > generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(aggregate_key, data, expires)
+            self._keys.setdefault(aggregate_key, set()).add(key)
+            self.bytes += len(data)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, aggregates: Iterable[AggregateKey]) -> None:
+        """Removes the entries of the aggregates, given by class and ID."""
+        with self._lock:
+            self.generation += 1
+            for aggregate_key in aggregates:
+                self._invalidated[aggregate_key] = self.generation
+                self._invalidated.move_to_end(aggregate_key)
+                for key in list(self._keys.get(aggregate_key, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+            while len(self._invalidated) > self.maxsize:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes every entry and resets the statistics."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys.clear()
+            # Reads started before are not cached
+            self._invalidated.clear()
+            self._floor = self.generation
+            self._reset_stats()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self.hits,
+                self.misses,
+                self.evictions,
+                self.invalidations,
+                len(self._entries),
+                self.bytes,
+            )
+
+    def _invalidated_at(self, aggregate_key: AggregateKey) -> int:
+        # Called with the lock held
+        return self._invalidated.get(aggregate_key, self._floor)
+
+    def _remove(self, key: Hashable) -> None:
+        # Called with the lock held
+        entry = self._entries.pop(key)
+        self.bytes -= len(entry.data)
+        keys = self._keys[entry.aggregate_key]
+        keys.discard(key)
+        if not keys:
+            del self._keys[entry.aggregate_key]
+
+
+def invalidate_cached(aggregates: Iterable[AggregateRoot]) -> None:
+    """Removes the aggregates from every cache, called by the units of work once committed."""
+    if not _CACHES:
+        return
+    keys = [(aggregate.__class__, aggregate.id) for aggregate in aggregates]
+    if not keys:
+        return
+    for cache in list(_CACHES):
+        cache.invalidate(keys)
+
+
+def cached(method: F, name: str) -> F:
+    """Wraps a repository read method taking one argument, answering with the repository `__cache__`."""
+
+    @functools.wraps(method)
+    def wrapper(self: Any, arg: Any) -> Any:
+        cache: AggregateCache = self.__cache__
+        state = self._unit_of_work_tracking()
+        if state is not None and state.written:
+            # Reads its own writes, not committed yet
+            return method(self, arg)
+        generation = None if state is None else state.cache_generation
+        key = (self.__class__, name, arg)
+        attributes = self._cache_attributes
+        aggregate = cache.get(key, generation)
+        if generation is None:
+            generation = cache.generation
+        if aggregate is not None:
+            count("aggregate_cache.hits", 1, attributes)
+            self.track(aggregate)
+            return aggregate
+        count("aggregate_cache.misses", 1, attributes)
+        result = method(self, arg)
+        if isinstance(result, AggregateRoot) and not (state and state.written):
+            cache.put(key, result, generation)
+        return result
+
+    wrapper.__cache_wrapped__ = True  # type: ignore[attr-defined]
+    return wrapper  # type: ignore[return-value]
@@ -0,0 +1,256 @@
+"""Schema-derived codecs persisting domain objects as flat rows."""
+import datetime
+import decimal
+import enum
+import inspect
+import operator
+import threading
+import types
+import uuid
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
+
+import pydantic
+import pydantic_core
+
+from .collection import LazyList
+
+ModelT = TypeVar("ModelT", bound=pydantic.BaseModel)
+
+Row = tuple[Any, ...]
+Converter = Optional[Callable[[Any], Any]]  # None when the value is kept as is
+
+# Types whose values are already JSON values
+_IDENTITY_TYPES = (str, int, float, bool, type(None))
+
+_ISO_TYPES = (datetime.datetime, datetime.date, datetime.time)
+
+# Slots setters of the pydantic models, faster than object.__setattr__ which looks them up on each call
+_SET_DICT = pydantic.BaseModel.__dict__["__dict__"].__set__
+_SET_FIELDS_SET = pydantic.BaseModel.__dict__["__pydantic_fields_set__"].__set__
+_SET_EXTRA = pydantic.BaseModel.__dict__["__pydantic_extra__"].__set__
+_SET_PRIVATE = pydantic.BaseModel.__dict__["__pydantic_private__"].__set__
+
+
+class Codec(Generic[ModelT]):
+    """Converts a pydantic model to and from a row, the tuple of its field values in declaration order.
+
+    Converters are derived once from the fields annotations: nested models become nested rows, lists of
+    models lists of rows, Decimals strings, Enums their values, dates ISO strings. Rows only hold JSON values.
+    Computed fields, like Entity.id, are not stored. Other types fall back to a pydantic TypeAdapter.
+    LazyList fields are not stored either, they are loaded as unloaded LazyLists for their repository to load.
+
+    Loading builds the models with `model_construct`: stored data is trusted, validators are not run.
+    Fields are matched by position, new fields must be added last with a default to load older rows.
+
+    codec = pydoca.codec(Budget)
+    data = codec.encode(budget)
+    budget = codec.decode(data)
+    """
+
+    def __init__(self, model: type[ModelT]) -> None:
+        self.model = model
+        self.fields = tuple(model.model_fields)
+        self.dump: Callable[[ModelT], Row] = self._not_built
+        self.load: Callable[[Sequence[Any]], ModelT] = self._not_built
+        self._dumpers: list[Converter] = []
+        self._loaders: list[Converter] = []
+
+    def _not_built(self, arg: Any) -> Any:
+        raise RuntimeError(f"{self.model.__name__} codec not built")
+
+    def _build(self) -> None:
+        """Generates the dump and load functions of the model, like dataclasses generate __init__."""
+        namespace: dict[str, Any] = {
+            "_model": self.model,
+            "_new": self.model.__new__,
+            "_set_dict": _SET_DICT,
+            "_set_fields_set": _SET_FIELDS_SET,
+            "_set_extra": _SET_EXTRA,
+            "_set_private": _SET_PRIVATE,
+            "_fields": frozenset(self.fields),
+            "_construct": self._construct,
+        }
+        dumped, loaded = [], []
+        for index, (name, field) in enumerate(self.model.model_fields.items()):
+            dump, load = _converters(field.annotation)
+            self._dumpers.append(dump)
+            self._loaders.append(load)
+            value = f"values[{name!r}]"
+            if dump is not None:
+                namespace[f"_dump{index}"] = dump
+                value = f"_dump{index}({value})"
+            dumped.append(value)
+            value = f"row[{index}]"
+            if load is not None:
+                namespace[f"_load{index}"] = load
+                value = f"_load{index}({value})"
+            loaded.append(f"{name!r}: {value}")
+
+        post_init = (
+            "instance.model_post_init(None)"
+            if self.model.__pydantic_post_init__
+            else ""
+        )
+        source = f"""
+def dump(model):
+    values = model.__dict__
+    return ({", ".join(dumped)}{"," if len(dumped) == 1 else ""})
+
+def load(row):
+    if len(row) < {len(self.fields)}:
+        return _construct(row)
+    # Same as model_construct when every field is set, without its aliases and defaults lookups
+    instance = _new(_model)
+    _set_dict(instance, {{{", ".join(loaded)}}})
+    _set_fields_set(instance, set(_fields))
+    _set_extra(instance, None)
+    _set_private(instance, None)
+    {post_init}
+    return instance
+"""
+        exec(source, namespace)
+        self.dump = namespace["dump"]
+        self.load = namespace["load"]
+
+    def _construct(self, row: Sequence[Any]) -> ModelT:
+        # Row stored before fields were added, model_construct sets their defaults
+        values = {
+            name: value if load is None else load(value)
+            for name, load, value in zip(self.fields, self._loaders, row, strict=False)
+        }
+        return self.model.model_construct(**values)
+
+    def dump_field(self, name: str, value: Any) -> Any:
+        """Returns the row value of a field value, e.g. to query stored rows."""
+        try:
+            dump = self._dumpers[self.fields.index(name)]
+        except ValueError:
+            raise KeyError(f"{self.model.__name__} has no field {name}") from None
+        return value if dump is None else dump(value)
+
+    def encode(self, model: ModelT) -> bytes:
+        """Returns the row of the model as JSON."""
+        return pydantic_core.to_json(self.dump(model))
+
+    def decode(self, data: Union[bytes, str]) -> ModelT:
+        """Returns the model from its JSON row."""
+        return self.load(pydantic_core.from_json(data))
+
+
+_CODECS: dict[type[pydantic.BaseModel], Codec[Any]] = {}
+
+# Codecs being built by the thread holding the lock, published once the outermost one is built: recursive
+# models use their unbuilt codec, the other threads never see it
+_BUILDING: dict[type[pydantic.BaseModel], Codec[Any]] = {}
+_BUILD_LOCK = threading.RLock()
+
+
+def codec(model: type[ModelT]) -> Codec[ModelT]:
+    """Returns the codec of the model class, built on first use."""
+    try:
+        return _CODECS[model]
+    except KeyError:
+        pass
+    with _BUILD_LOCK:
+        built = _CODECS.get(model) or _BUILDING.get(model)
+        if built is not None:
+            return built
+        outermost = not _BUILDING
+        new = _BUILDING[model] = Codec(model)
+        try:
+            new._build()
+            if outermost:
+                _CODECS.update(_BUILDING)
+        finally:
+            if outermost:
+                _BUILDING.clear()
+        return new
+
+
+def _converters(annotation: Any) -> tuple[Converter, Converter]:
+    """Returns the dump and load converters of the annotation."""
+    origin, args = get_origin(annotation), get_args(annotation)
+
+    if annotation in _IDENTITY_TYPES:
+        return None, None
+    if annotation is decimal.Decimal:
+        return str, decimal.Decimal
+    if annotation is uuid.UUID:
+        return str, uuid.UUID
+    if annotation in _ISO_TYPES:
+        return operator.methodcaller("isoformat"), annotation.fromisoformat
+    if inspect.isclass(annotation) and issubclass(annotation, enum.Enum):
+        try:
+            members = {member.value: member for member in annotation}
+        except TypeError:  # Unhashable values
+            return operator.attrgetter("value"), annotation
+        return operator.attrgetter("value"), members.__getitem__
+    if inspect.isclass(annotation) and issubclass(annotation, pydantic.BaseModel):
+        nested = codec(annotation)
+        if nested.dump == nested._not_built:
+            # Recursive model, its codec is being built
+            return (lambda v: nested.dump(v)), lambda v: nested.load(v)
+        return nested.dump, nested.load
+
+    if inspect.isclass(origin) and issubclass(origin, LazyList):
+        # Stored apart by the adapters, loaded rows hold unloaded lists
+        return (lambda value: None), lambda value: origin.unloaded()
+    if origin in (Union, types.UnionType):
+        if all(arg in _IDENTITY_TYPES for arg in args):
+            return None, None
+        if len(args) == 2 and type(None) in args:
+            return _optional(_converters(args[0] if args[1] is type(None) else args[1]))
+    elif (
+        inspect.isclass(origin)
+        and issubclass(origin, (list, set, frozenset))
+        and len(args) == 1
+    ) or (origin is tuple and len(args) == 2 and args[1] is Ellipsis):
+        return _sequence(origin, _converters(args[0]))
+    elif origin is dict and args and args[0] is str:
+        return _mapping(_converters(args[1]))
+
+    return _fallback(annotation)
+
+
+def _optional(converters: tuple[Converter, Converter]) -> tuple[Converter, Converter]:
+    dump, load = converters
+    return (
+        None if dump is None else lambda value: None if value is None else dump(value),
+        None if load is None else lambda value: None if value is None else load(value),
+    )
+
+
+def _sequence(
+    container: type[Any], converters: tuple[Converter, Converter]
+) -> tuple[Converter, Converter]:
+    dump, load = converters
+    return (
+        list if dump is None else lambda v: [dump(item) for item in v],
+        container if load is None else lambda v: container([load(item) for item in v]),
+    )
+
+
+def _mapping(converters: tuple[Converter, Converter]) -> tuple[Converter, Converter]:
+    dump, load = converters
+    return (
+        dict if dump is None else lambda v: {key: dump(val) for key, val in v.items()},
+        dict if load is None else lambda v: {key: load(val) for key, val in v.items()},
+    )
+
+
+def _fallback(annotation: Any) -> tuple[Converter, Converter]:
+    adapter: pydantic.TypeAdapter[Any] = pydantic.TypeAdapter(annotation)
+    return (
+        lambda value: adapter.dump_python(value, mode="json"),
+        adapter.validate_python,
+    )
@@ -0,0 +1,499 @@
+"""Collections of domain objects."""
+import array
+import decimal
+import enum
+import functools
+import inspect
+import operator
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Optional,
+    SupportsIndex,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+    overload,
+)
+
+import pydantic
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+from .entity import Entity, _Mirror
+
+EntityT = TypeVar("EntityT", bound=Entity)
+
+Number = Union[int, float, decimal.Decimal]
+
+# Values a column can not hold, the column is then dropped
+_UNSUPPORTED_VALUE_ERRORS = (OverflowError, TypeError, ValueError, AttributeError)
+
+
+class _Column:
+    """Column-oriented mirror of a numeric field, stored in a C array.
+
+    Decimals are stored as fixed-point integers, the scale being the largest number of decimal
+    places seen so the sums are exact and keep the same exponent as Decimal arithmetic would.
+    Enums are stored as their integer values.
+    """
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind  # "int", "float", "decimal" or "enum"
+        self.values: "array.array[Any]" = array.array("d" if kind == "float" else "q")
+        self.scale = 0
+
+    def convert(self, values: list[Any]) -> list[Any]:
+        """Converts field values to column values, rescaling the column if needed."""
+        if self.kind == "enum":
+            return [int(value.value) for value in values]
+        if self.kind != "decimal":
+            return values
+        scale = self.scale
+        for value in values:
+            exponent = value.as_tuple().exponent
+            if isinstance(exponent, int) and -exponent > scale:
+                scale = -exponent
+        if scale > self.scale:
+            self.rescale(scale)
+        return [int(value.scaleb(scale)) for value in values]
+
+    def rescale(self, scale: int) -> None:
+        factor = 10 ** (scale - self.scale)
+        self.values = array.array("q", [v * factor for v in self.values])
+        self.scale = scale
+
+    def total(self, values: Optional[Iterable[Number]] = None) -> Number:
+        total = sum(self.values if values is None else values)
+        if self.kind == "decimal":
+            return decimal.Decimal(total).scaleb(-self.scale)
+        return total
+
+
+class EntityList(list[EntityT]):
+    """List of entities keeping a column-oriented mirror of their numeric fields.
+
+    Behaves like a list for the domain code, while aggregate computations over all the entities run on
+    compact C arrays instead of Python objects. Columns are inferred from the first entity added:
+    int, float, Decimal (as fixed-point integers) and integer Enum (as their values) fields are mirrored.
+
+    class Budget(pydoca.AggregateRoot):
+        incomes: pydoca.EntityList[Income] = pydoca.EntityList()
+
+        def yearly_income(self) -> decimal.Decimal:
+            return self.incomes.sumprod("amount", "frequency")
+
+    Columns mirror field values when entities are added or replaced. The entities added register the
+    list mirror, a field assigned in place on one of them makes it stale and the columns are then rebuilt
+    by the next reduction (entities removed since can still do so). A value a column can not hold exactly (e.g. out of 64 bits integers range)
+    drops the column, reductions on this field then fall back to iterating the entities.
+    """
+
+    # None until the columns are inferred from the first entity
+    _columns: Optional[dict[str, Optional[_Column]]]
+    # Made stale by the entities fields assigned in place, see entity._mirror_assignments
+    _mirror: _Mirror
+
+    def __init__(self, iterable: Iterable[EntityT] = ()) -> None:
+        super().__init__(iterable)
+        self._mirror = _Mirror()
+        self.refresh()
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        args = get_args(source)
+        list_schema = handler.generate_schema(list[args[0]] if args else list)  # type: ignore[valid-type]
+        return core_schema.no_info_after_validator_function(cls, list_schema)
+
+    def __reduce__(self) -> tuple[Callable[..., Any], tuple[Any, ...]]:
+        return self.__class__, (list(self),)
+
+    def __copy__(self) -> "EntityList[EntityT]":
+        return self.__class__(self)
+
+    # Columns management
+
+    def refresh(self) -> None:
+        """Rebuilds the columns from the entities."""
+        if not self:
+            self._columns = None
+            return
+        self._register()
+        self._columns = self._infer_columns(self[0])
+        for name in self._columns:
+            self._rebuild(name)
+
+    @staticmethod
+    def _infer_columns(entity: Entity) -> dict[str, Optional[_Column]]:
+        columns: dict[str, Optional[_Column]] = {}
+        for name, field in entity.__class__.model_fields.items():
+            annotation = field.annotation
+            kind: Optional[str] = None
+            if annotation is int:
+                kind = "int"
+            elif annotation is float:
+                kind = "float"
+            elif annotation is decimal.Decimal:
+                kind = "decimal"
+            elif (
+                inspect.isclass(annotation)
+                and issubclass(annotation, enum.Enum)
+                and all(type(member.value) is int for member in annotation)
+            ):
+                kind = "enum"
+            if kind:
+                columns[name] = _Column(kind)
+        return columns
+
+    def _active_columns(self) -> list[tuple[str, _Column]]:
+        if not self._columns:
+            return []
+        return [(name, col) for name, col in self._columns.items() if col is not None]
+
+    def _rebuild(self, name: str) -> None:
+        assert self._columns is not None
+        column = self._columns[name]
+        if column is None:
+            return
+        column = self._columns[name] = _Column(column.kind)
+        try:
+            values = column.convert([getattr(entity, name) for entity in self])
+            column.values.extend(values)
+        except _UNSUPPORTED_VALUE_ERRORS:
+            self._columns[name] = None
+
+    def _register(self) -> None:
+        # Fresh before the values are read, an assignment while rebuilding is seen by the next reduction
+        self._mirror.stale = False
+        for entity in self:
+            entity._mirrored_by(self._mirror)
+
+    def _rebuild_all(self) -> None:
+        if self._columns is None or not self:
+            self.refresh()
+            return
+        self._register()
+        for name in self._columns:
+            self._rebuild(name)
+
+    def _insert_values(self, position: int, entities: list[EntityT]) -> None:
+        if self._columns is None:
+            self.refresh()
+            return
+        for entity in entities:
+            entity._mirrored_by(self._mirror)
+        for name, column in self._active_columns():
+            try:
+                values = column.convert([getattr(entity, name) for entity in entities])
+            except _UNSUPPORTED_VALUE_ERRORS:
+                self._columns[name] = None
+                continue
+            if position == len(column.values):
+                column.values.extend(values)
+            else:
+                column.values[position:position] = array.array(
+                    column.values.typecode, values
+                )
+
+    # List mutations
+
+    def append(self, entity: EntityT) -> None:
+        super().append(entity)
+        self._insert_values(len(self) - 1, [entity])
+
+    def extend(self, entities: Iterable[EntityT]) -> None:
+        entities = list(entities)
+        position = len(self)
+        super().extend(entities)
+        self._insert_values(position, entities)
+
+    def __iadd__(self, entities: Iterable[EntityT]) -> "EntityList[EntityT]":  # type: ignore[override,misc]
+        self.extend(entities)
+        return self
+
+    def insert(self, index: SupportsIndex, entity: EntityT) -> None:
+        # Same position normalization as list.insert
+        length = len(self)
+        position = operator.index(index)
+        position = max(0, length + position) if position < 0 else min(position, length)
+        super().insert(position, entity)
+        self._insert_values(position, [entity])
+
+    def pop(self, index: SupportsIndex = -1) -> EntityT:
+        position = operator.index(index)
+        entity = super().pop(position)
+        for _, column in self._active_columns():
+            column.values.pop(position)
+        return entity
+
+    def remove(self, entity: EntityT) -> None:
+        self.pop(self.index(entity))
+
+    def clear(self) -> None:
+        super().clear()
+        self._columns = None
+
+    @overload
+    def __setitem__(self, index: SupportsIndex, entity: EntityT) -> None: ...
+
+    @overload
+    def __setitem__(self, index: slice, entity: Iterable[EntityT]) -> None: ...
+
+    def __setitem__(self, index: Any, entity: Any) -> None:
+        super().__setitem__(index, entity)
+        if isinstance(index, slice) or self._columns is None:
+            self._rebuild_all()
+            return
+        position = operator.index(index)
+        entity._mirrored_by(self._mirror)
+        for name, column in self._active_columns():
+            try:
+                column.values[position] = column.convert([getattr(entity, name)])[0]
+            except _UNSUPPORTED_VALUE_ERRORS:
+                self._columns[name] = None
+
+    def __delitem__(self, index: SupportsIndex | slice) -> None:
+        super().__delitem__(index)
+        for _, column in self._active_columns():
+            del column.values[index]
+
+    def __imul__(self, n: SupportsIndex) -> "EntityList[EntityT]":
+        super().__imul__(n)
+        self._rebuild_all()
+        return self
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        super().sort(*args, **kwargs)
+        self._rebuild_all()
+
+    def reverse(self) -> None:
+        super().reverse()
+        for _, column in self._active_columns():
+            column.values.reverse()
+
+    # Reductions
+
+    def _column(self, name: str) -> Optional[_Column]:
+        """Returns the column of a numeric field, None if dropped."""
+        if self._mirror.stale:
+            self.refresh()  # An entity field was assigned in place
+        columns = self._columns or {}
+        if name not in columns:
+            if name not in self[0].__class__.model_fields:
+                raise KeyError(f"{self[0].__class__.__name__} has no field {name}")
+            raise TypeError(f"Field {name} is not numeric")
+        return columns[name]
+
+    def _values(self, name: str) -> list[Any]:
+        values = [getattr(entity, name) for entity in self]
+        if values and isinstance(values[0], enum.Enum):
+            return [value.value for value in values]
+        return values
+
+    def column(self, name: str) -> "array.array[Any]":
+        """Returns the raw column of the field (Decimals as fixed-point integers, see `scale`)."""
+        if not self:
+            return array.array("q")
+        column = self._column(name)
+        if column is None:
+            raise ValueError(f"Field {name} has no column")
+        return column.values
+
+    def scale(self, name: str) -> int:
+        """Returns the number of decimal places of the fixed-point integers of a Decimal column."""
+        column = self._column(name) if self else None
+        return column.scale if column else 0
+
+    def sum(self, name: str) -> Number:
+        """Sums the field of every entity."""
+        if not self:
+            return 0
+        column = self._column(name)
+        if column is None:
+            return sum(self._values(name))  # type: ignore[no-any-return]
+        return column.total()
+
+    def mean(self, name: str) -> Number:
+        """Returns the arithmetic mean of the field over the entities."""
+        if not self:
+            raise ValueError("Mean of an empty list")
+        return self.sum(name) / len(self)
+
+    def sumprod(self, name1: str, name2: str) -> Number:
+        """Sums the products of the two fields of every entity."""
+        if not self:
+            return 0
+        column1, column2 = self._column(name1), self._column(name2)
+        if column1 is None or column2 is None:
+            return sum(map(operator.mul, self._values(name1), self._values(name2)))  # type: ignore[no-any-return]
+        if column2.kind == "decimal" and column1.kind != "decimal":
+            column1, column2 = column2, column1
+        if column1.kind == "decimal" and column2.kind == "float":
+            raise TypeError("Can not multiply Decimal and float fields")
+        products: Iterable[Number] = map(operator.mul, column1.values, column2.values)
+        total = column1.total(products)
+        if column2.kind == "decimal":
+            total = total.scaleb(-column2.scale)  # type: ignore[union-attr]
+        return total
+
+
+class LazyLoadError(Exception):
+    def __init__(self) -> None:
+        super().__init__("LazyList not loaded and not bound to a repository")
+
+
+def _unbound() -> None:
+    raise LazyLoadError()
+
+
+class LazyList(EntityList[EntityT]):
+    """EntityList whose entities are loaded on first access, through the repository that loaded its aggregate.
+
+    class Budget(pydoca.AggregateRoot):
+        incomes: pydoca.LazyList[Income] = pydoca.LazyList()
+
+    Created by the domain code, a LazyList is a loaded EntityList. Repository adapters build the aggregates
+    with `LazyList.unloaded()` values, the repository tracking the aggregate then binds them to its
+    `_load_lazy` hook, see Repository. Domain code uses it like a list: the first access loads it.
+    Clearing it, or replacing the field value, does not load it.
+    """
+
+    # Loads the entities, None once loaded
+    _loader: Optional[Callable[[], None]]
+
+    def __init__(self, iterable: Iterable[EntityT] = ()) -> None:
+        self._loader = None
+        super().__init__(iterable)
+
+    @classmethod
+    def unloaded(cls) -> "LazyList[Any]":
+        """Returns a LazyList to load, bound to its loader by the repository."""
+        lazy: LazyList[Any] = cls()
+        lazy._loader = _unbound
+        return lazy
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        args = get_args(source)
+        list_schema = handler.generate_schema(list[args[0]] if args else list)  # type: ignore[valid-type]
+
+        def validate(value: Any, validate_list: Callable[[Any], Any]) -> Any:
+            if isinstance(value, LazyList) and not value.loaded:
+                return value  # Validating the entities would load them
+            return cls(validate_list(value))
+
+        def serialize(value: Any, serialize_list: Callable[[Any], Any]) -> Any:
+            if isinstance(value, LazyList):
+                value.load()  # The serializer reads the list items directly
+            return serialize_list(value)
+
+        return core_schema.no_info_wrap_validator_function(
+            validate,
+            list_schema,
+            serialization=core_schema.wrap_serializer_function_ser_schema(
+                serialize, schema=list_schema
+            ),
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    @property
+    def bound(self) -> bool:
+        return self._loader is not _unbound
+
+    def bind(self, loader: Callable[[], None]) -> None:
+        """Sets the loader, called on first access to fill the list with `set_loaded`."""
+        if not self.loaded:
+            self._loader = loader
+
+    def load(self) -> None:
+        if self._loader is not None:
+            self._loader()
+            if self._loader is not None:
+                raise LazyLoadError()
+
+    def set_loaded(self, entities: Iterable[EntityT]) -> None:
+        """Fills the unloaded list with its entities, without calling the loader."""
+        if self._loader is None:
+            return
+        self._loader = None
+        list.extend(self, entities)
+        self.refresh()
+
+    def clear(self) -> None:
+        self._loader = None
+        super().clear()
+
+    def __reduce__(self) -> tuple[Callable[..., Any], tuple[Any, ...]]:
+        self.load()
+        return super().__reduce__()
+
+
+def _loading(method: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(method)
+    def wrapper(self: LazyList[Any], *args: Any, **kwargs: Any) -> Any:
+        if self._loader is not None:
+            self.load()
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+for _name in (
+    "__iter__",
+    "__reversed__",
+    "__len__",
+    "__getitem__",
+    "__contains__",
+    "__eq__",
+    "__ne__",
+    "__lt__",
+    "__le__",
+    "__gt__",
+    "__ge__",
+    "__add__",
+    "__mul__",
+    "__rmul__",
+    "__repr__",
+    "__copy__",
+    "index",
+    "count",
+    "copy",
+    "append",
+    "extend",
+    "__iadd__",
+    "insert",
+    "pop",
+    "remove",
+    "__setitem__",
+    "__delitem__",
+    "__imul__",
+    "sort",
+    "reverse",
+    "refresh",
+    "column",
+    "scale",
+    "sum",
+    "mean",
+    "sumprod",
+):
+    setattr(LazyList, _name, _loading(getattr(EntityList, _name)))
+
+
+@functools.cache
+def lazy_fields(model: type[pydantic.BaseModel]) -> dict[str, type[Entity]]:
+    """Returns the LazyList fields of the model, with the class of their entities."""
+    fields = {}
+    for name, field in model.model_fields.items():
+        origin = get_origin(field.annotation)
+        if inspect.isclass(origin) and issubclass(origin, LazyList):
+            fields[name] = get_args(field.annotation)[0]
+    return fields
@@ -0,0 +1,347 @@
+"""Parallel consumption of the events, keeping the order of the events of each aggregate."""
+import asyncio
+import collections
+import inspect
+import logging
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple, Optional, Union
+
+from .event import Event
+from .instrumentation import Span, count, get_sink
+from .unit_of_work import EventBus
+
+logger = logging.getLogger(__name__)
+
+EventConsumer = Callable[[Event], Union[None, Awaitable[None]]]
+
+
+def aggregate_key(event: Event) -> Any:
+    return event.aggregate_id
+
+
+class LaneLag(NamedTuple):
+    """Backlog of a lane.
+
+    Attributes:
+        pending: Number of events waiting in the lane, including the one being handled.
+        age: Seconds waited by the oldest pending event, 0 if none.
+        worker: Index of the worker processing the lane.
+    """
+
+    pending: int
+    age: float
+    worker: int
+
+
+class _Lane:
+    __slots__ = ("index", "events", "busy", "worker", "attributes")
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        # Events with their time.monotonic() enqueue time
+        self.events: collections.deque[tuple[float, Event]] = collections.deque()
+        self.busy = False
+        self.worker: "_Worker" = None  # type: ignore[assignment]
+        self.attributes = {"lane": str(index)}
+
+
+class _Worker:
+    """Thread or asyncio task processing the events of its lanes, one lane event at a time."""
+
+    __slots__ = (
+        "index",
+        "lanes",
+        "stopped",
+        "next_lane",
+        "condition",
+        "loop",
+        "wakeup",
+    )
+
+    def __init__(self, index: int, lock: threading.Lock) -> None:
+        self.index = index
+        self.lanes: list[_Lane] = []
+        self.stopped = False
+        self.next_lane = 0
+        self.condition = threading.Condition(lock)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeup: Optional[asyncio.Event] = None
+
+    def wake(self) -> None:
+        # Called with the lock held
+        if self.loop is None:
+            self.condition.notify()
+        elif self.wakeup is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+
+class PartitionedConsumer:
+    """Handles the events on parallel ordered lanes, routing the events of an aggregate to the same lane.
+
+    def on_event(event: pydoca.Event) -> None:
+        ...
+
+    consumer = pydoca.PartitionedConsumer(on_event, lanes=16, workers=4)
+    consumer.start()
+    consumer.process_pending()  # Routes the events published on the EventBus
+    consumer.resize(8)  # Rebalances the lanes on 8 workers
+    consumer.stop()
+
+    Events are routed by a stable hash of their aggregate ID, the events of an aggregate are handled
+    one at a time in their publishing order, whatever the number of workers. Each worker processes
+    a share of the lanes, taking an event from each of its lanes in turn. Lanes are moved between
+    workers only between two events, the worker taking over a lane waits for its current event.
+
+    The workers are threads, or asyncio tasks of the event loop running at start when the handler
+    is a coroutine function: the consumer can then be resized from any thread. A failing handler
+    is logged and its event skipped.
+
+    Spans emitted, with the lane as attribute:
+        consumer.lag: Time an event waited in its lane before being handled.
+
+    Counters emitted:
+        consumer.errors: Events whose handler raised an exception, with the lane as attribute.
+
+    Attributes:
+        handler: Function, or coroutine function, called with each event.
+        lanes: Number of ordered lanes, the parallelism limit (default: 16).
+        workers: Number of workers (default: 4).
+        key: Returns the routing key of an event (default: its aggregate ID).
+    """
+
+    def __init__(
+        self,
+        handler: EventConsumer,
+        lanes: int = 16,
+        workers: int = 4,
+        key: Callable[[Event], Any] = aggregate_key,
+    ) -> None:
+        if lanes < 1 or workers < 1:
+            raise ValueError("lanes and workers must be positive")
+        self.handler = handler
+        self.key = key
+        self.is_async = inspect.iscoroutinefunction(handler)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._lanes = [_Lane(index) for index in range(lanes)]
+        self._workers: list[_Worker] = []
+        self._threads: list[threading.Thread] = []
+        self._tasks: list["asyncio.Task[None]"] = []
+        # Event loop of the asyncio workers, the running one at start
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started = False
+        self._pending = 0
+        self._assign(workers)
+
+    @property
+    def lanes(self) -> int:
+        return len(self._lanes)
+
+    @property
+    def workers(self) -> int:
+        return len(self._workers)
+
+    @property
+    def pending(self) -> int:
+        """Number of events not handled yet."""
+        return self._pending
+
+    def lane(self, event: Event) -> int:
+        """Returns the lane of the event."""
+        return zlib.crc32(str(self.key(event)).encode()) % len(self._lanes)
+
+    def start(self) -> None:
+        """Starts the workers, in the running event loop if the handler is a coroutine function."""
+        with self._lock:
+            if self._started:
+                raise RuntimeError("PartitionedConsumer already started.")
+            if self.is_async:
+                self._loop = asyncio.get_running_loop()
+            self._start_workers()
+
+    def submit(self, events: Iterable[Event]) -> int:
+        """Routes the events to their lanes, returns how many were submitted."""
+        now = time.monotonic()
+        routed = [(self._lanes[self.lane(event)], event) for event in events]
+        with self._lock:
+            for lane, event in routed:
+                lane.events.append((now, event))
+                if not lane.busy:
+                    lane.worker.wake()
+            self._pending += len(routed)
+        return len(routed)
+
+    def process_pending(self, max_events: Optional[int] = None) -> int:
+        """Routes the events waiting on the EventBus to their lanes, returns how many were routed."""
+        events: list[Event] = []
+        while max_events is None or len(events) < max_events:
+            event = EventBus.get_event()
+            if event is None:
+                break
+            events.append(event)
+        return self.submit(events)
+
+    def resize(self, workers: int) -> None:
+        """Changes the number of workers, rebalancing the lanes between them.
+
+        The events already routed stay in their lanes, the order of each lane is kept.
+        """
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        with self._lock:
+            for worker in self._workers:
+                worker.stopped = True
+                worker.wake()
+            self._assign(workers)
+            if self._started:
+                self._start_workers()
+        logger.info(f"Rebalance {len(self._lanes)} lanes on {workers} workers")
+
+    def lag(self) -> dict[int, LaneLag]:
+        """Returns the backlog of the lanes with pending events, by lane index."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                lane.index: LaneLag(
+                    len(lane.events) + lane.busy,
+                    now - lane.events[0][0] if lane.events else 0.0,
+                    lane.worker.index,
+                )
+                for lane in self._lanes
+                if lane.events or lane.busy
+            }
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every submitted event is handled, returns False if the timeout expired."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    async def join_async(self, timeout: Optional[float] = None) -> bool:
+        """Waits in the event loop until every submitted event is handled."""
+        return await asyncio.to_thread(self.join, timeout)
+
+    def stop(self) -> None:
+        """Stops the workers once their current event is handled, the pending events are kept."""
+        with self._lock:
+            for worker in self._workers:
+                worker.stopped = True
+                worker.wake()
+            threads, self._threads = self._threads, []
+            self._tasks.clear()
+            self._started = False
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def _assign(self, workers: int) -> None:
+        # Called with the lock held, the stopped workers finish their current event
+        self._workers = [_Worker(index, self._lock) for index in range(workers)]
+        for lane in self._lanes:
+            lane.worker = self._workers[lane.index % workers]
+            lane.worker.lanes.append(lane)
+
+    def _start_workers(self) -> None:
+        # Called with the lock held
+        self._started = True
+        for worker in self._workers:
+            if self._loop is not None:
+                worker.loop = self._loop
+                worker.wakeup = asyncio.Event()
+                # Created in the event loop, resize can be called from another thread
+                self._loop.call_soon_threadsafe(self._create_task, worker)
+            else:
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(worker,),
+                    name=f"pydoca-consumer-{worker.index}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def _create_task(self, worker: _Worker) -> None:
+        # Called in the event loop
+        task = asyncio.get_running_loop().create_task(self._run_async(worker))
+        with self._lock:
+            self._tasks.append(task)
+
+    def _next(self, worker: _Worker) -> Optional[tuple[_Lane, float, Event]]:
+        # Called with the lock held, takes the next event of the worker lanes in turn
+        lanes = worker.lanes
+        for offset in range(len(lanes)):
+            lane = lanes[(worker.next_lane + offset) % len(lanes)]
+            if lane.events and not lane.busy:
+                worker.next_lane = (worker.next_lane + offset + 1) % len(lanes)
+                lane.busy = True
+                enqueued, event = lane.events.popleft()
+                return lane, enqueued, event
+        return None
+
+    def _done(self, worker: _Worker, lane: _Lane) -> None:
+        # Called with the lock held
+        lane.busy = False
+        self._pending -= 1
+        if lane.events and lane.worker is not worker:
+            lane.worker.wake()  # Lane moved to another worker while the event was handled
+        if not self._pending:
+            self._idle.notify_all()
+
+    def _run(self, worker: _Worker) -> None:
+        with self._lock:
+            while not worker.stopped:
+                item = self._next(worker)
+                if item is None:
+                    worker.condition.wait()
+                    continue
+                self._lock.release()
+                try:
+                    self._handle(*item)
+                finally:
+                    self._lock.acquire()
+                    self._done(worker, item[0])
+
+    async def _run_async(self, worker: _Worker) -> None:
+        wakeup: asyncio.Event = worker.wakeup  # type: ignore[assignment]
+        while True:
+            with self._lock:
+                if worker.stopped:
+                    return
+                item = self._next(worker)
+                if item is None:
+                    wakeup.clear()
+            if item is None:
+                await wakeup.wait()
+                continue
+            lane, enqueued, event = item
+            try:
+                self._record_lag(lane, enqueued)
+                await self.handler(event)  # type: ignore[misc]
+            except Exception:
+                self._failed(lane, event)
+            finally:
+                with self._lock:
+                    self._done(worker, lane)
+
+    def _handle(self, lane: _Lane, enqueued: float, event: Event) -> None:
+        try:
+            self._record_lag(lane, enqueued)
+            self.handler(event)
+        except Exception:
+            self._failed(lane, event)
+
+    @staticmethod
+    def _failed(lane: _Lane, event: Event) -> None:
+        logger.exception(f"Error handling {event} on lane {lane.index}")
+        count("consumer.errors", 1, lane.attributes)
+
+    @staticmethod
+    def _record_lag(lane: _Lane, enqueued: float) -> None:
+        sink = get_sink()
+        if sink is not None:
+            end_ns = time.time_ns()
+            lag_ns = int((time.monotonic() - enqueued) * 1e9)
+            sink.record_span(
+                Span("consumer.lag", lane.attributes, end_ns - lag_ns, end_ns)
+            )
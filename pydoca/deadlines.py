@@ -0,0 +1,67 @@
+"""Deadline of the current call, propagated to the adapters through contextvars."""
+import contextlib
+import time
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# time.monotonic() value after which the current call is abandoned
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("DEADLINE", default=None)
+
+
+class DeadlineExceededError(TimeoutError):
+    """If the deadline of the current call expired, the caller does not wait for the result anymore."""
+
+    def __init__(self, overrun: float) -> None:
+        super().__init__(f"Deadline exceeded by {overrun * 1000:.1f}ms")
+        self.overrun = overrun
+
+
+@contextlib.contextmanager
+def deadline(seconds: float) -> Iterator[float]:
+    """Sets the deadline of the calls made within the context, in seconds from now.
+
+    with pydoca.deadline(0.2):
+        AddToBudget().exec(cmd)
+
+    The deadline follows the context, to the threads of `asyncio.to_thread` and the asyncio tasks.
+    An enclosing deadline expiring earlier is kept, nested deadlines can only shorten it.
+    Yields the deadline, as a `time.monotonic()` value.
+    """
+    at = time.monotonic() + seconds
+    current = _DEADLINE.get()
+    if current is not None and current < at:
+        at = current
+    token = _DEADLINE.set(at)
+    try:
+        yield at
+    finally:
+        _DEADLINE.reset(token)
+
+
+def get_deadline() -> Optional[float]:
+    """Returns the deadline of the current call as a `time.monotonic()` value, None without deadline."""
+    return _DEADLINE.get()
+
+
+def remaining_time() -> Optional[float]:
+    """Returns the seconds left before the deadline (negative once expired), None without deadline.
+
+    Adapters use it to bound their own timeouts:
+
+    response = httpx.get(url, timeout=self.remaining_time())
+    """
+    at = _DEADLINE.get()
+    if at is None:
+        return None
+    return at - time.monotonic()
+
+
+def check_deadline() -> None:
+    """Raises DeadlineExceededError if the deadline of the current call expired.
+
+    Raises:
+        DeadlineExceededError: If the deadline expired.
+    """
+    at = _DEADLINE.get()
+    if at is not None and (now := time.monotonic()) > at:
+        raise DeadlineExceededError(now - at)
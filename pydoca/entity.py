@@ -1,12 +1,43 @@
 """Domain-Driven Design Entity."""
 import abc
-from typing import Optional, Union
+import copy
+from typing import TYPE_CHECKING, Any, ClassVar, Optional, Union
 
 import pydantic
 
 ID = Union[bytes, float, int, str]
 
 
+class _Mirror:
+    """Columns of an EntityList mirroring the fields of its entities, stale once a field is assigned in place."""
+
+    __slots__ = ("stale",)
+
+    def __init__(self) -> None:
+        self.stale = False
+
+
+def _mirror_assignments(entity_class: type["Entity"]) -> None:
+    """Makes the field assignments of the entity class stale the mirrors of its entities.
+
+    Installed once an entity of the class is held by an EntityList, the other classes keep the pydantic
+    assignment.
+    """
+    assign = entity_class.__setattr__
+
+    def __setattr__(self: Entity, name: str, value: Any) -> None:
+        assign(self, name, value)
+        try:
+            mirrors = self._mirrors
+        except AttributeError:
+            return
+        for mirror in mirrors:
+            mirror.stale = True
+
+    entity_class.__setattr__ = __setattr__  # type: ignore[method-assign,assignment]
+    entity_class.__mirrored__ = True
+
+
 class Entity(pydantic.BaseModel, abc.ABC):
     """Represents the core concepts of the business being model.
 
@@ -36,6 +67,14 @@ class Entity(pydantic.BaseModel, abc.ABC):
         __str__: Returns a string representation of the entity.
     """
 
+    # Mirrors of the EntityLists holding the entity, unset until added to one
+    __slots__ = ("_mirrors",)
+    if TYPE_CHECKING:
+        _mirrors: tuple[_Mirror, ...]
+
+    # Whether the field assignments make the mirrors stale, see _mirror_assignments
+    __mirrored__: ClassVar[bool] = False
+
     @pydantic.computed_field  # type: ignore  # https://github.com/python/mypy/issues/14461
     @property
     def id(self) -> ID:
@@ -45,6 +84,17 @@ class Entity(pydantic.BaseModel, abc.ABC):
     def _id(self) -> ID:
         """Returns the entity ID."""
 
+    def _mirrored_by(self, mirror: _Mirror) -> None:
+        """Registers the columns of an EntityList holding the entity, made stale by its field assignments."""
+        if not self.__mirrored__:
+            _mirror_assignments(self.__class__)
+        try:
+            mirrors = self._mirrors
+        except AttributeError:
+            mirrors = ()
+        if mirror not in mirrors:
+            object.__setattr__(self, "_mirrors", (*mirrors, mirror))
+
     def __eq__(self, other: object) -> bool:
         return isinstance(other, self.__class__) and self.id == other.id
 
@@ -55,6 +105,50 @@ class Entity(pydantic.BaseModel, abc.ABC):
         return f"{self.__class__.__name__} {self.id}"  # type: ignore[str-bytes-safe]
 
 
+class _FieldsSet(frozenset[str]):
+    """Immutable fields set shared between compact entities having the same set fields.
+
+    Pydantic adds the field name to the set on assignment, a no-op when already set,
+    CompactEntity replaces the shared set by a private one before assigning other fields.
+    """
+
+    def add(self, name: str) -> None:
+        if name not in self:
+            raise TypeError("Shared fields set can not be modified")
+
+    def __copy__(self) -> set[str]:
+        # Copies (model_copy) get a private mutable set pydantic can update
+        return set(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> set[str]:
+        return set(self)
+
+
+_FIELDS_SETS: dict[frozenset[str], _FieldsSet] = {}
+
+
+class CompactEntity(Entity, abc.ABC):
+    """Entity using less memory, for large in-memory working sets.
+
+    Instances having the same set fields share a single interned fields set, saving a set per instance
+    (more than 200 bytes for small entities).
+    Domain semantics are the same as Entity, assigning a field not set yet unshares the fields set.
+    """
+
+    def model_post_init(self, context: Any, /) -> None:
+        key = frozenset(self.__pydantic_fields_set__)
+        interned = _FIELDS_SETS.get(key)
+        if interned is None:
+            interned = _FIELDS_SETS.setdefault(key, _FieldsSet(key))
+        object.__setattr__(self, "__pydantic_fields_set__", interned)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        fields_set = self.__pydantic_fields_set__
+        if name not in fields_set and isinstance(fields_set, _FieldsSet):
+            object.__setattr__(self, "__pydantic_fields_set__", copy.copy(fields_set))
+        super().__setattr__(name, value)
+
+
 class EntityError(Exception):
     """Base classe for entity errors."""
 
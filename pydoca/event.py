@@ -1,12 +1,19 @@
 """Domain-Driven Design Event."""
+import abc
 import datetime
-from typing import Any
+import operator
+from typing import Any, Callable, ClassVar, Generic, Iterable, Optional, TypeVar
 
 import pydantic
 
+from .entity import ID
+from .instrumentation import count
 from .utils import utc_now
 from .value_object import ValueObject
 
+# Whether an Event class declares a compaction, the events are published as is otherwise
+_COMPACTION_DECLARED = False
+
 
 class Event(ValueObject):
     """Represents an event in the domain.
@@ -17,9 +24,21 @@ class Event(ValueObject):
 
     Attributes:
         timestamp: The timestamp of the event (default: utc now).
+        aggregate_id: The ID of the aggregate root that emitted the event, set when added to the aggregate.
+        __compaction__: How the events of the class committed by a unit of work are compacted before
+            being published, see `Compaction` (default: None, all of them are published).
     """
 
     timestamp: datetime.datetime = pydantic.Field(default_factory=utc_now)
+    aggregate_id: Optional[ID] = None
+    __compaction__: ClassVar[Optional["Compaction[Any]"]] = None
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        global _COMPACTION_DECLARED
+        super().__pydantic_init_subclass__(**kwargs)
+        if cls.__dict__.get("__compaction__") is not None:
+            _COMPACTION_DECLARED = True
 
     def __init__(self, **data: Any) -> None:
         if type(self) is Event:
@@ -27,3 +46,110 @@ class Event(ValueObject):
                 "Event cannot be instantiated directly. Please subclass it and define your attributes."
             )
         super().__init__(**data)
+
+    def _set_aggregate_id(self, aggregate_id: ID) -> None:
+        # The event is not published yet, it is completed once by its aggregate without copying it
+        self.__dict__["aggregate_id"] = aggregate_id
+        self.__pydantic_fields_set__.add("aggregate_id")
+
+
+EventT = TypeVar("EventT", bound=Event)
+
+
+class Compaction(abc.ABC, Generic[EventT]):
+    """Rule compacting the events of a class with the same key, declared on the Event class.
+
+    class BudgetRenamed(pydoca.Event):
+        __compaction__ = pydoca.LatestWins()
+        title: str
+
+    Events are grouped by class and key values, the events of the other classes are kept as is.
+    The compacted events of a group take the position of its last event, the events keep their order.
+
+    Attributes:
+        key: Names of the event fields grouping the events (default: the aggregate ID).
+    """
+
+    def __init__(self, key: tuple[str, ...] = ("aggregate_id",)) -> None:
+        self.key = key
+        self.key_of: Callable[[Event], Any] = operator.attrgetter(*key)
+
+    @abc.abstractmethod
+    def compact(self, events: list[EventT]) -> list[Event]:
+        """Returns the events replacing the group, of at least 2 events."""
+
+
+class LatestWins(Compaction[EventT]):
+    """Keeps the last event of each key, for events carrying a state rather than a change."""
+
+    def compact(self, events: list[EventT]) -> list[Event]:
+        return [events[-1]]
+
+
+class Merge(Compaction[EventT]):
+    """Merges the events of each key into the event returned by `merge`.
+
+    class IncomeAdded(pydoca.Event):
+        __compaction__ = pydoca.Merge(lambda events: IncomesAdded(sources=[e.source for e in events]))
+        source: str
+
+    The merged event gets the aggregate ID of the events if it does not set one.
+
+    Attributes:
+        merge: Returns the event replacing the events, in their emission order.
+    """
+
+    def __init__(
+        self,
+        merge: Callable[[list[EventT]], Event],
+        key: tuple[str, ...] = ("aggregate_id",),
+    ) -> None:
+        super().__init__(key)
+        self.merge = merge
+
+    def compact(self, events: list[EventT]) -> list[Event]:
+        merged = self.merge(events)
+        aggregate_ids = {event.aggregate_id for event in events}
+        if merged.aggregate_id is None and len(aggregate_ids) == 1:
+            merged._set_aggregate_id(aggregate_ids.pop())  # type: ignore[arg-type]
+        return [merged]
+
+
+def compact_events(events: Iterable[Event]) -> Iterable[Event]:
+    """Returns the events compacted by the rules of their classes, see `Compaction`.
+
+    Returns the events unchanged if no Event class declares a compaction.
+    """
+    if not _COMPACTION_DECLARED:
+        return events
+    events = list(events)
+    groups: dict[tuple[type[Event], Any], list[int]] = {}
+    for position, event in enumerate(events):
+        compaction = event.__compaction__
+        if compaction is not None:
+            key = (type(event), compaction.key_of(event))
+            groups.setdefault(key, []).append(position)
+
+    replacements: dict[int, list[Event]] = {}
+    for (event_class, _), positions in groups.items():
+        if len(positions) < 2:
+            continue
+        compaction = event_class.__compaction__
+        assert compaction is not None
+        for position in positions[:-1]:
+            replacements[position] = []
+        replacements[positions[-1]] = compaction.compact(
+            [events[position] for position in positions]
+        )
+    if not replacements:
+        return events
+
+    compacted: list[Event] = []
+    for position, event in enumerate(events):
+        replacement = replacements.get(position)
+        if replacement is None:
+            compacted.append(event)
+        else:
+            compacted.extend(replacement)
+    count("event_bus.compacted", len(events) - len(compacted))
+    return compacted
@@ -0,0 +1,171 @@
+"""Group commit, merging the commits of concurrent units of work into one physical commit."""
+import threading
+import time
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+from .deadlines import DeadlineExceededError, remaining_time
+from .instrumentation import count
+
+T = TypeVar("T")
+
+# Commits the batch of requests, returns the error of each request, None if committed
+FlushFn = Callable[[list[T]], list[Optional[BaseException]]]
+
+
+class GroupCommitError(Exception):
+    """If the physical commit of a batch failed, raised to the units of work not leading the batch.
+
+    Attributes:
+        error: Error of the physical commit, raised to the leader and the cause of this exception.
+    """
+
+    def __init__(self, error: BaseException) -> None:
+        super().__init__(f"Group commit failed: {error!r}")
+        self.error = error
+        self.__cause__ = error
+
+
+class _Request(Generic[T]):
+    __slots__ = ("request", "flush", "done", "lead", "error")
+
+    def __init__(self, request: T, flush: FlushFn[T]) -> None:
+        self.request = request
+        self.flush = flush
+        self.done = threading.Event()
+        self.lead = False
+        self.error: Optional[BaseException] = None
+
+
+class _Group(Generic[T]):
+    """Requests of a database waiting to be committed, and whether a thread leads their next batch."""
+
+    __slots__ = ("queue", "leading", "full")
+
+    def __init__(self, lock: threading.Lock) -> None:
+        self.queue: list[_Request[T]] = []
+        self.leading = False
+        self.full = threading.Condition(lock)
+
+
+class GroupCommit(Generic[T]):
+    """Coordinates the commits of the threads writing to the same database, see `SQLiteSession`.
+
+    class BudgetDatabase(pydoca.SQLiteSession):
+        database = "budget.db"
+        __group_commit__ = pydoca.GroupCommit(max_batch=64, window=0.0005)
+
+    The first thread committing becomes the leader: it waits up to `window` for other commits, then
+    commits up to `max_batch` of them in one physical commit, with its own connection. The commits
+    arriving meanwhile wait for the next batch, led by the first of them. Each thread gets the result
+    of its own writes, raising its error if they failed, once the batch is durable. The threads wait
+    until their deadline: a commit still queued then is dropped, one already in a batch being flushed
+    may be committed.
+
+    Commits are only merged with the commits of the same key, the database: a coordinator inherited by
+    sessions on other databases batches each database apart.
+
+    Counters emitted:
+        group_commit.batches: Physical commits.
+        group_commit.commits: Commits merged in the batches.
+
+    Attributes:
+        max_batch: Maximum number of commits merged in one physical commit (default: 64).
+        window: Seconds the leader waits for other commits (default: 0, only the commits arriving
+            during the previous physical commit are merged).
+    """
+
+    def __init__(self, max_batch: int = 64, window: float = 0.0) -> None:
+        if max_batch < 1 or window < 0:
+            raise ValueError("max_batch must be positive and window not negative")
+        self.max_batch = max_batch
+        self.window = window
+        self._groups: dict[Hashable, _Group[T]] = {}
+        self._lock = threading.Lock()
+
+    def commit(self, request: T, flush: FlushFn[T], key: Hashable = None) -> None:
+        """Commits the request with the next batch of the key, flushed by `flush` if this thread leads it.
+
+        Raises:
+            BaseException: The error of the request, or of the physical commit if leading the batch.
+            GroupCommitError: If the physical commit of the batch led by another thread failed.
+            DeadlineExceededError: If the deadline expired before the batch was committed.
+        """
+        waiting = _Request(request, flush)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Group(self._lock)
+            group.queue.append(waiting)
+            if group.leading:
+                if len(group.queue) >= self.max_batch:
+                    group.full.notify()
+            else:
+                group.leading = waiting.lead = True
+        if not waiting.lead and not waiting.done.wait(remaining_time()):
+            self._expire(group, waiting)
+        if waiting.lead:
+            self._lead(group, waiting)
+        if waiting.error is not None:
+            raise waiting.error
+
+    def _expire(self, group: _Group[T], waiting: _Request[T]) -> None:
+        with self._lock:
+            if waiting.lead:
+                return  # Leads the next batch, the threads queued behind wait for it
+            if waiting in group.queue:
+                group.queue.remove(waiting)
+        raise DeadlineExceededError(-(remaining_time() or 0.0))
+
+    def _lead(self, group: _Group[T], leader: _Request[T]) -> None:
+        batch: list[_Request[T]] = []
+        try:
+            if self.window:
+                deadline = time.monotonic() + self.window
+                with self._lock:
+                    while len(group.queue) < self.max_batch:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not group.full.wait(remaining):
+                            break
+            with self._lock:
+                # The leader is the first request of the queue
+                batch = group.queue[: self.max_batch]
+                del group.queue[: self.max_batch]
+            self._commit_batch(leader, batch)
+        except BaseException as exc:
+            # The requests of the batch not released yet fail with the error of the leader
+            for waiting in batch:
+                if waiting is not leader and not waiting.done.is_set():
+                    waiting.error = GroupCommitError(exc)
+                    waiting.lead = False
+                    waiting.done.set()
+            raise
+        finally:
+            self._hand_over(group, leader)
+
+    def _commit_batch(self, leader: _Request[T], batch: list[_Request[T]]) -> None:
+        try:
+            errors = leader.flush([waiting.request for waiting in batch])
+        except BaseException as exc:
+            # Raised as is by the leader only, each thread gets its own exception
+            errors = [
+                exc if waiting is leader else GroupCommitError(exc) for waiting in batch
+            ]
+        count("group_commit.batches")
+        count("group_commit.commits", len(batch))
+        for waiting, error in zip(batch, errors, strict=True):
+            waiting.error = error
+            waiting.lead = False
+            if waiting is not leader:
+                waiting.done.set()
+
+    def _hand_over(self, group: _Group[T], leader: _Request[T]) -> None:
+        with self._lock:
+            if leader in group.queue:
+                group.queue.remove(leader)  # Failed before taking its batch
+            if group.queue:
+                # Arrived during the commit, the first one leads the next batch
+                following = group.queue[0]
+                following.lead = True
+                following.done.set()
+            else:
+                group.leading = False
@@ -0,0 +1,226 @@
+"""Results of the use cases by idempotency key, returned to the duplicate commands."""
+import abc
+import collections.abc
+import decimal
+import pickle
+import threading
+from typing import Any, Callable, NamedTuple, Optional
+
+import pydantic
+
+from .codec import codec
+from .deadlines import DeadlineExceededError, remaining_time
+from .repository import Session
+
+
+class IdempotencyKeyReusedError(Exception):
+    """If an idempotency key is reused with a different command."""
+
+    def __init__(self, key: str) -> None:
+        super().__init__(f"Idempotency key {key} already used by a different command")
+        self.key = key
+
+
+class StoredResult(NamedTuple):
+    """Result of a command execution, with the command it was returned for."""
+
+    command: str  # JSON of the command, without its idempotency key
+    result: Any  # Encoded, immutable values are kept as is
+
+
+class _Encoded(NamedTuple):
+    """Stored result, decoded again for each duplicate so none gets the instance of another."""
+
+    model: Optional[type[pydantic.BaseModel]]  # Decoded with its codec, unpickled if None
+    data: bytes
+
+
+# Results returned as is to the duplicates, they can not be modified
+_IMMUTABLE = (type(None), bool, int, float, str, bytes, decimal.Decimal)
+
+
+def _encode(result: Any) -> Any:
+    if type(result) in _IMMUTABLE:
+        return result
+    if isinstance(result, pydantic.BaseModel):
+        return _Encoded(type(result), codec(type(result)).encode(result))
+    return _Encoded(None, pickle.dumps(result))
+
+
+def _decode(result: Any) -> Any:
+    if not isinstance(result, _Encoded):
+        return result
+    if result.model is None:
+        return pickle.loads(result.data)
+    return codec(result.model).decode(result.data)
+
+
+def _copy_error(error: BaseException) -> BaseException:
+    # Not initialized again, exception classes can take other arguments than their args
+    copied = error.__class__.__new__(error.__class__, *error.args)
+    copied.__dict__.update(error.__dict__)
+    return copied
+
+
+class _Call:
+    """Execution in flight, awaited by the duplicate commands."""
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.done = threading.Event()
+        self.result: Any = None  # Encoded
+        self.error: Optional[BaseException] = None
+
+
+class ResultStore(abc.ABC):
+    """Keeps the results of the commands by idempotency key.
+
+    Executing a command whose key has a stored result returns it without executing the command again.
+    Duplicates of a command being executed wait for its result instead of executing it concurrently, until
+    their own deadline. Failed executions are not stored, the next duplicate executes the command again:
+    the waiting duplicates raise a copy of the error, caused by it.
+
+    Results are stored encoded, pydantic models with their codec and the other mutable values pickled,
+    each duplicate gets its own copy.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call] = {}
+        self._calls_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[StoredResult]:
+        """Returns the stored result, None if not found."""
+
+    @abc.abstractmethod
+    def put(self, key: str, stored: StoredResult) -> None:
+        """Stores the result."""
+
+    def execute(self, key: str, command: str, fn: Callable[[], Any]) -> Any:
+        """Returns the stored result of the key, or executes the function once for concurrent duplicates.
+
+        Raises:
+            IdempotencyKeyReusedError: If the key was used by a different command.
+            DeadlineExceededError: If the deadline expired while waiting for a duplicate being executed.
+        """
+        if (stored := self.get(key)) is not None:
+            return _decode(self._checked(key, command, stored.command, stored.result))
+        with self._calls_lock:
+            call = self._calls.get(key)
+            first = call is None
+            if call is None:
+                call = self._calls[key] = _Call(command)
+        if not first:
+            if not call.done.wait(remaining_time()):
+                raise DeadlineExceededError(-(remaining_time() or 0.0))
+            if call.error is not None:
+                raise _copy_error(call.error) from call.error
+            return _decode(self._checked(key, command, call.command, call.result))
+
+        try:
+            # Stored by a call completed since the lookup
+            if (stored := self.get(key)) is not None:
+                call.result = self._checked(key, command, stored.command, stored.result)
+                return _decode(call.result)
+            result = fn()
+            call.result = _encode(result)
+            self.put(key, StoredResult(command, call.result))
+            return result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._calls_lock:
+                del self._calls[key]
+            call.done.set()
+
+    @staticmethod
+    def _checked(key: str, command: str, stored_command: str, result: Any) -> Any:
+        if command != stored_command:
+            raise IdempotencyKeyReusedError(key)
+        return result
+
+
+class InMemoryResultStore(ResultStore):
+    """Keeps the last results used, up to `maxsize`."""
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+        self.results: collections.OrderedDict[str, StoredResult] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResult]:
+        with self._lock:
+            stored = self.results.get(key)
+            if stored is not None:
+                self.results.move_to_end(key)
+            return stored
+
+    def put(self, key: str, stored: StoredResult) -> None:
+        with self._lock:
+            self.results[key] = stored
+            self.results.move_to_end(key)
+            while len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+
+
+class SessionResultStore(ResultStore):
+    """Stores the results in a Session also implementing MutableMapping, like InMemoryMappingSession.
+
+    Keys are prefixed by the namespace. Each result is numbered, the oldest results are deleted beyond
+    `maxsize`, a few at each put. Each thread starts its own session from the session class, committed
+    with each result: the sessions of the units of work are never committed by the store.
+    """
+
+    def __init__(
+        self,
+        sessionT: type[Session],
+        namespace: str = "idempotency",
+        maxsize: int = 10_000,
+    ) -> None:
+        if not issubclass(sessionT, collections.abc.MutableMapping):
+            raise TypeError(f"{sessionT.__name__} is not a MutableMapping")
+        super().__init__()
+        self.sessionT = sessionT
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> Any:
+        """Session of the current thread, started on first use."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self.sessionT.start()
+        return session
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _number_key(self, number: int) -> str:
+        return f"{self.namespace}#{number}"
+
+    def get(self, key: str) -> Optional[StoredResult]:
+        numbered: Optional[tuple[int, StoredResult]] = self.session.get(self._key(key))
+        return None if numbered is None else numbered[1]
+
+    def put(self, key: str, stored: StoredResult) -> None:
+        session = self.session
+        with self._lock:
+            # Results are numbered from first to last, the key of each number is stored to delete the oldest
+            first, last = session.get(f"{self.namespace}#range", (1, 0))
+            last += 1
+            session[self._number_key(last)] = key
+            session[self._key(key)] = (last, stored)
+            while last - first >= self.maxsize:
+                evicted = session.pop(self._number_key(first), None)
+                numbered = None if evicted is None else session.get(self._key(evicted))
+                if numbered is not None and numbered[0] == first:
+                    del session[self._key(evicted)]  # Not stored again since
+                first += 1
+            session[f"{self.namespace}#range"] = (first, last)
+            session.commit()
@@ -0,0 +1,274 @@
+"""Timing spans and counters emitted by pydoca hot paths.
+
+Instrumentation is disabled until a sink is set, instrumented functions then only pay a global lookup:
+
+pydoca.set_sink(pydoca.InMemorySink())
+
+Spans emitted:
+    use_case.inject: Adapters injection when instantiating a UseCase.
+    use_case.exec: UseCase.exec calls, with the use case and command class names as attributes.
+    uow.enter, uow.commit, uow.exit: UnitOfWorkBase context manager and commit.
+    repository.call: Repository implementations public methods, with the repository and method names.
+    event_bus.publish: EventBus.publish_events.
+    bulkhead.queue_wait: Time waited for a Bulkhead slot, with the use case name.
+    consumer.lag: Time an event waited in its PartitionedConsumer lane, with the lane index.
+    snapshot.save: Writing of an InMemorySession snapshot file, with the database name.
+
+Counters emitted:
+    event_bus.events: Number of events published.
+    event_bus.compacted: Number of events removed by the compaction rules of their classes.
+    uow.rollbacks: Number of rolled back units of work.
+    use_case.conflict_retries: Executions retried after a ConcurrencyConflictError.
+    use_case.idempotent_hits: Commands answered with the stored result of their idempotency key.
+    bulkhead.rejected: Calls rejected by a Bulkhead, with the use case name and the reason.
+    consumer.errors: Events whose PartitionedConsumer handler raised, with the lane index.
+    group_commit.batches, group_commit.commits: Physical commits of a GroupCommit and the commits merged.
+    aggregate_cache.hits, aggregate_cache.misses: Repository reads answered or not by their AggregateCache.
+    snapshot.bytes: Size of the InMemorySession snapshot files written, with the database name.
+"""
+import abc
+import functools
+import math
+import threading
+import time
+from typing import Any, Callable, Mapping, NamedTuple, Optional, TypeVar, cast
+
+Attributes = Mapping[str, str]
+AttributesFactory = Callable[..., Attributes]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span(NamedTuple):
+    """A timed operation, shaped like an OpenTelemetry span.
+
+    Attributes:
+        name: Name of the operation.
+        attributes: Attributes describing the operation.
+        start_ns: Start time, in nanoseconds since the epoch.
+        end_ns: End time, in nanoseconds since the epoch.
+        status: "OK" or "ERROR" if the operation raised.
+    """
+
+    name: str
+    attributes: Attributes
+    start_ns: int
+    end_ns: int
+    status: str = "OK"
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+
+class Sink(abc.ABC):
+    """Receives the spans and counters emitted by pydoca."""
+
+    @abc.abstractmethod
+    def record_span(self, span: Span) -> None:
+        """Records a finished span."""
+
+    @abc.abstractmethod
+    def add(self, name: str, value: int, attributes: Attributes) -> None:
+        """Adds value to the counter."""
+
+
+_SINK: Optional[Sink] = None
+
+_NO_ATTRIBUTES: Attributes = {}
+
+
+def set_sink(sink: Optional[Sink]) -> None:
+    """Enables instrumentation with the sink, or disables it if None."""
+    global _SINK
+    _SINK = sink
+
+
+def get_sink() -> Optional[Sink]:
+    return _SINK
+
+
+def instrument(
+    name: str, attributes: Attributes | AttributesFactory = _NO_ATTRIBUTES
+) -> Callable[[F], F]:
+    """Decorator emitting a span for each call of the function when a sink is set.
+
+    Args:
+        name: Span name.
+        attributes: Span attributes, or a callable receiving the call arguments and returning them.
+            The callable is only evaluated when instrumentation is enabled.
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            sink = _SINK
+            if sink is None:
+                return func(*args, **kwargs)
+
+            status = "OK"
+            start_ns = time.time_ns()
+            start_perf_ns = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                status = "ERROR"
+                raise
+            finally:
+                end_ns = start_ns + time.perf_counter_ns() - start_perf_ns
+                attrs = (
+                    attributes(*args, **kwargs) if callable(attributes) else attributes
+                )
+                sink.record_span(Span(name, attrs, start_ns, end_ns, status))
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def count(name: str, value: int = 1, attributes: Attributes = _NO_ATTRIBUTES) -> None:
+    """Adds value to the counter when a sink is set."""
+    sink = _SINK
+    if sink is not None:
+        sink.add(name, value, attributes)
+
+
+class Histogram:
+    """Log-linear histogram of durations with bounded memory.
+
+    Each power of two is split in `precision` buckets, bounding the relative error of percentiles to
+    about 2^(1/precision) - 1 (9% with the default precision of 8).
+    """
+
+    def __init__(self, precision: int = 8) -> None:
+        self.precision = precision
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        bucket = int(math.log2(value) * self.precision) if value > 0 else -1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> float:
+        """Returns the approximate q percentile (0 to 100) of the recorded values."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                if bucket < 0:
+                    return 0.0
+                # Upper bound of the bucket, clamped to the real observed range
+                return min(
+                    max(2 ** ((bucket + 1) / self.precision), self.min), self.max
+                )
+        return float(self.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+SeriesKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+class InMemorySink(Sink):
+    """Aggregates span durations (nanoseconds) in histograms and counters in memory.
+
+    sink = pydoca.InMemorySink()
+    pydoca.set_sink(sink)
+    ...
+    sink.histogram("use_case.exec", use_case="AddToBudget").percentile(99)
+    """
+
+    def __init__(self, precision: int = 8) -> None:
+        self.precision = precision
+        self.histograms: dict[SeriesKey, Histogram] = {}
+        self.counters: dict[SeriesKey, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, attributes: Attributes) -> SeriesKey:
+        return name, tuple(sorted(attributes.items()))
+
+    def record_span(self, span: Span) -> None:
+        key = self._key(span.name, span.attributes)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.precision)
+            histogram.record(span.duration_ns)
+
+    def add(self, name: str, value: int, attributes: Attributes) -> None:
+        key = self._key(name, attributes)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def histogram(self, name: str, **attributes: str) -> Histogram:
+        return self.histograms.get(
+            self._key(name, attributes), Histogram(self.precision)
+        )
+
+    def counter(self, name: str, **attributes: str) -> int:
+        return self.counters.get(self._key(name, attributes), 0)
+
+    def summary(self) -> list[dict[str, Any]]:
+        """Returns count, mean, p50 and p99 (nanoseconds) of every span series."""
+        with self._lock:
+            items = list(self.histograms.items())
+        return [
+            {
+                "name": name,
+                "attributes": dict(attributes),
+                "count": histogram.count,
+                "mean": histogram.mean,
+                "p50": histogram.percentile(50),
+                "p99": histogram.percentile(99),
+            }
+            for (name, attributes), histogram in items
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+class OpenTelemetrySink(Sink):
+    """Forwards spans and counters to OpenTelemetry.
+
+    pydoca does not depend on OpenTelemetry, the tracer and meter are the ones returned by
+    `opentelemetry.trace.get_tracer` and `opentelemetry.metrics.get_meter`.
+    """
+
+    def __init__(self, tracer: Any, meter: Optional[Any] = None) -> None:
+        self.tracer = tracer
+        self.meter = meter
+        self._counters: dict[str, Any] = {}
+
+    def record_span(self, span: Span) -> None:
+        otel_span = self.tracer.start_span(
+            span.name,
+            start_time=span.start_ns,
+            attributes={**span.attributes, "pydoca.status": span.status},
+        )
+        otel_span.end(end_time=span.end_ns)
+
+    def add(self, name: str, value: int, attributes: Attributes) -> None:
+        if self.meter is None:
+            return
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters[name] = self.meter.create_counter(name)
+        counter.add(value, attributes=dict(attributes))
@@ -0,0 +1,889 @@
+"""In-memory Session and Repository adapters, with snapshot isolation and secondary indexes."""
+import bisect
+import collections
+import collections.abc
+import contextlib
+import operator
+import threading
+from typing import (
+    Any,
+    ClassVar,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Self,
+    Union,
+    cast,
+)
+
+from .aggregate_root import AggregateRoot
+from .codec import Row, codec
+from .collection import LazyList, lazy_fields
+from .entity import ID
+from .repository import AggregateRootT, Cursor, Page, Repository, Session, Where
+from .unit_of_work import ConcurrencyConflictError
+
+HASH = "hash"
+SORTED = "sorted"
+
+_MISSING = object()
+
+
+class _HashIndex:
+    """IDs of the aggregates by field value, for equality queries."""
+
+    def __init__(self) -> None:
+        self.buckets: dict[Any, dict[ID, None]] = {}
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        # Buckets are copied by the readers
+        yield
+
+    def add(self, aggregate_id: ID, key: Any) -> None:
+        self.buckets.setdefault(key, {})[aggregate_id] = None
+
+    def discard(self, aggregate_id: ID, key: Any) -> None:
+        bucket = self.buckets.get(key)
+        if bucket is not None and bucket.pop(aggregate_id, _MISSING) is not _MISSING:
+            if not bucket:
+                del self.buckets[key]
+
+    def equal(self, key: Any) -> list[ID]:
+        bucket = self.buckets.get(key)
+        # Copied in a single C call, readers never iterate a bucket being written
+        return list(bucket) if bucket else []
+
+
+class _SortedIndex:
+    """IDs of the aggregates sorted by field value, for range queries.
+
+    Entries are (value, ID) tuples kept in sorted blocks of bounded size, so a write copies the blocks it
+    changes and the blocks list instead of the whole index. Blocks are never changed once published: readers
+    get a consistent state with a single attribute read while a writer builds the next one, once per batch
+    of writes. None values are not indexed.
+    """
+
+    _LOAD = 512
+
+    def __init__(self) -> None:
+        # Last entry of each block, and the blocks
+        self._state: tuple[list[tuple[Any, ID]], list[list[tuple[Any, ID]]]] = ([], [])
+        self._next: Optional[
+            tuple[list[tuple[Any, ID]], list[list[tuple[Any, ID]]]]
+        ] = None
+        self._copied: set[int] = set()  # IDs of the blocks copied for the next state
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """Publishes the writes made in the block at once."""
+        if self._next is not None:
+            yield
+            return
+        maxes, blocks = self._state
+        self._next = (maxes.copy(), blocks.copy())
+        try:
+            yield
+            self._state = self._next
+        finally:
+            self._next = None
+            self._copied.clear()
+
+    def _block(
+        self, blocks: list[list[tuple[Any, ID]]], i: int
+    ) -> list[tuple[Any, ID]]:
+        # Copy of the published block, once per batch
+        block = blocks[i]
+        if id(block) not in self._copied:
+            block = blocks[i] = block.copy()
+            self._copied.add(id(block))
+        return block
+
+    def add(self, aggregate_id: ID, key: Any) -> None:
+        if key is None:
+            return
+        with self.batch():
+            assert self._next is not None
+            entry = (key, aggregate_id)
+            maxes, blocks = self._next
+            if not blocks:
+                blocks.append([entry])
+                maxes.append(entry)
+                self._copied.add(id(blocks[0]))
+                return
+            i = min(bisect.bisect_left(maxes, entry), len(blocks) - 1)
+            j = bisect.bisect_left(blocks[i], entry)
+            if j < len(blocks[i]) and blocks[i][j] == entry:
+                return  # Already indexed
+            block = self._block(blocks, i)
+            block.insert(j, entry)
+            maxes[i] = block[-1]
+            if len(block) > 2 * self._LOAD:
+                halves = [block[: self._LOAD], block[self._LOAD :]]
+                self._copied.update(map(id, halves))
+                blocks[i : i + 1] = halves
+                maxes[i : i + 1] = [half[-1] for half in halves]
+
+    def discard(self, aggregate_id: ID, key: Any) -> None:
+        if key is None:
+            return
+        with self.batch():
+            assert self._next is not None
+            entry = (key, aggregate_id)
+            maxes, blocks = self._next
+            i = bisect.bisect_left(maxes, entry)
+            if i == len(blocks):
+                return
+            j = bisect.bisect_left(blocks[i], entry)
+            if j == len(blocks[i]) or blocks[i][j] != entry:
+                return
+            block = self._block(blocks, i)
+            del block[j]
+            if block:
+                maxes[i] = block[-1]
+            else:
+                del blocks[i]
+                del maxes[i]
+
+    def range(self, start: Any = None, stop: Any = None) -> list[ID]:
+        """Returns the IDs of the values from start included to stop excluded, in order."""
+        maxes, blocks = self._state
+        ids: list[ID] = []
+        # (start,) sorts before every (start, ID) entry
+        i = 0 if start is None else bisect.bisect_left(maxes, (start,))
+        for block in blocks[i:]:
+            j = 0 if start is None else bisect.bisect_left(block, (start,))
+            start = None
+            for key, aggregate_id in block[j:] if j else block:
+                if stop is not None and key >= stop:
+                    return ids
+                ids.append(aggregate_id)
+        return ids
+
+    def equal(self, key: Any) -> list[ID]:
+        maxes, blocks = self._state
+        ids: list[ID] = []
+        i = bisect.bisect_left(maxes, (key,))
+        for block in blocks[i:]:
+            for entry_key, aggregate_id in block[bisect.bisect_left(block, (key,)) :]:
+                if entry_key != key:
+                    return ids
+                ids.append(aggregate_id)
+        return ids
+
+
+Index = Union[_HashIndex, _SortedIndex]
+
+_INDEXES: dict[str, type[Index]] = {HASH: _HashIndex, SORTED: _SortedIndex}
+
+
+class _Version(NamedTuple):
+    """Row committed at `seq`, None if deleted, linked to the previous version of the row."""
+
+    seq: int
+    row: Any  # Row of the aggregate or rows of its LazyList entities
+    previous: Optional["_Version"]
+
+
+def _visible(version: Optional[_Version], snapshot: Optional[int]) -> Any:
+    """Returns the row of the version committed at the snapshot, the last one if the snapshot is None."""
+    if snapshot is not None:
+        while version is not None and version.seq > snapshot:
+            version = version.previous
+    return None if version is None else version.row
+
+
+# Key of a versioned row: the LazyList field (None for the aggregate rows) and the aggregate ID
+_RowKey = tuple[Optional[str], ID]
+
+
+class _Table:
+    """Versioned rows of the aggregates of a type, the rows of their LazyList entities and their indexes.
+
+    Writes never change a published version: a commit links a new version in front of the previous one,
+    which is dropped once no snapshot can read it. Indexes keep the values of the previous versions as
+    long as they can be read too, the queries check the rows they return.
+    """
+
+    def __init__(self) -> None:
+        self.rows: dict[ID, _Version] = {}
+        self.children: dict[str, dict[ID, _Version]] = {}
+        self.indexes: dict[str, Index] = {}
+        self.keys: dict[str, dict[ID, Any]] = {}  # Last indexed value by field
+        self.size = 0
+        self.sizes: list[tuple[int, int]] = []  # Size after each commit changing it
+        # Rows with previous versions, by last commit
+        self._stale: dict[_RowKey, int] = {}
+        # Previous index values, by last commit
+        self._discards: dict[tuple[str, ID, Any], int] = {}
+        # Numbers of the aggregates in insertion order for keyset pagination, None until first listed
+        self.numbers: Optional[dict[ID, int]] = None
+        # Increasing numbers and their IDs, the entries of the pruned aggregates are skipped until compacted
+        self.order: tuple[list[int], list[ID]] = ([], [])
+        self._last_number = 0
+
+    def count(self, snapshot: Optional[int]) -> int:
+        for seq, size in reversed(self.sizes):
+            if snapshot is None or seq <= snapshot:
+                return size
+        return 0
+
+    def ensure_indexes(
+        self,
+        aggregate_class: type[AggregateRoot],
+        indexes: Mapping[str, str],
+        seq: int,
+    ) -> None:
+        load = codec(aggregate_class).load
+        for field, kind in indexes.items():
+            if field in self.indexes:
+                continue
+            if kind not in _INDEXES:
+                raise ValueError(
+                    f"Unknown {kind} index, use pydoca.HASH or pydoca.SORTED"
+                )
+            if field not in aggregate_class.model_fields:
+                raise KeyError(f"{aggregate_class.__name__} has no field {field}")
+            index, keys = _INDEXES[kind](), {}
+            with index.batch():
+                for aggregate_id, version in self.rows.items():
+                    if version.row is not None:
+                        keys[aggregate_id] = getattr(load(version.row), field)
+                    # Values of the previous versions are kept as long as they can be read
+                    previous: Optional[_Version] = version
+                    while previous is not None:
+                        if previous.row is not None:
+                            key = getattr(load(previous.row), field)
+                            index.add(aggregate_id, key)
+                            if keys.get(aggregate_id, _MISSING) != key:
+                                self._discard(field, aggregate_id, key, seq)
+                        previous = previous.previous
+            self.keys[field] = keys
+            self.indexes[field] = index
+
+    def ensure_order(self) -> None:
+        """Numbers the aggregates, then each new one when first committed."""
+        if self.numbers is not None:
+            return
+        ids = list(self.rows)
+        self._last_number = len(ids)
+        self.order = (list(range(1, len(ids) + 1)), ids)
+        self.numbers = dict(zip(ids, self.order[0], strict=True))
+
+    def _number(self, aggregate_id: ID) -> None:
+        assert self.numbers is not None
+        self._last_number += 1
+        # Numbered before being listed, readers skip the entries of the IDs having another number
+        self.numbers[aggregate_id] = self._last_number
+        numbers, ids = self.order
+        ids.append(aggregate_id)
+        numbers.append(self._last_number)
+
+    def _unnumber(self, aggregate_id: ID) -> None:
+        assert self.numbers is not None
+        del self.numbers[aggregate_id]
+        numbers, ids = self.order
+        if len(self.numbers) * 2 < len(ids):
+            # Compacted once half the entries are skipped, readers keep the lists they read
+            entries = [
+                (number, aggregate_id)
+                for number, aggregate_id in zip(numbers, ids, strict=True)
+                if self.numbers.get(aggregate_id) == number
+            ]
+            self.order = (
+                [number for number, _ in entries],
+                [aggregate_id for _, aggregate_id in entries],
+            )
+
+    def _mark(self, key: _RowKey, seq: int) -> None:
+        # Moved last, the marks are ordered by commit
+        self._stale.pop(key, None)
+        self._stale[key] = seq
+
+    def _discard(self, field: str, aggregate_id: ID, key: Any, seq: int) -> None:
+        self._discards.pop((field, aggregate_id, key), None)
+        self._discards[field, aggregate_id, key] = seq
+
+    def _link(
+        self,
+        versions: dict[ID, _Version],
+        field: Optional[str],
+        aggregate_id: ID,
+        row: Any,
+        seq: int,
+    ) -> None:
+        previous = versions.get(aggregate_id)
+        versions[aggregate_id] = _Version(seq, row, previous)
+        if previous is not None:
+            self._mark((field, aggregate_id), seq)
+        elif field is None and self.numbers is not None:
+            self._number(aggregate_id)
+
+    def put(
+        self,
+        aggregate: AggregateRoot,
+        row: Row,
+        children: dict[str, list[Row]],
+        seq: int,
+    ) -> None:
+        aggregate_id = aggregate.id
+        # Indexed before the row is visible, readers check the rows of the IDs they find
+        for field, index in self.indexes.items():
+            keys = self.keys[field]
+            key, previous = getattr(aggregate, field), keys.get(aggregate_id, _MISSING)
+            if previous is _MISSING or previous != key:
+                index.add(aggregate_id, key)
+                keys[aggregate_id] = key
+                if previous is not _MISSING:
+                    self._discard(field, aggregate_id, previous, seq)
+        head = self.rows.get(aggregate_id)
+        if head is None or head.row is None:
+            self.size += 1
+        self._link(self.rows, None, aggregate_id, row, seq)
+        for field, entity_rows in children.items():
+            self._link(
+                self.children.setdefault(field, {}),
+                field,
+                aggregate_id,
+                entity_rows,
+                seq,
+            )
+
+    def delete(self, aggregate_id: ID, seq: int) -> None:
+        head = self.rows.get(aggregate_id)
+        if head is None or head.row is None:
+            return
+        self.size -= 1
+        self._link(self.rows, None, aggregate_id, None, seq)
+        for field, versions in self.children.items():
+            if aggregate_id in versions:
+                self._link(versions, field, aggregate_id, None, seq)
+        for field, keys in self.keys.items():
+            key = keys.pop(aggregate_id, _MISSING)
+            if key is not _MISSING:
+                self._discard(field, aggregate_id, key, seq)
+
+    def batch(self) -> contextlib.ExitStack:
+        """Publishes the index writes made in the block at once."""
+        stack = contextlib.ExitStack()
+        for index in self.indexes.values():
+            stack.enter_context(index.batch())
+        return stack
+
+    def publish(self, seq: int) -> None:
+        """Publishes the size of the table after the commit."""
+        if not self.sizes or self.sizes[-1][1] != self.size:
+            self.sizes.append((seq, self.size))
+
+    def prune(self, oldest: int) -> None:
+        """Drops the versions and index values no snapshot from `oldest` can read."""
+        while self._stale:
+            (field, aggregate_id), seq = next(iter(self._stale.items()))
+            if seq > oldest:
+                break
+            del self._stale[field, aggregate_id]
+            versions = self.rows if field is None else self.children[field]
+            head = versions[aggregate_id]
+            if head.row is None:
+                del versions[aggregate_id]
+                if field is None and self.numbers is not None:
+                    self._unnumber(aggregate_id)
+            else:
+                versions[aggregate_id] = _Version(head.seq, head.row, None)
+        with self.batch():
+            while self._discards:
+                (field, aggregate_id, key), seq = next(iter(self._discards.items()))
+                if seq > oldest:
+                    break
+                del self._discards[field, aggregate_id, key]
+                if self.keys[field].get(aggregate_id, _MISSING) != key:
+                    self.indexes[field].discard(aggregate_id, key)
+        # Keeps the size read by the oldest snapshot
+        first = bisect.bisect_right(self.sizes, (oldest, float("inf"))) - 1
+        if first > 0:
+            self.sizes = self.sizes[first:]
+
+
+class _Write(NamedTuple):
+    aggregate: AggregateRoot
+    # Version when first staged, 0 if never committed by a unit of work: its row may exist at version 0
+    expected: int
+    delete: bool = False
+
+
+class _Database:
+    """Tables of an InMemorySession database, its commits sequence and the snapshots being read."""
+
+    def __init__(self) -> None:
+        self.tables: dict[str, _Table] = {}
+        self.seq = 0  # Last commit
+        self.snapshots: collections.Counter[int] = collections.Counter()
+        # Serializes the commits, the snapshots and the indexes creation, never taken by the readers
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> _Table:
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables.setdefault(name, _Table())
+        return table
+
+    def ensure_indexes(
+        self,
+        table: _Table,
+        aggregate_class: type[AggregateRoot],
+        indexes: Mapping[str, str],
+    ) -> None:
+        with self.lock:
+            table.ensure_indexes(aggregate_class, indexes, self.seq)
+
+    def ensure_order(self, table: _Table) -> None:
+        with self.lock:
+            table.ensure_order()
+
+    def begin(self) -> int:
+        with self.lock:
+            self.snapshots[self.seq] += 1
+            return self.seq
+
+    def end(self, snapshot: int) -> None:
+        with self.lock:
+            self.snapshots[snapshot] -= 1
+            if not self.snapshots[snapshot]:
+                del self.snapshots[snapshot]
+            self._prune()
+
+    def _prune(self) -> None:
+        oldest = min(self.snapshots, default=self.seq)
+        for table in self.tables.values():
+            table.prune(oldest)
+
+    def commit(self, writes: dict[tuple[str, ID], _Write]) -> None:
+        # Rows are dumped before locking, the lock is held for O(changes) dict and index updates
+        rows: dict[tuple[str, ID], tuple[Row, dict[str, list[Row]]]] = {}
+        for key, write in writes.items():
+            if not write.delete:
+                rows[key] = _dump(write.aggregate)
+        with self.lock:
+            tables = {name: self.table(name) for name, _ in writes}
+            for (name, aggregate_id), write in writes.items():
+                head = tables[name].rows.get(aggregate_id)
+                stored = None
+                if head is not None and head.row is not None:
+                    aggregate_codec = codec(write.aggregate.__class__)
+                    stored = head.row[aggregate_codec.fields.index("version")]
+                # Missing rows, never stored or deleted, are version 0 like the rows stored outside of a
+                # unit of work, which leaves the versions unchanged
+                if (stored or 0) != write.expected:
+                    raise ConcurrencyConflictError(
+                        write.aggregate, write.expected, stored or 0
+                    )
+            seq = self.seq + 1
+            with contextlib.ExitStack() as stack:
+                for table in tables.values():
+                    stack.enter_context(table.batch())
+                for (name, aggregate_id), write in writes.items():
+                    if write.delete:
+                        tables[name].delete(aggregate_id, seq)
+                    else:
+                        tables[name].put(
+                            write.aggregate, *rows[name, aggregate_id], seq
+                        )
+                for table in tables.values():
+                    table.publish(seq)
+                # Snapshots begin once the lock is released, they read the whole commit
+                self.seq = seq
+                self._prune()
+
+
+def _dump(aggregate: AggregateRoot) -> tuple[Row, dict[str, list[Row]]]:
+    """Returns the row of the aggregate and the rows of its loaded LazyList entities."""
+    children = {}
+    for field, entity_class in lazy_fields(aggregate.__class__).items():
+        entities = aggregate.__dict__[field]
+        if isinstance(entities, LazyList) and not entities.loaded:
+            continue  # Unchanged
+        dump = codec(entity_class).dump
+        children[field] = [dump(entity) for entity in entities]
+    return codec(aggregate.__class__).dump(aggregate), children
+
+
+class InMemorySession(Session):
+    """Session on an in-memory database shared by the threads, with snapshot isolation.
+
+    class BudgetDatabase(pydoca.InMemorySession):
+        database = "budget"
+
+    Aggregates are stored as the rows of their codec, immutable snapshots: loading an aggregate decodes a
+    new object, mutating it does not change the database until it is stored and committed.
+
+    The unit of work begins a transaction: its reads see the database as it was when it began, whatever
+    the other sessions commit meanwhile. Its writes are staged in the session, an overlay read back by
+    `load`, which the commit swaps in, after checking their versions and raising ConcurrencyConflictError
+    if another session committed a change of the same aggregates first. The commit work is proportional
+    to the number of changes, a rollback discards the overlay. Outside of a transaction, reads see the
+    last commit.
+
+    Readers never lock: commits link new versions of the rows in front of the previous ones, kept until
+    no snapshot can read them, and the indexes are copy-on-write.
+
+    Attributes:
+        database: Name of the database.
+        snapshot: Commit read by the transaction, None outside of a transaction.
+    """
+
+    database: ClassVar[str] = "default"
+    _databases: ClassVar[dict[str, _Database]] = {}
+    _databases_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, database: _Database) -> None:
+        self._database = database
+        self._pending: dict[tuple[str, ID], _Write] = {}
+        self.snapshot: Optional[int] = None
+
+    @classmethod
+    def start(cls) -> Self:
+        database = cls._databases.get(cls.database)
+        if database is None:
+            with cls._databases_lock:
+                database = cls._databases.setdefault(cls.database, _Database())
+        return cls(database)
+
+    @classmethod
+    def url(cls) -> str:
+        return f"memory://{cls.database}"
+
+    @classmethod
+    def drop(cls) -> None:
+        """Deletes the database."""
+        with cls._databases_lock:
+            cls._databases.pop(cls.database, None)
+
+    def table(self, name: str) -> _Table:
+        return self._database.table(name)
+
+    def ensure_indexes(
+        self,
+        table: _Table,
+        aggregate_class: type[AggregateRoot],
+        indexes: Mapping[str, str],
+    ) -> None:
+        self._database.ensure_indexes(table, aggregate_class, indexes)
+
+    def ensure_order(self, table: _Table) -> None:
+        self._database.ensure_order(table)
+
+    def begin(self) -> None:
+        if self.snapshot is None:
+            self.snapshot = self._database.begin()
+
+    def _end(self) -> None:
+        if self.snapshot is not None:
+            snapshot, self.snapshot = self.snapshot, None
+            self._database.end(snapshot)
+
+    def staged(self, table: str, aggregate_id: ID) -> Optional[_Write]:
+        """Returns the write staged for the aggregate, if any."""
+        return self._pending.get((table, aggregate_id))
+
+    def stage(self, table: str, aggregate: AggregateRoot, delete: bool = False) -> None:
+        """Stages the aggregate to be written, or deleted, at commit."""
+        key = (table, aggregate.id)
+        previous = self._pending.get(key)
+        expected = aggregate.version if previous is None else previous.expected
+        self._pending[key] = _Write(aggregate, expected, delete)
+
+    def commit(self) -> None:
+        writes, self._pending = self._pending, {}
+        try:
+            if writes:
+                self._database.commit(writes)
+        finally:
+            self._end()
+
+    def rollback(self) -> None:
+        self._pending = {}
+        self._end()
+
+
+class InMemoryMappingSession(Session, collections.abc.MutableMapping[Any, Any]):
+    """Session on an in-memory key-value database shared by the threads, a MutableMapping.
+
+    class ReadModelsDatabase(pydoca.InMemoryMappingSession):
+        database = "read_models"
+
+    Backs the stores keeping values by key, like SessionReadModelStore and SessionResultStore.
+    Writes are staged in the session, read back by it, and applied at commit; a rollback discards them.
+    Values are stored as they are, not copied. Readers never lock, they see the committed values.
+
+    Attributes:
+        database: Name of the database.
+    """
+
+    database: ClassVar[str] = "default"
+    _databases: ClassVar[dict[str, dict[Any, Any]]] = {}
+    _databases_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, data: dict[Any, Any]) -> None:
+        self._data = data
+        # Staged values, _MISSING for the deleted keys
+        self._pending: dict[Any, Any] = {}
+
+    @classmethod
+    def start(cls) -> Self:
+        data = cls._databases.get(cls.database)
+        if data is None:
+            with cls._databases_lock:
+                data = cls._databases.setdefault(cls.database, {})
+        return cls(data)
+
+    @classmethod
+    def url(cls) -> str:
+        return f"memory+mapping://{cls.database}"
+
+    @classmethod
+    def drop(cls) -> None:
+        """Deletes the database."""
+        with cls._databases_lock:
+            cls._databases.pop(cls.database, None)
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self._pending.get(key, self._data.get(key, _MISSING))
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self._pending[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        self[key]  # Raises KeyError if not found
+        self._pending[key] = _MISSING
+
+    def __iter__(self) -> Iterator[Any]:
+        pending = self._pending
+        for key in list(self._data):
+            if pending.get(key) is not _MISSING:
+                yield key
+        for key, value in list(pending.items()):
+            if value is not _MISSING and key not in self._data:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def commit(self) -> None:
+        writes, self._pending = self._pending, {}
+        with self._databases_lock:
+            for key, value in writes.items():
+                if value is _MISSING:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = value
+
+    def rollback(self) -> None:
+        self._pending = {}
+
+
+class InMemoryRepository(Repository[AggregateRootT]):
+    """Repository keeping aggregates in an InMemorySession database, with secondary indexes.
+
+    class InMemoryBudgetRepo(pydoca.InMemoryRepository[Budget], BudgetRepository):
+        sessionT = BudgetDatabase
+        aggregateT = Budget
+        __indexes__ = {"currency": pydoca.HASH, "created_at": pydoca.SORTED}
+
+        def get_by_currency(self, currency: Currency) -> list[Budget]:
+            return self.find("currency", currency)
+
+    Hash indexes answer equality queries (`find`, `iter_where`), sorted indexes equality and range queries
+    (`range`), without scanning every aggregate. Indexes are maintained when the writes are committed.
+    Queries read the snapshot of the session, `load` returns the staged aggregates first.
+
+    Attributes:
+        aggregateT: Class of the stored aggregates.
+        __table__: Name of the table (default: the aggregate class name).
+        __indexes__: Kind of index (pydoca.HASH or pydoca.SORTED) by indexed field.
+    """
+
+    sessionT: type[InMemorySession] = InMemorySession
+    aggregateT: type[AggregateRootT]
+    __table__: ClassVar[Optional[str]] = None
+    __indexes__: ClassVar[Mapping[str, str]] = {}
+
+    @property
+    def table(self) -> str:
+        return self.__table__ or self.aggregateT.__name__
+
+    @property
+    def memory_session(self) -> InMemorySession:
+        return cast(InMemorySession, self.session)
+
+    def _table(self) -> _Table:
+        session = self.memory_session
+        table = session.table(self.table)
+        if not table.indexes.keys() >= self.__indexes__.keys():
+            session.ensure_indexes(table, self.aggregateT, self.__indexes__)
+        return table
+
+    def _row(self, table: _Table, aggregate_id: ID) -> Optional[Row]:
+        return cast(
+            Optional[Row],
+            _visible(table.rows.get(aggregate_id), self.memory_session.snapshot),
+        )
+
+    def _decode(self, row: Row) -> AggregateRootT:
+        aggregate = codec(self.aggregateT).load(row)
+        self.bind_lazy(aggregate)
+        return aggregate
+
+    def load(self, aggregate_id: ID) -> Optional[AggregateRootT]:
+        """Returns the aggregate, None if not found."""
+        if write := self.memory_session.staged(self.table, aggregate_id):
+            return None if write.delete else cast(AggregateRootT, write.aggregate)
+        row = self._row(self._table(), aggregate_id)
+        return None if row is None else self._decode(row)
+
+    def load_all(self) -> list[AggregateRootT]:
+        """Returns the stored aggregates, ignoring the staged writes."""
+        snapshot = self.memory_session.snapshot
+        return [
+            self._decode(row)
+            for version in list(self._table().rows.values())
+            if (row := _visible(version, snapshot)) is not None
+        ]
+
+    def count(self) -> int:
+        """Returns the number of stored aggregates, ignoring the staged writes."""
+        return self._table().count(self.memory_session.snapshot)
+
+    def store(self, aggregate: AggregateRootT) -> None:
+        """Stages the aggregate to be inserted or updated at commit."""
+        self.track(aggregate, written=True)
+        self.memory_session.stage(self.table, aggregate)
+
+    def remove(self, aggregate: AggregateRootT) -> None:
+        """Stages the aggregate to be deleted at commit."""
+        self.track(aggregate, written=True)
+        self.memory_session.stage(self.table, aggregate, delete=True)
+
+    def find(self, field: str, value: Any) -> list[AggregateRootT]:
+        """Returns the aggregates whose field is equal to the value, scanning them if the field is not indexed."""
+        return self._rows(self._matching(self._table(), {field: value}), {field: value})
+
+    def range(
+        self, field: str, start: Any = None, stop: Any = None
+    ) -> list[AggregateRootT]:
+        """Returns the aggregates whose field is from start included to stop excluded, sorted by the field.
+
+        Raises:
+            ValueError: If the field has no sorted index.
+        """
+        table = self._table()
+        index = table.indexes.get(field)
+        if not isinstance(index, _SortedIndex):
+            raise ValueError(f"{self.table} field {field} has no sorted index")
+        snapshot = self.memory_session.snapshot
+        aggregates = [
+            self._decode(row)
+            # An aggregate is indexed once per value of its readable versions
+            for aggregate_id in dict.fromkeys(index.range(start, stop))
+            if (row := _visible(table.rows.get(aggregate_id), snapshot)) is not None
+        ]
+        # Values of other versions are indexed too, sorting the already sorted list is linear
+        matching = [
+            aggregate
+            for aggregate in aggregates
+            if (value := getattr(aggregate, field)) is not None
+            and (start is None or value >= start)
+            and (stop is None or value < stop)
+        ]
+        matching.sort(key=operator.attrgetter(field))
+        return matching
+
+    def _matching(self, table: _Table, where: Where) -> list[ID]:
+        """Returns the candidate IDs, from the smallest indexed match or every ID."""
+        candidates: Optional[list[ID]] = None
+        for field, value in where.items():
+            if index := table.indexes.get(field):
+                ids = index.equal(value)
+                if candidates is None or len(ids) < len(candidates):
+                    candidates = ids
+        return list(table.rows) if candidates is None else candidates
+
+    def _rows(self, ids: list[ID], where: Where) -> list[AggregateRootT]:
+        # Compares the row values, matching the snapshot rows whatever the index said
+        table, snapshot = self._table(), self.memory_session.snapshot
+        versions = map(table.rows.get, ids)
+        if snapshot is None:
+            rows = [v.row for v in versions if v is not None and v.row is not None]
+        else:
+            rows = [r for v in versions if (r := _visible(v, snapshot)) is not None]
+        if not where:
+            return [self._decode(row) for row in rows]
+        aggregate_codec = codec(self.aggregateT)
+        values = tuple(
+            aggregate_codec.dump_field(field, value) for field, value in where.items()
+        )
+        columns = operator.itemgetter(*map(aggregate_codec.fields.index, where))
+        expected = values if len(values) > 1 else values[0]
+        return [self._decode(row) for row in rows if columns(row) == expected]
+
+    def _page(
+        self, cursor: Optional[Cursor], limit: int, where: Where
+    ) -> Page[AggregateRootT]:
+        # Keyset pagination on the aggregate numbers, the cursor being the number of the last one returned
+        table, last = self._table(), cursor or 0
+        if table.numbers is None:
+            self.memory_session.ensure_order(table)
+        numbers = cast(dict[ID, int], table.numbers)
+        order: list[int]
+        ids: list[ID]
+        matching = None
+        if any(field in table.indexes for field in where):
+            matching = self._matching(table, where)
+        # Sorting the indexed candidates, each page, against scanning the order for them
+        if matching is not None and len(matching) ** 2 <= limit * len(numbers):
+            entries = sorted(
+                (number, aggregate_id)
+                for aggregate_id in matching
+                if (number := numbers.get(aggregate_id, 0)) > last
+            )
+            order = [number for number, _ in entries]
+            ids = [aggregate_id for _, aggregate_id in entries]
+            start = 0
+        else:
+            order, ids = table.order
+            start = bisect.bisect_right(order, last, 0, len(order))
+        end = len(order)  # IDs are listed before their numbers
+        # One more aggregate than the limit tells whether there is a next page
+        items: list[AggregateRootT] = []
+        i = start
+        while len(items) <= limit and i < end:
+            j = min(i + limit + 1 - len(items), end)
+            chunk = [
+                aggregate_id
+                for number, aggregate_id in zip(order[i:j], ids[i:j], strict=True)
+                if numbers.get(aggregate_id) == number
+            ]
+            items += self._rows(chunk, where)
+            i = j
+        if len(items) <= limit:
+            return Page(items, None)
+        last_id = items[limit - 1].id
+        position = next(k for k in range(i - 1, start - 1, -1) if ids[k] == last_id)
+        return Page(items[:limit], order[position])
+
+    def _load_lazy(
+        self, aggregates: list[AggregateRootT], field: str
+    ) -> dict[ID, list[Any]]:
+        versions = self._table().children.get(field, {})
+        snapshot = self.memory_session.snapshot
+        load = codec(lazy_fields(self.aggregateT)[field]).load
+        return {
+            aggregate.id: [
+                load(row)
+                for row in _visible(versions.get(aggregate.id), snapshot) or []
+            ]
+            for aggregate in aggregates
+        }
@@ -1,8 +1,15 @@
 """Port/Adapter architecture pattern."""
 import abc
+import contextlib
 import inspect
+import itertools
 import logging
-from typing import Any, Callable, ClassVar, Optional, Self
+import time
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Any, Callable, ClassVar, Iterable, Iterator, Mapping, Optional, Self
+
+from .deadlines import check_deadline, remaining_time
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +26,16 @@ class Port(abc.ABC):
     Classes inheriting and implementing those abstract classes are considered the adapters,
     and should be defined in the adapters, outer layer of your project, alongside the actors.
 
+    Adapters bound their work by the deadline of the current call with `self.remaining_time()`
+    and `self.check_deadline()`, see `pydoca.deadline`.
+
     Attributes:
         _registry: Keeps track of the Port classes so we can find them using only their names.
     """
 
     _registry: ClassVar[dict[PortClassName, type[Self]]] = {}
+    remaining_time = staticmethod(remaining_time)
+    check_deadline = staticmethod(check_deadline)
 
     def __init_subclass__(cls, **kwargs: Any) -> None:
         if cls.__name__ in ["Repository", "Service"] or not inspect.isabstract(cls):
@@ -51,22 +63,148 @@ class PortNotFoundError(Exception):
         super().__init__(f"Port class {port} not found.")
 
 
+class AdaptersFrozenError(Exception):
+    def __init__(self) -> None:
+        super().__init__("Adapters configuration is frozen, unfreeze it first")
+
+
 Adapter = object | Any
 AdapterFactory = Callable[[], Adapter]
 
 _ADAPTERS_CONFIGURATION: dict[PortType, AdapterFactory | Adapter] = {}
 
+Resolvers = MappingProxyType[PortType, AdapterFactory]
+
+# Compiled resolvers, only set once the configuration is frozen.
+_RESOLVERS: Optional[Resolvers] = None
+
+# Flattened resolvers of the innermost active scope, see `AdaptersScope`.
+_SCOPE: ContextVar[Optional[Resolvers]] = ContextVar("ADAPTERS_SCOPE", default=None)
+
 
 def bind(port: PortType, adapter: AdapterFactory | Adapter) -> None:
+    if _RESOLVERS is not None:
+        raise AdaptersFrozenError()
     _ADAPTERS_CONFIGURATION[port] = adapter
     logger.info(f"Bind {port} port to {adapter} adapter")
 
 
 def clear() -> None:
+    if _RESOLVERS is not None:
+        raise AdaptersFrozenError()
     _ADAPTERS_CONFIGURATION.clear()
 
 
+def _constant(adapter: Adapter) -> AdapterFactory:
+    # A bound method of an infinite iterator returns the same object on every call
+    # without creating a Python frame, making it the cheapest zero-arg resolver.
+    return itertools.repeat(adapter).__next__
+
+
+def freeze(
+    singletons: Iterable[PortType] = (), timings: Optional[dict[PortType, int]] = None
+) -> None:
+    """Compiles the current bindings into an immutable resolver table.
+
+    Once frozen, `inject` becomes a single mapping lookup plus call, and `bind`/`clear`
+    raise AdaptersFrozenError until `unfreeze` is called.
+
+    Args:
+        singletons: Ports whose adapter factory is called once now, the resulting adapter
+            being returned by every later `inject`.
+        timings: Filled with the nanoseconds spent instantiating each singleton adapter.
+    """
+    global _RESOLVERS
+    _RESOLVERS = MappingProxyType(
+        _compile(_ADAPTERS_CONFIGURATION, singletons, timings)
+    )
+    logger.info(f"Freeze {len(_RESOLVERS)} adapters")
+
+
+def _compile(
+    bindings: Mapping[PortType, AdapterFactory | Adapter],
+    singletons: Iterable[PortType] = (),
+    timings: Optional[dict[PortType, int]] = None,
+) -> dict[PortType, AdapterFactory]:
+    singletons = set(singletons)
+    resolvers: dict[PortType, AdapterFactory] = {}
+    for port, adapter in bindings.items():
+        if not callable(adapter):
+            resolvers[port] = _constant(adapter)
+        elif port in singletons:
+            start = time.perf_counter_ns()
+            resolvers[port] = _constant(adapter())
+            if timings is not None:
+                timings[port] = time.perf_counter_ns() - start
+        else:
+            resolvers[port] = adapter
+    for port in singletons - resolvers.keys():
+        raise AdapterNotConfiguredError(port)
+    return resolvers
+
+
+def unfreeze() -> None:
+    global _RESOLVERS
+    _RESOLVERS = None
+
+
+def is_frozen() -> bool:
+    return _RESOLVERS is not None
+
+
+class AdaptersScope:
+    """Child adapters configuration overriding some ports within a context.
+
+    tenant_a = pydoca.AdaptersScope({YourRepository: adapters.TenantARepo})
+
+    with tenant_a.activate():
+        YourUseCase().exec(cmd)  # YourRepository is injected as TenantARepo
+
+    The scope inherits every binding active when it is created (the root configuration or the
+    enclosing scope) and flattens them with its overrides, so `inject` costs the same whatever
+    the nesting depth. Activation is bound to the current context (thread or asyncio task),
+    concurrent contexts can activate different scopes without touching the global registry.
+    Later `bind` calls on the root configuration are not seen by already created scopes.
+    """
+
+    def __init__(self, overrides: Mapping[PortType, AdapterFactory | Adapter]) -> None:
+        parent: Optional[Resolvers] = _SCOPE.get()
+        if parent is None:
+            parent = _RESOLVERS
+        if parent is None:
+            parent = MappingProxyType(_compile(_ADAPTERS_CONFIGURATION))
+        self.resolvers: Resolvers = MappingProxyType({**parent, **_compile(overrides)})
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator[Self]:
+        token = _SCOPE.set(self.resolvers)
+        try:
+            yield self
+        finally:
+            _SCOPE.reset(token)
+
+
+def scope(
+    overrides: Mapping[PortType, AdapterFactory | Adapter],
+) -> contextlib.AbstractContextManager[AdaptersScope]:
+    """Shortcut creating and activating an AdaptersScope.
+
+    with pydoca.scope({YourService: FakeService}):
+        ...
+    """
+    return AdaptersScope(overrides).activate()
+
+
 def inject(port: PortType) -> Adapter:
+    resolvers: Optional[Resolvers] = _SCOPE.get()
+    if resolvers is None:
+        resolvers = _RESOLVERS
+    if resolvers is not None:
+        resolver: Optional[AdapterFactory] = resolvers.get(port)
+        if resolver is None:
+            raise AdapterNotConfiguredError(port)
+        return resolver()
+
     adapter: Optional[AdapterFactory | Adapter] = _ADAPTERS_CONFIGURATION.get(port)
     if not adapter:
         raise AdapterNotConfiguredError(port)
@@ -88,8 +226,15 @@ class AdaptersConfig:
 
     This configuration alongside bootstrap will bind YourRepository port to SQLiteRepo adapter and
     YourService port to FakeService adapter.
+
+    Ports listed in `__singletons__` are resolved once when bootstrap freezes the configuration.
+
+    Attributes:
+        __singletons__: Names of the ports whose adapter is instantiated once at freeze time.
     """
 
+    __singletons__: ClassVar[tuple[PortClassName, ...]] = ()
+
     def __init__(self) -> None:
         for port_name, adapter_class in [
             (key, val)
@@ -0,0 +1,230 @@
+"""Sampling profiler of the use case executions, toggled at runtime."""
+import collections
+import functools
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from typing import Any, Callable, Optional
+
+ExecFn = Callable[[Any, Any], Any]
+ProfileKey = tuple[str, str]
+
+
+class UseCaseProfile:
+    """Profile of the sampled executions of a use case with a command class.
+
+    Attributes:
+        calls: Number of sampled executions.
+        duration_ns: Total duration of the sampled executions.
+        stacks: Number of stack samples of each call stack, from the exec method to the sampled frame.
+        allocations: Bytes allocated and not freed during the sampled executions, by "file:line".
+        peak_bytes: Highest traced memory increase during a sampled execution.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.duration_ns = 0
+        self.stacks: collections.Counter[tuple[str, ...]] = collections.Counter()
+        self.allocations: collections.Counter[str] = collections.Counter()
+        self.peak_bytes = 0
+
+
+class _Call:
+    __slots__ = ("profile", "frame")
+
+    def __init__(self, profile: UseCaseProfile, frame: types.FrameType) -> None:
+        self.profile = profile
+        self.frame = frame
+
+
+class Profiler:
+    """Samples a fraction of the use case executions, recording their stacks and allocations.
+
+    profiler = pydoca.Profiler(rate=0.01, memory=True)
+    pydoca.set_profiler(profiler)
+    ...
+    pydoca.set_profiler(None)
+    profiler.dump("use_cases.folded")  # flamegraph.pl use_cases.folded > use_cases.svg
+
+    A background thread samples the stack of the threads executing a sampled call every `interval`.
+    Profiles are aggregated by use case and command class, the collapsed stacks start with their names.
+    With `memory`, tracemalloc snapshots taken around each sampled call attribute the memory allocated
+    to its source lines. Snapshots see the allocations of every thread, they are approximate when
+    sampled calls overlap. Calls executed by a sampled call are part of its profile.
+
+    Attributes:
+        rate: Fraction of the executions sampled, between 0 and 1 (default: 0.01).
+        interval: Seconds between two stack samples (default: 0.001).
+        memory: Traces the allocations of the sampled calls (default: False). tracemalloc then slows
+            down every allocation of the process until the profiler is closed.
+        profiles: Profile of each (use case, command) class names.
+    """
+
+    def __init__(
+        self, rate: float = 0.01, interval: float = 0.001, memory: bool = False
+    ) -> None:
+        if not 0 <= rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        self.rate = rate
+        self.interval = interval
+        self.memory = memory
+        self.profiles: dict[ProfileKey, UseCaseProfile] = {}
+        self._calls: dict[int, _Call] = {}
+        self._lock = threading.Lock()
+        self._active = threading.Condition(self._lock)
+        self._sampler: Optional[threading.Thread] = None
+        self._closed = False
+        self._started_tracemalloc = False
+
+    def wrap(self, exec_fn: ExecFn, use_case: str) -> ExecFn:
+        """Returns exec_fn sampling its calls."""
+        profiler = self
+        rate = self.rate
+        sample = random.random
+
+        @functools.wraps(exec_fn)
+        def exec(self: Any, cmd: Any) -> Any:
+            if sample() >= rate or threading.get_ident() in profiler._calls:
+                return exec_fn(self, cmd)
+            return profiler._profile(
+                exec_fn, self, cmd, (use_case, cmd.__class__.__name__)
+            )
+
+        return exec
+
+    def _profile(
+        self, exec_fn: ExecFn, use_case: Any, cmd: Any, key: ProfileKey
+    ) -> Any:
+        with self._lock:
+            if self._closed:
+                return exec_fn(use_case, cmd)
+            profile = self.profiles.get(key)
+            if profile is None:
+                profile = self.profiles[key] = UseCaseProfile()
+            self._start()
+            thread_id = threading.get_ident()
+            self._calls[thread_id] = _Call(profile, sys._getframe())
+            self._active.notify()
+        before = self._snapshot()
+        start_ns = time.perf_counter_ns()
+        try:
+            return exec_fn(use_case, cmd)
+        finally:
+            duration_ns = time.perf_counter_ns() - start_ns
+            with self._lock:
+                del self._calls[thread_id]
+                profile.calls += 1
+                profile.duration_ns += duration_ns
+            if before is not None:
+                self._record_allocations(profile, before)
+
+    def _start(self) -> None:
+        # Called with the lock held
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self._sampler is None:
+            self._sampler = threading.Thread(
+                target=self._sample, name="pydoca-profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def _snapshot(self) -> Optional[tuple[tracemalloc.Snapshot, int]]:
+        if not self.memory:
+            return None
+        tracemalloc.reset_peak()
+        return tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[0]
+
+    def _record_allocations(
+        self, profile: UseCaseProfile, before: tuple[tracemalloc.Snapshot, int]
+    ) -> None:
+        snapshot, traced = before
+        peak = tracemalloc.get_traced_memory()[1] - traced
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+        differences = after.compare_to(snapshot.filter_traces(filters), "lineno")
+        with self._lock:
+            profile.peak_bytes = max(profile.peak_bytes, peak)
+            for difference in differences:
+                if difference.size_diff > 0:
+                    frame = difference.traceback[0]
+                    location = f"{frame.filename}:{frame.lineno}"
+                    profile.allocations[location] += difference.size_diff
+
+    def _sample(self) -> None:
+        with self._lock:
+            while not self._closed:
+                if not self._calls:
+                    self._active.wait()
+                    continue
+                frames = sys._current_frames()
+                for thread_id, call in self._calls.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        call.profile.stacks[_stack(frame, call.frame)] += 1
+                del frames
+                self._active.wait(self.interval)
+
+    def close(self) -> None:
+        """Stops the sampling thread, and tracemalloc if it was started by the profiler.
+
+        The calls are not sampled anymore, the profiles are kept.
+        """
+        with self._lock:
+            self._closed = True
+            self._active.notify()
+            sampler, self._sampler = self._sampler, None
+        if sampler is not None:
+            sampler.join()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def collapsed(self) -> str:
+        """Returns the stacks in the collapsed format of the flame graph tools, a line per stack.
+
+        BuyTire;BuyTireCmd;app.use_cases.BuyTire.exec;app.repo.TireRepo.load 12
+        """
+        with self._lock:
+            lines = [
+                f"{';'.join((*key, *stack))} {samples}"
+                for key, profile in self.profiles.items()
+                for stack, samples in profile.stacks.items()
+            ]
+        return "\n".join(sorted(lines))
+
+    def dump(self, path: str) -> None:
+        """Writes the collapsed stacks to the file."""
+        with open(path, "w") as file:
+            file.write(self.collapsed() + "\n")
+
+    def summary(self, top: int = 5) -> list[dict[str, Any]]:
+        """Returns the calls, mean duration, peak memory and top allocations of every profile."""
+        with self._lock:
+            return [
+                {
+                    "use_case": use_case,
+                    "command": command,
+                    "calls": profile.calls,
+                    "mean_ns": (
+                        profile.duration_ns / profile.calls if profile.calls else 0.0
+                    ),
+                    "samples": sum(profile.stacks.values()),
+                    "peak_bytes": profile.peak_bytes,
+                    "allocations": profile.allocations.most_common(top),
+                }
+                for (use_case, command), profile in self.profiles.items()
+            ]
+
+
+def _stack(frame: Optional[types.FrameType], root: types.FrameType) -> tuple[str, ...]:
+    # Frames below the profiled call, the profiler wrapper excluded
+    names: list[str] = []
+    while frame is not None and frame is not root:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}")
+        frame = frame.f_back
+    return tuple(reversed(names))
@@ -0,0 +1,294 @@
+"""Projections building read models from domain events."""
+import abc
+import collections.abc
+import inspect
+import itertools
+import logging
+import threading
+from typing import Any, Callable, ClassVar, Iterable, Iterator, Optional
+
+from .event import Event
+from .port_adapter import Port
+from .repository import Session
+from .unit_of_work import EventBus
+
+logger = logging.getLogger(__name__)
+
+Position = int
+EventHandler = Callable[[Any, Event], None]
+
+
+class EventStore(Port):
+    """Append-only log of the published events, used to rebuild projections.
+
+    Events are numbered by their position in the log, starting at 1.
+    """
+
+    @abc.abstractmethod
+    def append(self, events: Iterable[Event]) -> list[Position]:
+        """Appends the events and returns their positions."""
+
+    @abc.abstractmethod
+    def read(self, after: Position = 0) -> Iterator[tuple[Position, Event]]:
+        """Yields the events, with their positions, stored after the position."""
+
+
+class InMemoryEventStore(EventStore):
+    def __init__(self) -> None:
+        self.events: list[Event] = []
+        self._lock = threading.Lock()
+
+    def append(self, events: Iterable[Event]) -> list[Position]:
+        with self._lock:
+            start = len(self.events)
+            self.events.extend(events)
+            return list(range(start + 1, len(self.events) + 1))
+
+    def read(self, after: Position = 0) -> Iterator[tuple[Position, Event]]:
+        for index in range(after, len(self.events)):
+            yield index + 1, self.events[index]
+
+
+class ReadModelStore(abc.ABC):
+    """Keeps the read models of a projection and its checkpoint, the position of the last event handled."""
+
+    @abc.abstractmethod
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Returns the read model or default."""
+
+    @abc.abstractmethod
+    def put(self, key: Any, read_model: Any) -> None:
+        """Sets the read model."""
+
+    @abc.abstractmethod
+    def delete(self, key: Any) -> None:
+        """Deletes the read model if it exists."""
+
+    @abc.abstractmethod
+    def get_checkpoint(self) -> Position:
+        """Returns the position of the last event handled, 0 if none."""
+
+    @abc.abstractmethod
+    def set_checkpoint(self, position: Position) -> None:
+        """Sets the position of the last event handled, persisting the read models changes."""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Deletes every read model and resets the checkpoint."""
+
+
+class InMemoryReadModelStore(ReadModelStore):
+    def __init__(self) -> None:
+        self.read_models: dict[Any, Any] = {}
+        self.checkpoint: Position = 0
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self.read_models.get(key, default)
+
+    def put(self, key: Any, read_model: Any) -> None:
+        self.read_models[key] = read_model
+
+    def delete(self, key: Any) -> None:
+        self.read_models.pop(key, None)
+
+    def get_checkpoint(self) -> Position:
+        return self.checkpoint
+
+    def set_checkpoint(self, position: Position) -> None:
+        self.checkpoint = position
+
+    def clear(self) -> None:
+        self.read_models.clear()
+        self.checkpoint = 0
+
+
+class SessionReadModelStore(ReadModelStore):
+    """Stores the read models in a Session also implementing MutableMapping, like InMemoryMappingSession.
+
+    Keys are prefixed by the namespace, the session is committed with each checkpoint.
+    """
+
+    def __init__(self, session: Session, namespace: str) -> None:
+        if not isinstance(session, collections.abc.MutableMapping):
+            raise TypeError(f"{session.__class__.__name__} is not a MutableMapping")
+        self.session = session
+        self.mapping: collections.abc.MutableMapping[str, Any] = session
+        self.namespace = namespace
+
+    def _key(self, key: Any) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self.mapping.get(self._key(key), default)
+
+    def put(self, key: Any, read_model: Any) -> None:
+        self.mapping[self._key(key)] = read_model
+
+    def delete(self, key: Any) -> None:
+        self.mapping.pop(self._key(key), None)
+
+    def get_checkpoint(self) -> Position:
+        checkpoint: Position = self.mapping.get(f"{self.namespace}#checkpoint", 0)
+        return checkpoint
+
+    def set_checkpoint(self, position: Position) -> None:
+        self.mapping[f"{self.namespace}#checkpoint"] = position
+        self.session.commit()
+
+    def clear(self) -> None:
+        prefix = f"{self.namespace}:"
+        for key in [key for key in self.mapping if str(key).startswith(prefix)]:
+            del self.mapping[key]
+        self.set_checkpoint(0)
+
+
+class Projection:
+    """Incrementally updated read model built from events.
+
+    Every method whose first parameter is annotated with an Event subclass handles these events,
+    and events of their subclasses.
+
+    class CashFlow(pydoca.Projection):
+        def on_income_added(self, event: IncomeAdded) -> None:
+            total = self.store.get(event.aggregate_id, 0)
+            self.store.put(event.aggregate_id, total + event.amount)
+
+    Attributes:
+        store: Keeps the read models and the checkpoint (default: in memory).
+        __handlers__: The handler function of each event type handled.
+    """
+
+    __handlers__: ClassVar[dict[type[Event], EventHandler]] = {}
+
+    def __init__(self, store: Optional[ReadModelStore] = None) -> None:
+        self.store: ReadModelStore = store or InMemoryReadModelStore()
+        self._dispatch: dict[type[Event], Optional[EventHandler]] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        handlers = dict(cls.__handlers__)
+        for fn in cls.__dict__.values():
+            if not inspect.isfunction(fn):
+                continue
+            parameters = list(inspect.signature(fn).parameters.values())[1:]
+            if not parameters:
+                continue
+            annotation = parameters[0].annotation
+            if inspect.isclass(annotation) and issubclass(annotation, Event):
+                handlers[annotation] = fn
+        cls.__handlers__ = handlers
+
+    @property
+    def name(self) -> str:
+        return self.__class__.__name__
+
+    def handler(self, event_type: type[Event]) -> Optional[EventHandler]:
+        """Returns the handler of the event type, looking for handled parent classes."""
+        try:
+            return self._dispatch[event_type]
+        except KeyError:
+            handler = next(
+                (
+                    self.__handlers__[cls]
+                    for cls in event_type.__mro__
+                    if cls in self.__handlers__
+                ),
+                None,
+            )
+            self._dispatch[event_type] = handler
+            return handler
+
+    def apply(self, events: Iterable[tuple[Position, Event]]) -> None:
+        """Handles the events not already handled, then moves the checkpoint once."""
+        checkpoint = last = self.store.get_checkpoint()
+        for position, event in events:
+            if position <= last:
+                continue
+            if handler := self.handler(event.__class__):
+                handler(self, event)
+            last = position
+        if last != checkpoint:
+            self.store.set_checkpoint(last)
+
+
+class Projector:
+    """Feeds projections with the events published on the EventBus, recording them in the event store.
+
+    projector = pydoca.Projector([CashFlow()], event_store=pydoca.inject(pydoca.EventStore))
+    projector.catch_up()  # After a restart, replays the events missed by the projections
+    ...
+    projector.process_pending()  # Consumes the events published by the units of work
+
+    Without event store, events are numbered after the furthest checkpoint of the projections, so a
+    persisted checkpoint keeps matching the numbering after a restart, and projections can not be rebuilt.
+    Projections checkpoints are moved once per batch of events, of at most `batch_size` events when replaying.
+    """
+
+    def __init__(
+        self,
+        projections: Iterable[Projection],
+        event_store: Optional[EventStore] = None,
+        batch_size: int = 1000,
+    ) -> None:
+        self.projections = list(projections)
+        self.event_store = event_store
+        self.batch_size = batch_size
+        self._position: Position = 0
+        if event_store is None:
+            self._position = max(
+                (projection.store.get_checkpoint() for projection in self.projections),
+                default=0,
+            )
+        self._lock = threading.Lock()
+
+    def project(self, events: Iterable[Event]) -> None:
+        """Records the events in the event store, if any, and applies them to the projections."""
+        events = list(events)
+        with self._lock:
+            if self.event_store is not None:
+                positions = self.event_store.append(events)
+            else:
+                positions = list(
+                    range(self._position + 1, self._position + len(events) + 1)
+                )
+                self._position += len(events)
+            batch = list(zip(positions, events, strict=True))
+            for projection in self.projections:
+                projection.apply(batch)
+
+    def process_pending(self, max_events: Optional[int] = None) -> int:
+        """Consumes the events waiting on the EventBus, returns how many were processed."""
+        events: list[Event] = []
+        while max_events is None or len(events) < max_events:
+            event = EventBus.get_event()
+            if event is None:
+                break
+            events.append(event)
+        if events:
+            self.project(events)
+        return len(events)
+
+    def _require_event_store(self) -> EventStore:
+        if self.event_store is None:
+            raise RuntimeError("Projector event store not set.")
+        return self.event_store
+
+    def catch_up(self) -> None:
+        """Replays from the event store the events each projection did not handle yet."""
+        event_store = self._require_event_store()
+        with self._lock:
+            for projection in self.projections:
+                self._replay(projection, event_store)
+
+    def rebuild(self, projection: Projection) -> None:
+        """Clears the read models of the projection and replays every event of the event store."""
+        event_store = self._require_event_store()
+        logger.info(f"Rebuild {projection.name} projection")
+        with self._lock:
+            projection.store.clear()
+            self._replay(projection, event_store)
+
+    def _replay(self, projection: Projection, event_store: EventStore) -> None:
+        events = event_store.read(after=projection.store.get_checkpoint())
+        while batch := list(itertools.islice(events, self.batch_size)):
+            projection.apply(batch)
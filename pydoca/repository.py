@@ -2,17 +2,39 @@ import abc
 import functools
 import inspect
 import itertools
-from types import MappingProxyType
-from typing import Any, Callable, Generic, Optional, Self, TypeVar, cast
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Generic,
+    Iterable,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Self,
+    TypeVar,
+    cast,
+)
 
 from .aggregate_root import AggregateRoot
+from .cache import AggregateCache, cached
+from .collection import LazyList, lazy_fields
+from .deadlines import check_deadline, remaining_time
+from .entity import ID
 from .event import Event
+from .instrumentation import instrument
 from .port_adapter import Port
 
 AggregateRootT = TypeVar("AggregateRootT", bound=AggregateRoot)
 
 
 class Session(abc.ABC):
+    # Deadline of the current call, see `pydoca.deadline`
+    remaining_time = staticmethod(remaining_time)
+    check_deadline = staticmethod(check_deadline)
+
     @classmethod
     @abc.abstractmethod
     def start(cls) -> Self:
@@ -23,6 +45,13 @@ class Session(abc.ABC):
     def url(cls) -> str:
         """Returns the session url."""
 
+    def begin(self) -> None:
+        """Begins a transaction, called when a unit of work is entered.
+
+        Sessions beginning their transactions on first write, or without transactions, can ignore it.
+        """
+        return
+
     @abc.abstractmethod
     def commit(self) -> None:
         """Commits the session."""
@@ -39,55 +68,360 @@ class Session(abc.ABC):
 TWrap = TypeVar("TWrap", bound=Callable[..., Any])
 
 
+AggregateKey = tuple[type[AggregateRoot], ID]
+
+
+# Opaque position in a listing, defined by the repository adapter
+Cursor = Any
+
+# Field names and the values the aggregates fields must be equal to
+Where = Mapping[str, Any]
+
+
+class Page(NamedTuple, Generic[AggregateRootT]):
+    """Aggregates of a listing, with the cursor of the next page (None if it is the last one)."""
+
+    items: list[AggregateRootT]
+    cursor: Optional[Cursor]
+
+
+class QueryNotSupportedError(Exception):
+    """If the repository adapter does not implement the query protocol, see `Repository._page`."""
+
+    def __init__(self, repository: Any) -> None:
+        super().__init__(f"{repository.__class__.__name__} does not support queries")
+
+
+class LazyLoadNotSupportedError(Exception):
+    """If the repository adapter does not implement lazy loading, see `Repository._load_lazy`."""
+
+    def __init__(self, repository: Any) -> None:
+        super().__init__(
+            f"{repository.__class__.__name__} does not support lazy loading"
+        )
+
+
+class _Tracking:
+    """State of a repository in a unit of work: its session, tracked aggregates and collected events."""
+
+    __slots__ = (
+        "session",
+        "events",
+        "aggregates",
+        "versions",
+        "written",
+        "cache_generation",
+    )
+
+    def __init__(
+        self,
+        session: Optional[Session] = None,
+        cache_generation: Optional[int] = None,
+    ) -> None:
+        self.session = session
+        self.events: list[Event] = []
+        self.aggregates: dict[AggregateKey, AggregateRoot] = {}
+        self.versions: dict[AggregateKey, int] = {}
+        self.written: set[AggregateKey] = set()
+        # Cache generation when the unit of work started, its reads are not cached after an invalidation
+        self.cache_generation = cache_generation
+
+
+# State of the repositories in the units of work of the context, by repository id. Set by the units of
+# work, so a repository shared by concurrent units of work, like a singleton adapter, tracks each apart.
+_TRACKING: ContextVar[Optional[dict[int, _Tracking]]] = ContextVar(
+    "TRACKING", default=None
+)
+
+
+def _is_aggregate_annotation(annotation: Any) -> bool:
+    return inspect.isclass(annotation) and issubclass(annotation, AggregateRoot)
+
+
 class Repository(Generic[AggregateRootT], Port):
-    """Repository interface."""
+    """Repository interface.
+
+    Aggregates passed to or returned by the repository methods annotated with AggregateRoot subclasses are
+    tracked, so the unit of work can collect their events and check their versions at commit. The tracking
+    state belongs to the unit of work using the repository: a repository can be shared by concurrent units
+    of work, as the singleton adapters are. Outside of a unit of work, nothing collects the events nor
+    checks the versions: the aggregates are not tracked, the repository only keeps its session.
+
+    Aggregates LazyList fields are loaded through the `_load_lazy` hook, on first access or when prefetched.
+
+    Adapters implementing `_page` support the query protocol: `page` for cursor-based pagination, and the
+    `iter_all`/`iter_where` generators streaming the aggregates in chunks, in constant memory.
+
+    Attributes:
+        events: Events collected from the tracked aggregates.
+        aggregates: Tracked aggregates by class and ID.
+        versions: Version of the tracked aggregates when first seen by the repository.
+        written: Keys of the aggregates passed to the repository methods.
+        __cache__: Shared cache of the aggregates read by `__cached_reads__`, see `AggregateCache`
+            (default: None, not cached).
+        __cached_reads__: Names of the read methods taking one argument, like an aggregate ID, and
+            returning an aggregate or None, answered by `__cache__` (default: ("load",)).
+    """
 
     sessionT: type[Session]
-    events: list[Event]
-    _session: Optional[Session] = None
+    __cache__: ClassVar[Optional[AggregateCache]] = None
+    __cached_reads__: ClassVar[tuple[str, ...]] = ("load",)
+    _cache_attributes: ClassVar[dict[str, str]] = {}
+    # State outside of the units of work, created on first use, only its session is used
+    _own: Optional[_Tracking] = None
+
+    def _unit_of_work_tracking(self) -> Optional[_Tracking]:
+        """Returns the state of the repository in the unit of work of the context, None outside of one."""
+        states = _TRACKING.get()
+        return None if states is None else states.get(id(self))
+
+    @property
+    def _tracking(self) -> _Tracking:
+        state = self._unit_of_work_tracking()
+        if state is not None:
+            return state
+        if self._own is None:
+            self._own = _Tracking()
+        return self._own
 
-    def __init__(self) -> None:
-        self.events = []
+    def _begin_tracking(self, session: Session) -> _Tracking:
+        """Returns a new tracking state for a unit of work on the session."""
+        generation = None if self.__cache__ is None else self.__cache__.generation
+        return _Tracking(session, generation)
+
+    @property
+    def events(self) -> list[Event]:
+        return self._tracking.events
+
+    @property
+    def aggregates(self) -> dict[AggregateKey, AggregateRoot]:
+        return self._tracking.aggregates
+
+    @property
+    def versions(self) -> dict[AggregateKey, int]:
+        return self._tracking.versions
+
+    @property
+    def written(self) -> set[AggregateKey]:
+        return self._tracking.written
 
     @property
     def session(self) -> Session:
-        if self._session:
-            return self._session
-        self._session = self.sessionT.start()
-        return self._session
+        state = self._tracking
+        if state.session is None:
+            state.session = self.sessionT.start()
+        return state.session
 
     def set_session(self, session: Session) -> None:
-        self._session = session
+        state = self._tracking
+        state.session = session
+        if self.__cache__ is not None:
+            state.cache_generation = self.__cache__.generation
 
     def __init_subclass__(cls, **kwargs: Any) -> None:
         super().__init_subclass__(**kwargs)  # Call for Port
-        if isinstance(cls, abc.ABC):
-            return  # Assumes every non ABC class is a real repository implementation
         for name, fn in inspect.getmembers(cls, inspect.isfunction):
             if name.startswith("__") and name.endswith("__"):
                 continue
-            parameters: MappingProxyType[str, inspect.Parameter] = inspect.signature(
-                fn
-            ).parameters
-            for parameter in parameters.values():
-                if inspect.isclass(parameter.annotation) and issubclass(
-                    parameter.annotation, AggregateRoot
-                ):
-                    setattr(cls, name, cls.track_events(fn))
+            if name in Repository.__dict__:
+                continue  # Repository own methods
+            if getattr(fn, "__tracked__", False):
+                continue  # Already wrapped for a parent class
+            signature = inspect.signature(fn)
+            if _is_aggregate_annotation(signature.return_annotation) or any(
+                _is_aggregate_annotation(parameter.annotation)
+                for parameter in signature.parameters.values()
+            ):
+                setattr(cls, name, cls.track_events(fn))
+        if not inspect.isabstract(cls):
+            for name, fn in list(cls.__dict__.items()):
+                if inspect.isfunction(fn) and not name.startswith("_"):
+                    attributes = {"repository": cls.__name__, "method": name}
+                    setattr(cls, name, instrument("repository.call", attributes)(fn))
+            if cls.__cache__ is not None:
+                cls._cache_attributes = {"repository": cls.__name__}
+                for name in cls.__cached_reads__:
+                    fn = getattr(cls, name)
+                    if not getattr(fn, "__cache_wrapped__", False):
+                        setattr(cls, name, cached(fn, name))
 
     @classmethod
     def track_events(cls, func: TWrap) -> TWrap:
         @functools.wraps(func)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:
+        def wrapper(self: Repository[Any], *args: Any, **kwargs: Any) -> Any:
             for param in itertools.chain(args, kwargs.values()):
                 if isinstance(param, AggregateRoot):
-                    args[0].events.extend(param.get_events())
-                    param.clear_events()
-                if isinstance(param, list):
+                    self.track(param, written=True)
+                elif isinstance(param, list):
                     for elem in param:
                         if isinstance(elem, AggregateRoot):
-                            args[0].events.extends(elem.get_events())
-                            elem.clear_events()
-            return func(*args, **kwargs)
+                            self.track(elem, written=True)
+            result = func(self, *args, **kwargs)
+            if isinstance(result, AggregateRoot):
+                self.track(result)
+            return result
 
+        wrapper.__tracked__ = True  # type: ignore[attr-defined]
         return cast(TWrap, wrapper)
+
+    def track(self, aggregate: AggregateRoot, written: bool = False) -> None:
+        """Tracks the aggregate in the unit of work, keeping its version when first seen."""
+        state = self._unit_of_work_tracking()
+        if state is not None:
+            key: AggregateKey = (aggregate.__class__, aggregate.id)
+            state.aggregates[key] = aggregate
+            state.versions.setdefault(key, aggregate.version)
+            if written:
+                state.written.add(key)
+        if lazy_fields(aggregate.__class__):
+            self.bind_lazy(aggregate)
+
+    def reset(self) -> None:
+        """Forgets the tracked aggregates and collected events."""
+        state = self._tracking
+        state.events.clear()
+        state.aggregates.clear()
+        state.versions.clear()
+        state.written.clear()
+        state.cache_generation = None
+
+    def changed(self) -> Iterator[tuple[AggregateRoot, int]]:
+        """Yields the tracked aggregates written or having events, with their version when first seen."""
+        for key, aggregate in self.aggregates.items():
+            if key in self.written or aggregate.get_events():
+                yield aggregate, self.versions[key]
+
+    def pull_events(self) -> list[Event]:
+        """Moves the events of the tracked aggregates to the repository events."""
+        for aggregate in self.aggregates.values():
+            if events := aggregate.get_events():
+                self.events.extend(events)
+                aggregate.clear_events()
+        return self.events
+
+    def stored_version(self, aggregate: AggregateRootT) -> Optional[int]:
+        """Returns the version of the aggregate in the store, None if unknown.
+
+        Implement it to detect concurrent changes early: the unit of work raises ConcurrencyConflictError
+        at commit if the stored version moved since the aggregate was loaded. The check runs before the
+        session commit, another commit can still happen in between: adapters must make their writes
+        conditional on the loaded versions, as InMemorySession and SQLiteSession do.
+        """
+        return None
+
+    # Query protocol
+
+    def _page(
+        self, cursor: Optional[Cursor], limit: int, where: Where
+    ) -> Page[AggregateRootT]:
+        """Returns at most `limit` aggregates after the cursor (from the start if None), in a stable order.
+
+        Implement it to support the query protocol, the aggregates fields must be equal to the `where` values.
+        Without it, the query methods (page and the iterators) raise QueryNotSupportedError.
+        """
+        raise QueryNotSupportedError(self)
+
+    def page(
+        self,
+        cursor: Optional[Cursor] = None,
+        limit: int = 100,
+        where: Optional[Where] = None,
+        load_with: Iterable[str] = (),
+    ) -> Page[AggregateRootT]:
+        """Returns a page of aggregates, pass its cursor to get the next one.
+
+        The `load_with` lazy fields are loaded for the whole page at once.
+        """
+        page = self._page(cursor, limit, where or {})
+        for aggregate in page.items:
+            self.track(aggregate)
+        if load_with:
+            self.prefetch(page.items, *load_with)
+        return page
+
+    def iter_chunks(
+        self,
+        where: Optional[Where] = None,
+        chunk_size: int = 1000,
+        load_with: Iterable[str] = (),
+    ) -> Iterator[list[AggregateRootT]]:
+        """Yields the aggregates matching `where` in lists of at most `chunk_size` aggregates.
+
+        Once the next chunk is requested, the aggregates of the previous one that were not written and
+        have no events are no longer tracked, so scanning any number of aggregates uses constant memory.
+        """
+        cursor = None
+        while True:
+            page = self.page(cursor, chunk_size, where, load_with)
+            try:
+                if page.items:
+                    yield page.items
+            finally:
+                self.release(page.items)
+            if page.cursor is None:
+                return
+            cursor = page.cursor
+
+    def iter_all(
+        self, chunk_size: int = 1000, load_with: Iterable[str] = ()
+    ) -> Iterator[AggregateRootT]:
+        """Yields every aggregate, loaded in chunks."""
+        for chunk in self.iter_chunks(None, chunk_size, load_with):
+            yield from chunk
+
+    def iter_where(
+        self, where: Where, chunk_size: int = 1000, load_with: Iterable[str] = ()
+    ) -> Iterator[AggregateRootT]:
+        """Yields the aggregates whose fields are equal to the `where` values, loaded in chunks."""
+        for chunk in self.iter_chunks(where, chunk_size, load_with):
+            yield from chunk
+
+    def release(self, aggregates: list[AggregateRootT]) -> None:
+        """Stops tracking the aggregates neither written nor having events."""
+        for aggregate in aggregates:
+            key: AggregateKey = (aggregate.__class__, aggregate.id)
+            if key not in self.written and not aggregate.get_events():
+                self.aggregates.pop(key, None)
+                self.versions.pop(key, None)
+
+    # Lazy loading
+
+    def _load_lazy(
+        self, aggregates: list[AggregateRootT], field: str
+    ) -> dict[ID, list[Any]]:
+        """Returns the entities of the LazyList field of the aggregates, by aggregate ID.
+
+        Implement it if the adapter builds aggregates with unloaded LazyLists, see LazyList.unloaded.
+        Without it, loading them raises LazyLoadNotSupportedError.
+        """
+        raise LazyLoadNotSupportedError(self)
+
+    def bind_lazy(self, aggregate: AggregateRoot) -> None:
+        """Binds the unloaded LazyList fields of the aggregate to the repository."""
+        for field in lazy_fields(aggregate.__class__):
+            lazy = getattr(aggregate, field)
+            if isinstance(lazy, LazyList) and not lazy.bound:
+                lazy.bind(functools.partial(self._load_on_access, aggregate, field))
+
+    def _load_on_access(self, aggregate: AggregateRoot, field: str) -> None:
+        # Loads the field of every tracked aggregate of the same class in the same batch
+        aggregates: list[Any] = [aggregate]
+        for other in self.aggregates.values():
+            if other.__class__ is aggregate.__class__ and other is not aggregate:
+                aggregates.append(other)
+        self.prefetch(aggregates, field)
+
+    def prefetch(self, aggregates: Iterable[AggregateRootT], *fields: str) -> None:
+        """Loads the unloaded LazyList fields of the aggregates, one `_load_lazy` call per field."""
+        aggregates = list(aggregates)
+        for field in fields:
+            unloaded = [
+                aggregate
+                for aggregate in aggregates
+                if not getattr(aggregate, field).loaded
+            ]
+            if not unloaded:
+                continue
+            entities = self._load_lazy(unloaded, field)
+            for aggregate in unloaded:
+                getattr(aggregate, field).set_loaded(entities.get(aggregate.id, []))
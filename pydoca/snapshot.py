@@ -0,0 +1,265 @@
+"""Binary snapshots of the InMemorySession databases, reloaded lazily for fast restarts."""
+import contextlib
+import io
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+from typing import Any, BinaryIO, ClassVar, Optional
+
+import pydantic_core
+
+from .entity import ID
+from .instrumentation import count, instrument
+from .memory import _MISSING, InMemorySession, _Database, _Version
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+_MAGIC = b"PYDOCASN"
+# Magic, format version, commit of the snapshot, directory offset and length
+_HEADER = struct.Struct("<8sIQQQ")
+
+
+class _RowUnpickler(pickle.Unpickler):
+    """Loads the pickled rows, made of builtin values only: no class is ever loaded from the file."""
+
+    def find_class(self, module: str, name: str) -> Any:
+        raise pickle.UnpicklingError(f"Snapshot rows can not hold {module}.{name}")
+
+
+class _StoredVersion(_Version):
+    """Version read from a snapshot file, its row decoded on first access.
+
+    The row field of the tuple holds the (start, end) offsets of the row in the `buffer` of the class,
+    a subclass is created for each loaded file. Rows are pickled rather than JSON encoded, keeping the
+    nested rows tuples and the sequences lists as the codecs dump them, so the queries comparing the
+    rows to dumped values match.
+    """
+
+    buffer: ClassVar[mmap.mmap]
+
+    @property
+    def row(self) -> Any:
+        row = self.__dict__.get("row", _MISSING)
+        if row is _MISSING:
+            # Decoding twice from concurrent readers gives equal rows
+            row = self.__dict__["row"] = _RowUnpickler(
+                io.BytesIO(self.encoded())
+            ).load()
+        return row
+
+    def encoded(self) -> bytes:
+        """Returns the pickled row, as stored in the file."""
+        start, end = self[1]
+        return self.buffer[start:end]
+
+
+def _database(session: type[InMemorySession]) -> _Database:
+    return session.start()._database
+
+
+def _attributes(session: type[InMemorySession], *args: Any) -> dict[str, str]:
+    return {"database": session.database}
+
+
+def _encoded(version: _Version) -> bytes:
+    if isinstance(version, _StoredVersion) and "row" not in version.__dict__:
+        return version.encoded()  # Not decoded since loaded, copied as is
+    return pickle.dumps(version.row, protocol=5)
+
+
+def _write_section(
+    file: BinaryIO, versions: dict[ID, _Version], snapshot: int
+) -> list[list[Any]]:
+    """Writes the rows visible at the snapshot, returns their IDs and file offsets."""
+    ids: list[ID] = []
+    offsets = [file.tell()]
+    # Copied in a single C call, the commits go on while the rows are written
+    for aggregate_id, version in list(versions.items()):
+        visible: Optional[_Version] = version
+        while visible is not None and visible.seq > snapshot:
+            visible = visible.previous
+        if visible is None or visible.row is None:
+            continue
+        if isinstance(aggregate_id, bytes):
+            raise TypeError(f"Cannot snapshot the bytes ID {aggregate_id!r}")
+        ids.append(aggregate_id)
+        offsets.append(offsets[-1] + file.write(_encoded(visible)))
+    return [ids, offsets]
+
+
+@instrument("snapshot.save", _attributes)
+def save_snapshot(session: type[InMemorySession], path: str) -> int:
+    """Writes the last commit of the session database to the file, returns the commit sequence number.
+
+    pydoca.save_snapshot(BudgetDatabase, "budget.snapshot")
+
+    The rows are read from a snapshot of the database: the commits are not paused while the file is
+    written, they are only kept in memory along the rows they replace until it is done. The file is
+    written next to the path then renamed, a crash leaves the previous snapshot intact.
+
+    Raises:
+        TypeError: An aggregate has a bytes ID, not supported by the format.
+    """
+    database = _database(session)
+    snapshot = database.begin()
+    temporary = f"{path}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            file.write(bytes(_HEADER.size))
+            tables = {}
+            for name, table in list(database.tables.items()):
+                tables[name] = {
+                    "size": table.count(snapshot),
+                    "rows": _write_section(file, table.rows, snapshot),
+                    "children": {
+                        field: _write_section(file, versions, snapshot)
+                        for field, versions in list(table.children.items())
+                    },
+                }
+            directory = pydantic_core.to_json({"tables": tables})
+            offset = file.tell()
+            file.write(directory)
+            file.seek(0)
+            file.write(
+                _HEADER.pack(_MAGIC, FORMAT_VERSION, snapshot, offset, len(directory))
+            )
+            file.flush()
+            os.fsync(file.fileno())
+            written = offset + len(directory)
+        os.replace(temporary, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporary)
+        raise
+    finally:
+        database.end(snapshot)
+    count("snapshot.bytes", written, _attributes(session))
+    return snapshot
+
+
+def load_snapshot(session: type[InMemorySession], path: str) -> int:
+    """Replaces the session database by the snapshot file, returns its commit sequence number.
+
+    pydoca.load_snapshot(BudgetDatabase, "budget.snapshot")
+
+    The file is mapped in memory and only its directory is read: each row is decoded the first time it
+    is read, the first query of an indexed repository decodes its whole table to build the indexes.
+    The sessions started before keep the replaced database.
+
+    Raises:
+        ValueError: The file is not a snapshot, or has an unsupported format version.
+    """
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < _HEADER.size:
+        raise ValueError(f"{path} is not a pydoca snapshot")
+    seq: int
+    magic, version, seq, offset, length = _HEADER.unpack_from(buffer)
+    if magic != _MAGIC:
+        raise ValueError(f"{path} is not a pydoca snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(
+            f"{path} has snapshot format {version}, expected {FORMAT_VERSION}"
+        )
+    directory = pydantic_core.from_json(buffer[offset : offset + length])
+    stored = type("_StoredVersion", (_StoredVersion,), {"buffer": buffer})
+
+    def versions(ids: list[ID], offsets: list[int]) -> dict[ID, _Version]:
+        return {
+            aggregate_id: stored(seq, (start, end), None)
+            for aggregate_id, start, end in zip(
+                ids, offsets[:-1], offsets[1:], strict=True
+            )
+        }
+
+    database = _Database()
+    database.seq = seq
+    for name, entry in directory["tables"].items():
+        table = database.table(name)
+        table.rows = versions(*entry["rows"])
+        table.children = {
+            field: versions(*section) for field, section in entry["children"].items()
+        }
+        table.size = entry["size"]
+        table.sizes = [(seq, table.size)]
+    with session._databases_lock:
+        session._databases[session.database] = database
+    return seq
+
+
+class PeriodicSnapshot:
+    """Saves snapshots of an InMemorySession database from a background thread.
+
+    snapshots = pydoca.PeriodicSnapshot(BudgetDatabase, "budget.snapshot", interval=60)
+    if os.path.exists(snapshots.path):
+        seq = pydoca.load_snapshot(BudgetDatabase, snapshots.path)
+    snapshots.start()
+    ...
+    snapshots.stop()  # Saves a last snapshot
+
+    A snapshot is saved every `interval` seconds if the database changed since the last one, see
+    `save_snapshot`. A failing save is logged and retried at the next interval.
+
+    Spans emitted, with the database name as attribute:
+        snapshot.save: Writing of a snapshot file.
+
+    Counters emitted, with the database name as attribute:
+        snapshot.bytes: Size of the snapshot files written.
+
+    Attributes:
+        session: InMemorySession class of the database.
+        path: Snapshot file.
+        interval: Seconds between two snapshots (default: 60).
+        seq: Commit of the last snapshot saved, None if none.
+    """
+
+    def __init__(
+        self, session: type[InMemorySession], path: str, interval: float = 60.0
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.session = session
+        self.path = path
+        self.interval = interval
+        self.seq: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise RuntimeError("PeriodicSnapshot already started.")
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pydoca-snapshot", daemon=True
+        )
+        self._thread.start()
+
+    def save(self) -> Optional[int]:
+        """Saves a snapshot now if the database changed, returns its commit or None if unchanged."""
+        with self._lock:
+            if self.seq is not None and _database(self.session).seq == self.seq:
+                return None
+            self.seq = save_snapshot(self.session, self.path)
+            return self.seq
+
+    def stop(self, save: bool = True) -> None:
+        """Stops the background thread, then saves a last snapshot unless `save` is False."""
+        thread, self._thread = self._thread, None
+        self._stopped.set()
+        if thread is not None:
+            thread.join()
+        if save:
+            self.save()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.save()
+            except Exception:
+                logger.exception(f"Error saving the snapshot {self.path}")
@@ -0,0 +1,541 @@
+"""SQLite Session and Repository adapters."""
+import functools
+import math
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, ClassVar, NamedTuple, Optional, Self, cast
+
+import pydantic_core
+
+from .aggregate_root import AggregateRoot
+from .codec import codec
+from .collection import LazyList, lazy_fields
+from .deadlines import DeadlineExceededError, check_deadline, get_deadline
+from .entity import ID
+from .group_commit import GroupCommit
+from .repository import AggregateRootT, Cursor, Page, Repository, Session, Where
+from .unit_of_work import ConcurrencyConflictError
+
+# Enough for the statements of ~40 aggregate types per connection
+_CACHED_STATEMENTS = 256
+
+# sqlite3.connect default timeout
+_BUSY_TIMEOUT_MS = 5000
+
+# Virtual machine instructions between two deadline checks, a few microseconds
+_PROGRESS_STEPS = 1000
+
+
+class _Statements(NamedTuple):
+    create: str
+    select: str
+    select_all: str
+    select_version: str
+    select_count: str
+    upsert: str
+    update: str
+    delete: str
+
+
+def _quote(table: str) -> str:
+    return '"' + table.replace('"', '""') + '"'
+
+
+@functools.cache
+def _statements(table: str) -> _Statements:
+    """Builds the SQL of a table once, sqlite3 then reuses the prepared statements per connection."""
+    name = _quote(table)
+    return _Statements(
+        create=f"CREATE TABLE IF NOT EXISTS {name} "
+        "(id PRIMARY KEY, version INTEGER NOT NULL, data BLOB NOT NULL)",
+        select=f"SELECT data FROM {name} WHERE id = ?",
+        select_all=f"SELECT data FROM {name} ORDER BY rowid",
+        select_version=f"SELECT version FROM {name} WHERE id = ?",
+        select_count=f"SELECT COUNT(*) FROM {name}",
+        # Rows stored outside of a unit of work stay at version 0, overwritten like a new aggregate
+        upsert=f"INSERT INTO {name} (id, version, data) VALUES (?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET version = excluded.version, data = excluded.data "
+        f"WHERE {name}.version = 0",
+        update=f"UPDATE {name} SET version = ?, data = ? WHERE id = ? AND version = ?",
+        delete=f"DELETE FROM {name} WHERE id = ? AND version = ?",
+    )
+
+
+@functools.cache
+def _page_statement(table: str, indexes: tuple[int, ...]) -> str:
+    """Builds the keyset pagination query, filtering on the row values at the indexes."""
+    name = _quote(table)
+    conditions = "".join(
+        f" AND json_extract(CAST(data AS TEXT), '$[{index}]') IS ?" for index in indexes
+    )
+    return f"SELECT rowid, data FROM {name} WHERE rowid > ?{conditions} ORDER BY rowid LIMIT ?"
+
+
+class _ChildStatements(NamedTuple):
+    create: str
+    select: str
+    insert: str
+    delete: str
+
+
+@functools.cache
+def _child_statements(table: str) -> _ChildStatements:
+    """Builds the SQL of a table of LazyList entities, one row per entity."""
+    name = _quote(table)
+    return _ChildStatements(
+        create=f"CREATE TABLE IF NOT EXISTS {name} "
+        "(aggregate_id NOT NULL, position INTEGER NOT NULL, data BLOB NOT NULL, "
+        "PRIMARY KEY (aggregate_id, position)) WITHOUT ROWID",
+        select=f"SELECT aggregate_id, data FROM {name} "
+        "WHERE aggregate_id IN (SELECT value FROM json_each(?)) ORDER BY aggregate_id, position",
+        insert=f"INSERT INTO {name} (aggregate_id, position, data) VALUES (?, ?, ?)",
+        delete=f"DELETE FROM {name} WHERE aggregate_id = ?",
+    )
+
+
+class _Write(NamedTuple):
+    aggregate: AggregateRoot
+    # Version when first staged, 0 if never committed by a unit of work: its row may exist at version 0
+    expected: int
+    delete: bool = False
+
+
+class _Connection:
+    """Connection of a thread to a database, with the tables it created."""
+
+    def __init__(self, database: str, synchronous: str) -> None:
+        # Transactions are managed explicitly, see SQLiteSession.flush
+        self.connection = sqlite3.connect(
+            database, isolation_level=None, cached_statements=_CACHED_STATEMENTS
+        )
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute(f"PRAGMA synchronous = {synchronous}")
+        self.tables: set[str] = set()
+        self.deadline: Optional[float] = None
+
+
+def _expired(deadline: float) -> bool:
+    return time.monotonic() > deadline
+
+
+class SQLiteSession(Session):
+    """Session on a SQLite database in WAL mode.
+
+    class BudgetDatabase(pydoca.SQLiteSession):
+        database = "budget.db"
+
+    Each thread reuses a single connection per database, shared by every session started in this thread.
+    Repositories stage their writes in the session, apart from the other sessions of the thread, which flushes them at commit in one transaction,
+    with a single `executemany` per aggregate type and operation. Aggregates are serialized at flush,
+    after the unit of work incremented their version.
+
+    Writes are conditional on the version of the aggregate when first staged, the commit raises
+    ConcurrencyConflictError if another connection changed the aggregate in the meantime.
+
+    Units of work with a deadline (see `pydoca.deadline`) wait for the database locks until it at most,
+    and their statements are interrupted once it expired: sqlite3.OperationalError for the reads,
+    DeadlineExceededError for the writes at commit, after rolling back.
+
+    With a `__group_commit__`, the writes of the units of work committing concurrently to the same
+    database are flushed in one transaction, each in its own savepoint: a conflicting unit of work is rolled back alone, and
+    every unit of work returns from its commit, publishing its events, once the transaction committed.
+
+    Attributes:
+        database: Path of the database file.
+        __synchronous__: SQLite synchronous setting (default: "NORMAL", the last commits can be lost
+            on power failure). "FULL" syncs every commit to disk, a cost shared by the grouped commits.
+        __group_commit__: Coordinator of the commits of the threads (default: None, each session
+            commits its own transaction).
+    """
+
+    database: ClassVar[str] = ":memory:"
+    __synchronous__: ClassVar[str] = "NORMAL"
+    __group_commit__: ClassVar[Optional[GroupCommit["_Writes"]]] = None
+    _local: ClassVar[threading.local] = threading.local()
+
+    def __init__(self, connection: _Connection) -> None:
+        self._connection = connection
+        self._pending: "_Writes" = {}
+
+    @classmethod
+    def _connections(cls) -> dict[str, _Connection]:
+        connections: Optional[dict[str, _Connection]] = getattr(
+            cls._local, "connections", None
+        )
+        if connections is None:
+            connections = cls._local.connections = {}
+        return connections
+
+    @classmethod
+    def start(cls) -> Self:
+        connections = cls._connections()
+        connection = connections.get(cls.database)
+        if connection is None:
+            connection = connections[cls.database] = _Connection(
+                cls.database, cls.__synchronous__
+            )
+        return cls(connection)
+
+    @classmethod
+    def url(cls) -> str:
+        return f"sqlite:///{cls.database}"
+
+    @classmethod
+    def close(cls) -> None:
+        """Closes the connection of the current thread to the database, if any."""
+        if connection := cls._connections().pop(cls.database, None):
+            connection.connection.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self._connection.connection
+
+    def statements(self, table: str) -> _Statements:
+        """Returns the statements of the table, creating it if needed."""
+        statements = _statements(table)
+        if table not in self._connection.tables:
+            self._create(table, statements.create)
+        return statements
+
+    def child_statements(self, table: str) -> _ChildStatements:
+        """Returns the statements of the LazyList entities table, creating it if needed."""
+        statements = _child_statements(table)
+        if table not in self._connection.tables:
+            self._create(table, statements.create)
+        return statements
+
+    def _create(self, table: str, create: str) -> None:
+        self.connection.execute(create)
+        # Created in a transaction, the table is dropped if it rolls back
+        if not self.connection.in_transaction:
+            self._connection.tables.add(table)
+
+    def _create_tables(self, writes: "_Writes") -> None:
+        """Creates the tables of the writes, before the transaction writing them."""
+        for table, _ in writes:
+            self.statements(table)
+        for (table, _), write in writes.items():
+            for field in lazy_fields(write.aggregate.__class__):
+                self.child_statements(f"{table}.{field}")
+
+    def staged(self, table: str, aggregate_id: ID) -> Optional[_Write]:
+        """Returns the write staged for the aggregate, if any."""
+        return self._pending.get((table, aggregate_id))
+
+    def stage(self, table: str, aggregate: AggregateRoot, delete: bool = False) -> None:
+        """Stages the aggregate to be written, or deleted, at the next flush."""
+        key = (table, aggregate.id)
+        previous = self._pending.get(key)
+        expected = aggregate.version if previous is None else previous.expected
+        self._pending[key] = _Write(aggregate, expected, delete)
+
+    def flush(self) -> None:
+        """Writes the staged aggregates in the current transaction, beginning one if needed."""
+        pending = self._pending
+        if not pending:
+            return
+        upserts: dict[str, list[_Write]] = defaultdict(list)
+        updates: dict[str, list[_Write]] = defaultdict(list)
+        deletes: dict[str, list[_Write]] = defaultdict(list)
+        lazy: dict[str, list[_Write]] = defaultdict(list)
+        for (table, _), write in pending.items():
+            if lazy_fields(write.aggregate.__class__):
+                lazy[table].append(write)
+            if write.delete:
+                deletes[table].append(write)
+            elif write.expected == 0:
+                upserts[table].append(write)
+            else:
+                updates[table].append(write)
+        if not self.connection.in_transaction:
+            self._create_tables(pending)
+            self.connection.execute("BEGIN IMMEDIATE")
+        pending.clear()
+        for table, writes in upserts.items():
+            statements = self.statements(table)
+            cursor = self.connection.executemany(
+                statements.upsert,
+                [
+                    (w.aggregate.id, w.aggregate.version, _dump(w.aggregate))
+                    for w in writes
+                ],
+            )
+            if cursor.rowcount != len(writes) and (
+                conflict := self._conflict(statements, writes)
+            ):
+                raise conflict
+        for table, writes in updates.items():
+            statements = self.statements(table)
+            cursor = self.connection.executemany(
+                statements.update,
+                [
+                    (
+                        w.aggregate.version,
+                        _dump(w.aggregate),
+                        w.aggregate.id,
+                        w.expected,
+                    )
+                    for w in writes
+                ],
+            )
+            if cursor.rowcount != len(writes) and (
+                conflict := self._conflict(statements, writes)
+            ):
+                raise conflict
+        for table, writes in deletes.items():
+            statements = self.statements(table)
+            cursor = self.connection.executemany(
+                statements.delete, [(w.aggregate.id, w.expected) for w in writes]
+            )
+            # Deleting a missing aggregate never stored is a no-op, not a conflict
+            if cursor.rowcount != len(writes) and (
+                conflict := self._conflict(statements, writes)
+            ):
+                raise conflict
+        for table, writes in lazy.items():
+            self._flush_lazy(table, writes)
+
+    def _flush_lazy(self, table: str, writes: list[_Write]) -> None:
+        # Rewrites the entities of the loaded LazyLists, the unloaded ones are unchanged
+        for field, entity_class in lazy_fields(writes[0].aggregate.__class__).items():
+            statements = self.child_statements(f"{table}.{field}")
+            encode = codec(entity_class).encode
+            stale: list[tuple[ID]] = []
+            rows: list[tuple[ID, int, bytes]] = []
+            for write in writes:
+                aggregate_id = write.aggregate.id
+                entities = write.aggregate.__dict__[field]
+                if write.delete:
+                    stale.append((aggregate_id,))
+                    continue
+                if isinstance(entities, LazyList) and not entities.loaded:
+                    continue
+                # Even at version 0, the aggregate may have been stored outside of a unit of work
+                stale.append((aggregate_id,))
+                rows.extend(
+                    (aggregate_id, position, encode(entity))
+                    for position, entity in enumerate(entities)
+                )
+            if stale:
+                self.connection.executemany(statements.delete, stale)
+            if rows:
+                self.connection.executemany(statements.insert, rows)
+
+    def _conflict(
+        self, statements: _Statements, writes: list[_Write]
+    ) -> Optional[ConcurrencyConflictError]:
+        for write in writes:
+            row = self.connection.execute(
+                statements.select_version, (write.aggregate.id,)
+            ).fetchone()
+            # Missing rows, never stored or deleted, are version 0 like the rows stored outside of a
+            # unit of work
+            stored: int = row[0] if row else 0
+            if stored != write.expected:
+                return ConcurrencyConflictError(write.aggregate, write.expected, stored)
+        return None
+
+    def begin(self) -> None:
+        deadline = get_deadline()
+        if deadline is None:
+            return
+        timeout_ms = max(math.ceil((deadline - time.monotonic()) * 1000), 0)
+        self.connection.execute(f"PRAGMA busy_timeout = {timeout_ms}")
+        self.connection.set_progress_handler(
+            functools.partial(_expired, deadline), _PROGRESS_STEPS
+        )
+        self._connection.deadline = deadline
+
+    def _end(self) -> None:
+        if self._connection.deadline is not None:
+            self._connection.deadline = None
+            self.connection.set_progress_handler(None, 0)
+            self.connection.execute(f"PRAGMA busy_timeout = {_BUSY_TIMEOUT_MS}")
+
+    def commit(self) -> None:
+        group_commit = self.__group_commit__
+        if (
+            group_commit is not None
+            and self._pending
+            and not self.connection.in_transaction
+        ):
+            writes = self._pending.copy()
+            self._pending.clear()
+            self._end()
+            # Merged with the commits of the same database, a temporary one is private to its connection
+            private = self.database in ("", ":memory:")
+            key = self._connection if private else self.database
+            group_commit.commit(writes, self._commit_group, key)
+            return
+        try:
+            self.flush()
+        except sqlite3.OperationalError as exc:
+            self.rollback()
+            try:
+                check_deadline()
+            except DeadlineExceededError as expired:
+                # Interrupted, or waited for the locks until the deadline
+                raise expired from exc
+            raise
+        except Exception:
+            self.rollback()
+            raise
+        # Writes flushed before the deadline are committed, not interrupted half way
+        self._end()
+        if self.connection.in_transaction:
+            self.connection.execute("COMMIT")
+
+    def rollback(self) -> None:
+        self._end()
+        self._pending.clear()
+        if self.connection.in_transaction:
+            self.connection.execute("ROLLBACK")
+
+    def _commit_group(self, batch: list["_Writes"]) -> list[Optional[BaseException]]:
+        """Flushes the writes of the units of work in one transaction, each in a savepoint."""
+        errors: list[Optional[BaseException]] = []
+        connection = self.connection
+        try:
+            # Created outside the transaction, a rollback to a savepoint would drop them
+            for writes in batch:
+                self._create_tables(writes)
+            connection.execute("BEGIN IMMEDIATE")
+            for writes in batch:
+                connection.execute("SAVEPOINT unit_of_work")
+                self._pending.update(writes)
+                try:
+                    self.flush()
+                except sqlite3.OperationalError:
+                    raise  # The transaction may be rolled back by SQLite
+                except Exception as exc:
+                    self._pending.clear()
+                    connection.execute("ROLLBACK TO unit_of_work")
+                    errors.append(exc)
+                else:
+                    errors.append(None)
+                connection.execute("RELEASE unit_of_work")
+            connection.execute("COMMIT")
+        except Exception:
+            self.rollback()
+            raise
+        return errors
+
+
+_Writes = dict[tuple[str, ID], _Write]
+
+
+def _dump(aggregate: AggregateRoot) -> bytes:
+    return codec(aggregate.__class__).encode(aggregate)
+
+
+class SQLiteRepository(Repository[AggregateRootT]):
+    """Repository storing aggregates in a SQLite table, named after the aggregate class.
+
+    class SQLiteBudgetRepo(pydoca.SQLiteRepository[Budget], BudgetRepository):
+        sessionT = BudgetDatabase
+        aggregateT = Budget
+
+        def get_by_id(self, budget_id: str) -> Budget:
+            if budget := self.load(budget_id):
+                return budget
+            raise pydoca.EntityNotFoundError(class_id=(Budget, budget_id))
+
+        def save(self, budget: Budget) -> None:
+            self.store(budget)
+
+    Aggregates are stored as the JSON rows of their codec, see `pydoca.codec`. Stored aggregates are written
+    at the unit of work commit, loading them before returns the staged ones. LazyList fields are stored in
+    their own table, one row per entity, only rewritten when loaded. Queries (`page`, `iter_all`,
+    `iter_where`) read the committed aggregates, `where` comparing the stored values of scalar fields.
+
+    Attributes:
+        aggregateT: Class of the stored aggregates.
+        __table__: Name of the table (default: the aggregate class name).
+    """
+
+    sessionT: type[SQLiteSession] = SQLiteSession
+    aggregateT: type[AggregateRootT]
+    __table__: ClassVar[Optional[str]] = None
+
+    @property
+    def table(self) -> str:
+        return self.__table__ or self.aggregateT.__name__
+
+    @property
+    def sqlite_session(self) -> SQLiteSession:
+        return cast(SQLiteSession, self.session)
+
+    def load(self, aggregate_id: ID) -> Optional[AggregateRootT]:
+        """Returns the aggregate, None if not found."""
+        session = self.sqlite_session
+        if write := session.staged(self.table, aggregate_id):
+            return None if write.delete else cast(AggregateRootT, write.aggregate)
+        statements = session.statements(self.table)
+        row = session.connection.execute(statements.select, (aggregate_id,)).fetchone()
+        if not row:
+            return None
+        aggregate = codec(self.aggregateT).decode(row[0])
+        self.bind_lazy(aggregate)
+        return aggregate
+
+    def load_all(self) -> list[AggregateRootT]:
+        """Returns the stored aggregates, in insertion order, ignoring the staged writes."""
+        session = self.sqlite_session
+        statements = session.statements(self.table)
+        decode = codec(self.aggregateT).decode
+        aggregates = [
+            decode(data)
+            for (data,) in session.connection.execute(statements.select_all)
+        ]
+        for aggregate in aggregates:
+            self.bind_lazy(aggregate)
+        return aggregates
+
+    def _page(
+        self, cursor: Optional[Cursor], limit: int, where: Where
+    ) -> Page[AggregateRootT]:
+        # Keyset pagination on the rowid, the cursor being the rowid of the last aggregate returned
+        session = self.sqlite_session
+        session.statements(self.table)
+        aggregate_codec = codec(self.aggregateT)
+        params = [
+            aggregate_codec.dump_field(name, value) for name, value in where.items()
+        ]
+        indexes = tuple(aggregate_codec.fields.index(name) for name in where)
+        rows = session.connection.execute(
+            _page_statement(self.table, indexes), [cursor or 0, *params, limit]
+        ).fetchall()
+        items = [aggregate_codec.decode(data) for _, data in rows]
+        return Page(items, rows[-1][0] if len(rows) == limit else None)
+
+    def _load_lazy(
+        self, aggregates: list[AggregateRootT], field: str
+    ) -> dict[ID, list[Any]]:
+        session = self.sqlite_session
+        statements = session.child_statements(f"{self.table}.{field}")
+        decode = codec(lazy_fields(self.aggregateT)[field]).decode
+        ids = pydantic_core.to_json([aggregate.id for aggregate in aggregates])
+        entities: dict[ID, list[Any]] = defaultdict(list)
+        for aggregate_id, data in session.connection.execute(statements.select, (ids,)):
+            entities[aggregate_id].append(decode(data))
+        return entities
+
+    def count(self) -> int:
+        """Returns the number of stored aggregates, ignoring the staged writes."""
+        session = self.sqlite_session
+        statements = session.statements(self.table)
+        return cast(
+            int, session.connection.execute(statements.select_count).fetchone()[0]
+        )
+
+    def store(self, aggregate: AggregateRootT) -> None:
+        """Stages the aggregate to be inserted or updated at commit."""
+        self.track(aggregate, written=True)
+        self.sqlite_session.stage(self.table, aggregate)
+
+    def remove(self, aggregate: AggregateRootT) -> None:
+        """Stages the aggregate to be deleted at commit."""
+        self.track(aggregate, written=True)
+        self.sqlite_session.stage(self.table, aggregate, delete=True)
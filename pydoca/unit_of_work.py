@@ -1,14 +1,18 @@
 import logging
 import queue
-from contextvars import ContextVar
+from contextvars import ContextVar, Token
 from types import TracebackType
 from typing import Any, Iterator, Optional, Self
 
 import pydantic
 
-from .event import Event
+from .aggregate_root import AggregateRoot
+from .cache import invalidate_cached
+from .deadlines import DeadlineExceededError, check_deadline
+from .event import Event, compact_events
+from .instrumentation import count, instrument
 from .port_adapter import inject
-from .repository import Repository, Session
+from .repository import _TRACKING, Repository, Session, _Tracking
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +23,15 @@ _EVENT_BUS: ContextVar[queue.Queue[Event]] = ContextVar(
 
 class EventBus:
     @staticmethod
+    @instrument("event_bus.publish")
     def publish_events(events: Iterator[Event]) -> None:
+        published = 0
         try:
             event_bus = _EVENT_BUS.get()
             for event in events:
                 event_bus.put(event)
+                published += 1
+            count("event_bus.events", published)
         except Exception:
             logger.exception(f"Error publishing events {events}")
 
@@ -47,11 +55,24 @@ class DifferentSessionsError(Exception):
     """If the unit of work detects different sessions."""
 
 
+class ConcurrencyConflictError(Exception):
+    """If an aggregate changed in the store since it was loaded by the unit of work."""
+
+    def __init__(self, aggregate: AggregateRoot, expected: int, stored: int) -> None:
+        super().__init__(
+            f"{aggregate} version {expected} expected but version {stored} is stored"
+        )
+        self.aggregate = aggregate
+        self.expected = expected
+        self.stored = stored
+
+
 class UnitOfWorkBase(pydantic.BaseModel):
     model_config = pydantic.ConfigDict(arbitrary_types_allowed=True)
 
     # TODO: Manage multiple sessions
     _session: Optional[Session] = None
+    _tracking: Optional[Token[Optional[dict[int, _Tracking]]]] = None
 
     @property
     def session(self) -> Session:
@@ -79,42 +100,101 @@ class UnitOfWorkBase(pydantic.BaseModel):
             data[attr_name] = repository
         return data
 
+    @instrument("uow.enter")
     def __enter__(self) -> Self:
-        repo: Repository[Any]
-        for repo in dict(self).values():
-            session = repo.session
+        check_deadline()
+        repositories = list(self.repositories)
+        for repo in repositories:
             if not self._session:
-                self._session = session
+                self._session = repo.sessionT.start()
                 continue
-            if session != self._session:
+            # Same check as Session.__eq__, without starting a session
+            if not (
+                isinstance(self._session, repo.sessionT)
+                and repo.sessionT.url() == self._session.url()
+            ):
                 raise DifferentSessionsError(
                     "UnitOfWork can not manage different sessions."
                 )
+        # Repositories share the transaction of the unit of work, and track its aggregates apart from
+        # the other units of work using them
+        states = dict(_TRACKING.get() or {})
+        for repo in repositories:
+            states[id(repo)] = repo._begin_tracking(self.session)
+        # Set once the transaction began, a failing begin leaves the context as it was
+        self.session.begin()
+        self._tracking = _TRACKING.set(states)
         return self
 
+    @instrument("uow.exit")
     def __exit__(
         self,
         exc_type: Optional[type[BaseException]] = None,
         exc_value: Optional[BaseException] = None,
         traceback: Optional[TracebackType] = None,
     ) -> None:
-        if exc_type:
-            self.session.rollback()
-        else:
-            self.commit()
-
+        try:
+            if exc_type:
+                self.session.rollback()
+                count("uow.rollbacks")
+            else:
+                self.commit()
+        finally:
+            if self._tracking is not None:
+                token, self._tracking = self._tracking, None
+                _TRACKING.reset(token)
+
+    @instrument("uow.commit")
     def commit(self) -> None:
+        try:
+            # Not committing the work of a caller which gave up
+            check_deadline()
+            changed = self.check_versions()
+        except (ConcurrencyConflictError, DeadlineExceededError):
+            self.session.rollback()
+            raise
+        # Aggregates only having events were not stored, their version does not change
+        written = {key for repo in self.repositories for key in repo.written}
+        stored = [
+            (aggregate, version)
+            for aggregate, version in changed
+            if (aggregate.__class__, aggregate.id) in written
+        ]
+        for aggregate, version in stored:
+            aggregate.version = version + 1
         try:
             self.session.commit()
         except Exception as exc:
-            # Collect the events the clear the Aggregate but do not publish them
-            self.collect_events()
+            for aggregate, version in stored:
+                aggregate.version = version
+            # Collect the events to clear the Aggregate but do not publish them
+            list(self.collect_events())
             logger.exception(f"Error while committing the session: {exc}")
             raise exc
         else:
-            EventBus.publish_events(self.collect_events())
+            invalidate_cached(aggregate for aggregate, _ in changed)
+            EventBus.publish_events(iter(compact_events(self.collect_events())))
+
+    def check_versions(self) -> list[tuple[AggregateRoot, int]]:
+        """Returns the changed aggregates with their loaded versions.
+
+        Compares the loaded versions with the repositories `stored_version`, an early check: the session
+        commit must still fail if another commit changed the aggregates since.
+
+        Raises:
+            ConcurrencyConflictError: If the stored version of a changed aggregate moved since it was loaded.
+        """
+        changed = []
+        for repo in self.repositories:
+            for aggregate, version in repo.changed():
+                stored = repo.stored_version(aggregate)
+                if stored is not None and stored != version:
+                    raise ConcurrencyConflictError(aggregate, version, stored)
+                changed.append((aggregate, version))
+        return changed
 
     def collect_events(self) -> Iterator[Event]:
         for repo in self.repositories:
-            for i in range(len(repo.events)):
-                yield repo.events[i]
+            events = repo.pull_events()
+            for i in range(len(events)):
+                yield events[i]
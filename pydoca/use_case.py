@@ -1,12 +1,25 @@
 import abc
-from typing import Any, ClassVar, Optional
+import asyncio
+import functools
+import inspect
+import logging
+import types
+import typing
+from typing import Any, Callable, ClassVar, Iterable, Optional, Union
 
 import pydantic
 
+from .bulkhead import Bulkhead
+from .deadlines import deadline
+from .idempotency import ResultStore
+from .instrumentation import count, instrument
 from .port_adapter import Port, inject
-from .unit_of_work import UnitOfWorkBase
+from .profiling import Profiler
+from .unit_of_work import ConcurrencyConflictError, UnitOfWorkBase
 from .value_object import ValueObject
 
+logger = logging.getLogger(__name__)
+
 
 class UnitOfWorkNotDefined(Exception):
     """When the UnitOfWork class in not defined in the Use Case."""
@@ -16,8 +29,13 @@ class Command(ValueObject):
     """Represents an intention to perform a specific action or operation within the domain.
 
     Encapsulates the parameters and details needed to execute a use case.
+
+    Attributes:
+        idempotency_key: Identifies the command across retries, for use cases storing their results.
     """
 
+    idempotency_key: Optional[str] = None
+
 
 class Service(Port):
     """Service interface."""
@@ -25,13 +43,321 @@ class Service(Port):
 
 UnitOfWork = UnitOfWorkBase
 
+ExecFn = Callable[[Any, Command], Any]
+
+
+def _retry_on_conflict(exec_fn: ExecFn, retries: int) -> ExecFn:
+    @functools.wraps(exec_fn)
+    def exec(self: UseCase, cmd: Command) -> Any:
+        for attempt in range(1, retries + 1):
+            try:
+                return exec_fn(self, cmd)
+            except ConcurrencyConflictError as exc:
+                logger.info(f"{exc}, retry {attempt}/{retries}")
+                count("use_case.conflict_retries", 1, {"use_case": type(self).__name__})
+        return exec_fn(self, cmd)
+
+    return exec
+
+
+def _idempotent(exec_fn: ExecFn, store: ResultStore) -> ExecFn:
+    @functools.wraps(exec_fn)
+    def exec(self: UseCase, cmd: Command) -> Any:
+        if cmd.idempotency_key is None:
+            return exec_fn(self, cmd)
+        executed = False
+
+        def execute() -> Any:
+            nonlocal executed
+            executed = True
+            return exec_fn(self, cmd)
+
+        cls = type(self)
+        # Qualified, use cases of the same name in other modules do not share their keys
+        result = store.execute(
+            f"{cls.__module__}.{cls.__qualname__}:{cmd.idempotency_key}",
+            cmd.model_dump_json(exclude={"idempotency_key"}),
+            execute,
+        )
+        if not executed:
+            count("use_case.idempotent_hits", 1, {"use_case": cls.__name__})
+        return result
+
+    return exec
+
+
+CallNext = Callable[[Any, Command], Any]
+
+
+class Middleware(abc.ABC):
+    """Cross-cutting concern wrapping the execution of the use cases (logging, auth checks, timing, ...).
+
+    class AdminOnly(pydoca.Middleware):
+        __commands__ = (AdminCmd,)
+
+        def __call__(self, use_case, cmd, call_next):
+            if not cmd.user.is_admin:
+                raise Forbidden()
+            return call_next(use_case, cmd)
+
+    pydoca.bootstrap(adapters_config=Configuration, middlewares=[Timing(), AdminOnly()])
+
+    Middlewares run in their registration order, the first one being the outermost. A use case
+    gets the middlewares of its command type, as annotated on its exec method, the others do
+    not cost anything when it is executed. Plain functions taking the same arguments are also
+    accepted as middlewares of every command.
+
+    Attributes:
+        __commands__: Command classes the middleware applies to (default: every command).
+    """
+
+    __commands__: ClassVar[tuple[type[Command], ...]] = (Command,)
+
+    @abc.abstractmethod
+    def __call__(self, use_case: Any, cmd: Command, call_next: CallNext) -> Any:
+        """Executes the use case by calling call_next, or returns without executing it."""
+
+
+MiddlewareFn = Middleware | Callable[[Any, Command, CallNext], Any]
+
+_MIDDLEWARES: tuple[MiddlewareFn, ...] = ()
+
+
+def set_middlewares(middlewares: Iterable[MiddlewareFn]) -> None:
+    """Replaces the middlewares, and compiles the pipeline of every use case defined so far.
+
+    Use cases defined later compile theirs when they are defined.
+    """
+    global _MIDDLEWARES
+    _MIDDLEWARES = tuple(middlewares)
+    _compile_pipelines()
+    logger.info(f"Set {len(_MIDDLEWARES)} middlewares")
+
+
+_PROFILER: Optional[Profiler] = None
+
+
+def set_profiler(profiler: Optional[Profiler]) -> None:
+    """Samples the executions of every use case with the profiler, or stops sampling them with None.
+
+    The pipelines of the use cases are compiled again, executions cost nothing more without profiler.
+    The replaced profiler keeps its profiles, `Profiler.close` stops its sampling thread.
+    """
+    global _PROFILER
+    _PROFILER = profiler
+    _compile_pipelines()
+    logger.info(f"{'Start' if profiler else 'Stop'} profiling the use cases")
+
+
+# Use case class variables compiled in the pipeline, a subclass setting one compiles its own
+_PIPELINE_ATTRIBUTES = ("__conflict_retries__", "__result_store__", "__bulkhead__", "__timeout__")
+
+
+class _Exec:
+    """Compiled exec of a use case class whose subclasses declare their own exec.
+
+    Its instances get the pipeline, super().exec in the subclasses gets the declared function.
+    """
+
+    __slots__ = ("function", "pipeline")
+
+    def __init__(self, function: ExecFn, pipeline: ExecFn) -> None:
+        self.function = function
+        self.pipeline = pipeline
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Any:
+        if instance is None:
+            return self.function
+        # Instances of the subclasses declaring their own exec only get here through super()
+        if type(instance).__exec__ is self.function:
+            return types.MethodType(self.pipeline, instance)
+        return types.MethodType(self.function, instance)
+
+
+def _overridden(cls: "type[UseCase]") -> bool:
+    """Returns whether a subclass declares its own exec, calling the declared one with super()."""
+    stack = cls.__subclasses__()
+    while stack:
+        subclass = stack.pop()
+        if subclass.__exec__ is not cls.__exec__:
+            return True
+        stack.extend(subclass.__subclasses__())
+    return False
+
+
+def _compile_pipelines() -> None:
+    stack: list[type[UseCase]] = UseCase.__subclasses__()
+    while stack:
+        cls = stack.pop()
+        if "exec" in cls.__dict__:
+            cls._compile_pipeline()
+        stack.extend(cls.__subclasses__())
+
+
+def _command_types(exec_fn: ExecFn) -> tuple[type, ...]:
+    """Returns the command classes of the exec method, from its annotation."""
+    try:
+        name = list(inspect.signature(exec_fn).parameters)[1]
+        annotation = typing.get_type_hints(exec_fn).get(name, Command)
+    except (IndexError, NameError, TypeError):
+        return (Command,)
+    if typing.get_origin(annotation) in (Union, types.UnionType):
+        annotation = typing.get_args(annotation)
+    classes = annotation if isinstance(annotation, tuple) else (annotation,)
+    if not all(inspect.isclass(class_) for class_ in classes):
+        return (Command,)
+    return classes
+
+
+def _command(args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+    """Returns the command of an exec call, passed by position or by keyword whatever its name."""
+    if args:
+        return args[0]
+    return kwargs.get("cmd", next(iter(kwargs.values()), None))
+
+
+def _pipeline(
+    exec_fn: ExecFn,
+    command_types: tuple[type, ...],
+    middlewares: Iterable[MiddlewareFn],
+) -> ExecFn:
+    """Chains the middlewares applying to the command types around exec_fn, the first one outermost.
+
+    Middlewares matching only some of the command types (exec annotated with a base class or a union)
+    check the command class on each call, the others are called without any check.
+    """
+    call_next: ExecFn = exec_fn
+    for middleware in reversed(list(middlewares)):
+        commands = getattr(middleware, "__commands__", (Command,))
+        if all(issubclass(type_, commands) for type_ in command_types):
+            call_next = _link(middleware, call_next)
+        elif any(
+            issubclass(type_, commands) or issubclass(command, type_)
+            for type_ in command_types
+            for command in commands
+        ):
+            call_next = _guarded(middleware, commands, call_next)
+    return call_next
+
+
+def _link(middleware: MiddlewareFn, call_next: ExecFn) -> ExecFn:
+    # Bound __call__ skips the instance call slot, positional arguments are the cheapest to pass
+    call = middleware.__call__ if isinstance(middleware, Middleware) else middleware
+
+    def link(use_case: Any, cmd: Command) -> Any:
+        return call(use_case, cmd, call_next)
+
+    return link
+
+
+def _guarded(
+    middleware: MiddlewareFn, commands: tuple[type[Command], ...], call_next: ExecFn
+) -> ExecFn:
+    call = middleware.__call__ if isinstance(middleware, Middleware) else middleware
+
+    def guarded(use_case: Any, cmd: Command) -> Any:
+        if isinstance(cmd, commands):
+            return call(use_case, cmd, call_next)
+        return call_next(use_case, cmd)
+
+    return guarded
+
+
+def _bulkheaded(exec_fn: ExecFn, bulkhead: Bulkhead, name: str) -> ExecFn:
+    attributes = {"use_case": name}
+
+    @functools.wraps(exec_fn)
+    def exec(self: UseCase, cmd: Command) -> Any:
+        bulkhead.acquire(attributes)
+        try:
+            return exec_fn(self, cmd)
+        finally:
+            bulkhead.release()
+
+    return exec
+
+
+def _with_timeout(exec_fn: ExecFn, timeout: float) -> ExecFn:
+    @functools.wraps(exec_fn)
+    def exec(self: UseCase, cmd: Command) -> Any:
+        with deadline(timeout):
+            return exec_fn(self, cmd)
+
+    return exec
+
+
+def _async_exec(
+    exec_fn: ExecFn, bulkhead: Optional[Bulkhead], timeout: Optional[float], name: str
+) -> Any:
+    attributes = {"use_case": name}
+
+    async def admitted(self: UseCase, cmd: Command) -> Any:
+        if bulkhead is None:
+            return await asyncio.to_thread(exec_fn, self, cmd)
+        # Queued in the event loop, a thread is only taken once admitted
+        await bulkhead.acquire_async(attributes)
+        try:
+            return await asyncio.to_thread(exec_fn, self, cmd)
+        finally:
+            bulkhead.release()
+
+    async def aexec(self: UseCase, cmd: Command) -> Any:
+        if timeout is None:
+            return await admitted(self, cmd)
+        # Set in the task context, copied to the worker thread
+        with deadline(timeout):
+            return await admitted(self, cmd)
+
+    return aexec
+
 
 class UseCase(pydantic.BaseModel):
+    """Use Case interface.
+
+    Attributes:
+        __uow__: The UnitOfWork model built from the UnitOfWork class declared in the use case.
+        __conflict_retries__: How many times exec is executed again when it raises ConcurrencyConflictError.
+            Every execution gets a new unit of work, reloading the aggregates (default: no retry).
+        __result_store__: Keeps the results by Command.idempotency_key, the commands with a stored key
+            return its result without being executed (default: None, commands are always executed).
+        __exec__: The exec method declared in the use case, or inherited. Its conflict retries, result
+            store and middlewares (see `Middleware`) are compiled around it, again in the subclasses
+            setting one of these class variables. super().exec in a subclass calls it, without them.
+        __bulkhead__: Limits the concurrent executions of the exec method declared with it, rejecting
+            the calls beyond its queue with BulkheadFullError (default: None, no limit).
+        __timeout__: Seconds given to each execution, set as its deadline (see `pydoca.deadline`) unless
+            the caller set an earlier one. The unit of work raises DeadlineExceededError instead of
+            committing after the deadline, rolling back (default: None, only the caller deadline).
+    """
+
     __uow__: ClassVar[Optional[type[UnitOfWork]]] = None
+    __conflict_retries__: ClassVar[int] = 0
+    __result_store__: ClassVar[Optional[ResultStore]] = None
+    __bulkhead__: ClassVar[Optional[Bulkhead]] = None
+    __timeout__: ClassVar[Optional[float]] = None
+    __exec__: ClassVar[ExecFn]
+    __command_types__: ClassVar[tuple[type, ...]]
     model_config = pydantic.ConfigDict(arbitrary_types_allowed=True)
 
     @classmethod
     def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        if exec_fn := cls.__dict__.get("exec"):
+            cls.__command_types__ = _command_types(exec_fn)
+            cls.__exec__ = exec_fn
+            cls._compile_pipeline()
+            # The compiled exec of the parents are plain functions until then, faster to call
+            for base in cls.__mro__[1:]:
+                if (
+                    base is not UseCase
+                    and issubclass(base, UseCase)
+                    and isinstance(base.__dict__.get("exec"), types.FunctionType)
+                ):
+                    base._compile_pipeline()
+        elif hasattr(cls, "__exec__") and any(
+            name in cls.__dict__ for name in _PIPELINE_ATTRIBUTES
+        ):
+            cls._compile_pipeline()
+
         uow_cls: Optional[type[UnitOfWork]] = cls.__dict__.get("UnitOfWork")
         if not uow_cls:
             return
@@ -46,6 +372,36 @@ class UseCase(pydantic.BaseModel):
             __base__=UnitOfWorkBase,
         )
 
+    @classmethod
+    def _compile_pipeline(cls) -> None:
+        exec_fn = cls.__exec__
+        if cls.__conflict_retries__:
+            exec_fn = _retry_on_conflict(exec_fn, cls.__conflict_retries__)
+        if cls.__result_store__ is not None:
+            exec_fn = _idempotent(exec_fn, cls.__result_store__)
+        exec_fn = _pipeline(exec_fn, cls.__command_types__, _MIDDLEWARES)
+        if _PROFILER is not None:
+            exec_fn = _PROFILER.wrap(exec_fn, cls.__name__)
+        exec_fn = instrument(
+            "use_case.exec",
+            lambda _, *args, **kwargs: {
+                "use_case": cls.__name__,
+                "command": _command(args, kwargs).__class__.__name__,
+            },
+        )(exec_fn)
+        cls.aexec = _async_exec(  # type: ignore[method-assign]
+            exec_fn, cls.__bulkhead__, cls.__timeout__, cls.__name__
+        )
+        if cls.__bulkhead__ is not None:
+            exec_fn = _bulkheaded(exec_fn, cls.__bulkhead__, cls.__name__)
+        if cls.__timeout__ is not None:
+            # Outermost, the time queued in the bulkhead counts
+            exec_fn = _with_timeout(exec_fn, cls.__timeout__)
+        if _overridden(cls):
+            cls.exec = _Exec(cls.__exec__, exec_fn)  # type: ignore[method-assign,assignment]
+        else:
+            cls.exec = exec_fn  # type: ignore[method-assign,assignment]
+
     @property
     def uow(self) -> UnitOfWork:
         if not self.__uow__:
@@ -54,6 +410,7 @@ class UseCase(pydantic.BaseModel):
 
     @pydantic.model_validator(mode="before")
     @classmethod
+    @instrument("use_case.inject", lambda cls, data: {"use_case": cls.__name__})
     def inject_providers(cls, data: Any) -> Any:
         if not data:
             data = {}
@@ -66,3 +423,10 @@ class UseCase(pydantic.BaseModel):
     @abc.abstractmethod
     def exec(self, cmd: Command) -> Any:
         """Executes the Use Case."""
+
+    async def aexec(self, cmd: Command) -> Any:
+        """Executes the Use Case in a worker thread, for asyncio actors.
+
+        With a bulkhead, the call waits for its slot in the event loop before taking a thread.
+        """
+        return await asyncio.to_thread(self.exec, cmd)
@@ -17,6 +17,7 @@ def test_create_budget(fastapi_server, port):
         "currency": domain.Currency.CAD.value,
         "incomes": [],
         "expenses": [],
+        "version": 1,
         "id": "integration tests",
     }
 
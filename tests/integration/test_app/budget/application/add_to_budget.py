@@ -28,6 +28,9 @@ class AddToBudgetCmd(pydoca.Command):
 
 
 class AddToBudget(pydoca.UseCase):
+    # Retried requests with the same idempotency key return the first result
+    __result_store__ = pydoca.InMemoryResultStore()
+
     class UnitOfWork:
         budget_repo: _ports.BudgetRepository
 
@@ -43,4 +46,4 @@ class AddToBudget(pydoca.UseCase):
                     budget.add_expense(
                         source=ope.source, frequency=ope.frequency, price=ope.amount
                     )
-            return budget
+            return uow.budget_repo.save(budget)
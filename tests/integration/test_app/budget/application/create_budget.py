@@ -10,10 +10,10 @@ class CreateBudgetCmd(pydoca.Command):
 
 
 class CreateBudget(pydoca.UseCase):
-    # Test repo inside uow
     class UnitOfWork:
         budget_repo: _ports.BudgetRepository
 
     def exec(self, cmd: CreateBudgetCmd) -> domain.Budget:
         budget = domain.Budget(title=cmd.budget_title, currency=cmd.budget_currency)
-        return self.uow.budget_repo.save(budget, create=True)
+        with self.uow as uow:
+            return uow.budget_repo.save(budget, create=True)
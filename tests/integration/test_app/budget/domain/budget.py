@@ -55,8 +55,8 @@ class ExpenseAdded(pydoca.Event):
 class Budget(pydoca.AggregateRoot):
     title: str
     currency: Currency
-    incomes: list[Income] = []
-    expenses: list[Expense] = []
+    incomes: pydoca.EntityList[Income] = pydoca.EntityList()
+    expenses: pydoca.EntityList[Expense] = pydoca.EntityList()
 
     def _id(self) -> str:
         return self.title.lower()
@@ -80,12 +80,6 @@ class Budget(pydoca.AggregateRoot):
         self.add_event(ExpenseAdded(source=source))
 
     def calculate_cash_flow_per_month(self) -> decimal.Decimal:
-        total = decimal.Decimal(0)
-
-        for income in self.incomes:
-            total += income.amount * income.frequency.value / 12
-
-        for expense in self.expenses:
-            total -= expense.price * expense.frequency.value / 12
-
-        return total
+        yearly_incomes = self.incomes.sumprod("amount", "frequency")
+        yearly_expenses = self.expenses.sumprod("price", "frequency")
+        return decimal.Decimal(yearly_incomes - yearly_expenses) / 12
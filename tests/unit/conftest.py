@@ -5,4 +5,13 @@ import pydoca
 
 @pytest.fixture(autouse=True)
 def clear_inject():
+    pydoca.unfreeze()
     pydoca.clear()
+
+
+@pytest.fixture
+def sink():
+    sink = pydoca.InMemorySink()
+    pydoca.set_sink(sink)
+    yield sink
+    pydoca.set_sink(None)
@@ -53,3 +53,26 @@ def test_aggregate_root_events() -> None:
 
     assert len(car.get_events()) == 1
     assert "ref2" in [wheel.reference for wheel in car.wheels]
+
+
+class CompactCar(pydoca.CompactAggregateRoot):
+    vin: str
+
+    def _id(self) -> str:
+        return self.vin.lower()
+
+
+def test_compact_aggregate_root_lazy_events() -> None:
+    car = CompactCar(vin="vin123")
+    assert car.__pydantic_private__ is None
+    assert car.get_events() == []
+    car.clear_events()
+
+    event = WheelChanged(position="top_left", new_reference="ref2")
+    car.add_event(event)
+    car.add_events([event])
+    assert car.get_events() == [event, event]
+
+    car.clear_events()
+    assert car.get_events() == []
+    assert CompactCar.model_validate(car.model_dump()) == car
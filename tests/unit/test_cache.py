@@ -0,0 +1,184 @@
+import abc
+import threading
+import time
+from typing import Optional
+
+import pytest
+
+import pydoca
+
+
+class Account(pydoca.AggregateRoot):
+    owner: str
+    tags: list[str] = []
+    balance: int = 0
+
+    def _id(self) -> str:
+        return self.owner
+
+    def deposit(self, amount: int) -> None:
+        self.balance += amount
+        self.add_event(Deposited(amount=amount))
+
+
+class Deposited(pydoca.Event):
+    amount: int
+
+
+class AccountRepository(pydoca.Repository):
+    @abc.abstractmethod
+    def get(self, owner: str) -> Account:
+        """Returns the account."""
+
+    @abc.abstractmethod
+    def save(self, account: Account) -> None:
+        """Saves the account."""
+
+
+class AccountDatabase(pydoca.InMemorySession):
+    database = "accounts"
+
+
+class InMemoryAccountRepo(pydoca.InMemoryRepository[Account], AccountRepository):
+    __cache__ = pydoca.AggregateCache(maxsize=2)
+    __cached_reads__ = ("get",)
+    sessionT = AccountDatabase
+    aggregateT = Account
+    loads = 0
+
+    def get(self, owner: str) -> Optional[Account]:  # type: ignore[override]
+        InMemoryAccountRepo.loads += 1
+        return self.load(owner)
+
+    def save(self, account: Account) -> None:
+        self.store(account)
+
+
+class DepositCmd(pydoca.Command):
+    owner: str
+    amount: int
+
+
+class Deposit(pydoca.UseCase):
+    class UnitOfWork:
+        account_repo: AccountRepository
+
+    def exec(self, cmd: DepositCmd) -> int:
+        with self.uow as uow:
+            account = uow.account_repo.get(cmd.owner)
+            account.deposit(cmd.amount)
+            uow.account_repo.save(account)
+        return account.balance
+
+
+@pytest.fixture
+def cache():
+    pydoca.bind(AccountRepository, InMemoryAccountRepo)
+    with Deposit().uow as uow:
+        for owner in ("ann", "bob", "eve"):
+            uow.account_repo.save(Account(owner=owner))
+    InMemoryAccountRepo.loads = 0
+    cache = InMemoryAccountRepo.__cache__
+    cache.clear()
+    yield cache
+    AccountDatabase.drop()
+    while pydoca.EventBus.get_event():  # Deposited events of the units of work
+        pass
+
+
+def test_reads_cached_and_copied(cache, sink) -> None:
+    repo = InMemoryAccountRepo()
+    first = repo.get("ann")
+    first.tags.append("changed")  # Not altering the cache
+    second = repo.get("ann")
+    assert second == Account(owner="ann", version=1) and second is not first
+    assert InMemoryAccountRepo.loads == 1
+
+    repo.get("bob")
+    repo.get("eve")  # Evicts ann, the least recently used
+    repo.get("ann")
+    assert repo.get("missing") is None and repo.get("missing") is None
+    assert InMemoryAccountRepo.loads == 6
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions, stats.size) == (1, 6, 2, 2)
+    assert stats.bytes > 0 and stats.hit_rate == pytest.approx(1 / 7)
+    assert sink.counter("aggregate_cache.hits", repository="InMemoryAccountRepo") == 1
+
+    with Deposit().uow as uow:  # Cached reads are tracked by the unit of work
+        uow.account_repo.get("ann")
+        assert list(uow.account_repo.aggregates) == [(Account, "ann")]
+    assert InMemoryAccountRepo.loads == 6
+
+
+def test_invalidated_on_commit(cache) -> None:
+    InMemoryAccountRepo().get("ann")
+    assert Deposit().exec(DepositCmd(owner="ann", amount=5)) == 5  # Cached copy changed
+    assert InMemoryAccountRepo.loads == 1
+    assert cache.stats().invalidations == 1
+
+    assert Deposit().exec(DepositCmd(owner="ann", amount=5)) == 10
+    assert InMemoryAccountRepo().get("ann").balance == 10
+    assert InMemoryAccountRepo().get("ann").version == 3
+    assert InMemoryAccountRepo.loads == 3
+
+
+def test_reads_not_cached(cache) -> None:
+    # Read by a unit of work started before an invalidation of the aggregate
+    with Deposit().uow as uow:
+        cache.invalidate([(Account, "ann")])
+        uow.account_repo.get("ann")
+    assert cache.stats().size == 0
+    InMemoryAccountRepo().get("ann")
+    assert cache.stats().size == 1
+    cache.clear()
+
+    # Own writes of the unit of work
+    with Deposit().uow as uow:
+        uow.account_repo.save(Account(owner="zoe", balance=1))
+        assert uow.account_repo.get("zoe").balance == 1
+        assert cache.stats().size == 0
+
+    # Outside of a unit of work, writes are not tracked and do not bypass the cache
+    repo = InMemoryAccountRepo()
+    repo.save(Account(owner="max"))
+    repo.get("zoe")
+    assert repo.written == set() and cache.stats().size == 1
+
+
+def test_other_commits_do_not_stop_caching(cache) -> None:
+    with Deposit().uow as uow:
+        Deposit().exec(DepositCmd(owner="bob", amount=5))
+        uow.account_repo.get("ann")
+    assert cache.stats().size == 1
+
+
+def test_invalidated_when_only_having_events(cache) -> None:
+    InMemoryAccountRepo().get("ann")
+    with Deposit().uow as uow:
+        uow.account_repo.get("ann").deposit(5)  # Tracked cache hit, not saved
+    assert cache.stats().invalidations == 1
+
+
+def test_reads_keep_the_snapshot_isolation(cache) -> None:
+    def deposit_then_read() -> None:
+        Deposit().exec(DepositCmd(owner="ann", amount=5))
+        InMemoryAccountRepo().get("ann")  # Cached after the commit
+
+    uow = Deposit().uow
+    with uow:
+        thread = threading.Thread(target=deposit_then_read)
+        thread.start()
+        thread.join()
+        assert cache.stats().size == 1
+        assert uow.account_repo.get("ann").balance == 0  # Read from its snapshot
+    assert InMemoryAccountRepo().get("ann").balance == 5
+
+
+def test_ttl(cache) -> None:
+    cache.ttl = 0.01
+    InMemoryAccountRepo().get("ann")
+    time.sleep(0.02)
+    InMemoryAccountRepo().get("ann")
+    cache.ttl = None
+    assert InMemoryAccountRepo.loads == 2 and cache.stats().evictions == 1
@@ -0,0 +1,165 @@
+import datetime
+import decimal
+import enum
+import importlib
+import threading
+import time
+import uuid
+from typing import Literal, Optional
+
+import pydantic
+
+import pydoca
+
+# Shadowed by the codec function in the package namespace
+codec_module = importlib.import_module("pydoca.codec")
+
+
+class Color(enum.Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+class Dimensions(pydoca.ValueObject):
+    width: int
+    height: int
+
+
+class Part(pydoca.Entity):
+    reference: str
+    price: decimal.Decimal
+    color: Color
+    dimensions: Optional[Dimensions] = None
+
+    def _id(self) -> str:
+        return self.reference
+
+
+class Machine(pydoca.AggregateRoot):
+    serial: uuid.UUID
+    built: datetime.datetime
+    parts: pydoca.EntityList[Part] = pydoca.EntityList()
+    spares: list[Part] = []
+    tags: set[str] = set()
+    ratings: dict[str, decimal.Decimal] = {}
+    status: Literal["on", "off"] = "off"
+    notes: Optional[str] = None
+
+    def _id(self) -> str:
+        return str(self.serial)
+
+
+def machine() -> Machine:
+    return Machine(
+        serial=uuid.UUID(int=1),
+        built=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        parts=[
+            Part(reference="a", price="1.50", color=Color.RED),
+            Part(
+                reference="b",
+                price="2",
+                color=Color.BLUE,
+                dimensions=Dimensions(width=1, height=2),
+            ),
+        ],
+        spares=[Part(reference="c", price="0.1", color=Color.RED)],
+        tags={"new"},
+        ratings={"quality": decimal.Decimal("4.5")},
+        status="on",
+    )
+
+
+def test_roundtrip() -> None:
+    codec = pydoca.codec(Machine)
+    original = machine()
+    original.version = 3
+
+    row = codec.dump(original)
+    assert len(row) == len(Machine.model_fields)  # Computed id not stored
+    assert row[3][0] == ("a", "1.50", "red", None)  # Fields after the inherited version
+
+    loaded = codec.decode(codec.encode(original))
+    assert loaded.model_dump() == original.model_dump()
+    assert loaded.model_fields_set == set(Machine.model_fields)
+    assert isinstance(loaded.parts, pydoca.EntityList)
+    assert loaded.parts.sum("price") == decimal.Decimal("3.50")
+    assert loaded.parts[1].dimensions == Dimensions(width=1, height=2)
+    assert loaded.get_events() == []
+    assert pydoca.codec(Machine) is codec
+
+
+def test_load_skips_validation() -> None:
+    calls = []
+
+    class Validated(pydoca.ValueObject):
+        name: str
+
+        @pydantic.field_validator("name")
+        @classmethod
+        def upper(cls, name: str) -> str:
+            calls.append(name)
+            return name.upper()
+
+    codec = pydoca.codec(Validated)
+    assert codec.decode(codec.encode(Validated(name="a"))).name == "A"
+    assert calls == ["a"]
+
+
+def test_load_older_row_sets_defaults() -> None:
+    codec = pydoca.codec(Part)
+    part = codec.load(["a", "1", "red"])
+    assert part.dimensions is None
+    assert part.model_fields_set == {"reference", "price", "color"}
+
+
+def test_compact_aggregate() -> None:
+    class Counter(pydoca.CompactAggregateRoot):
+        name: str
+
+        def _id(self) -> str:
+            return self.name
+
+    codec = pydoca.codec(Counter)
+    counter = codec.load(codec.dump(Counter(name="c")))
+    assert counter.get_events() == []
+    assert counter.__pydantic_private__ is None
+
+
+def test_recursive_model() -> None:
+    class Node(pydoca.ValueObject):
+        name: str
+        children: list["Node"] = []
+
+    codec = pydoca.codec(Node)
+    tree = Node(name="root", children=[Node(name="leaf")])
+    assert codec.dump(tree) == ("root", [("leaf", [])])
+    assert codec.load(codec.dump(tree)) == tree
+
+
+def test_built_once_by_concurrent_threads(monkeypatch) -> None:
+    class Sensor(pydoca.ValueObject):
+        name: str
+        nested: Dimensions
+
+    converters = codec_module._converters
+
+    def slow_converters(annotation):
+        time.sleep(0.01)  # Lets the other threads ask for the codec being built
+        return converters(annotation)
+
+    monkeypatch.setattr(codec_module, "_converters", slow_converters)
+    sensor = Sensor(name="s", nested=Dimensions(width=1, height=2))
+    results, errors = [], []
+
+    def encode() -> None:
+        try:
+            results.append(pydoca.codec(Sensor).encode(sensor))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=encode) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(set(results)) == 1
@@ -0,0 +1,194 @@
+import copy
+import decimal
+import enum
+
+import pytest
+
+import pydoca
+
+
+class Frequency(enum.Enum):
+    YEARLY = 1
+    MONTHLY = 12
+
+
+class Income(pydoca.Entity):
+    source: str
+    frequency: Frequency
+    amount: decimal.Decimal
+    count: int = 1
+    rate: float = 1.0
+
+    def _id(self) -> str:
+        return self.source
+
+
+class Budget(pydoca.AggregateRoot):
+    title: str
+    incomes: pydoca.EntityList[Income] = pydoca.EntityList()
+
+    def _id(self) -> str:
+        return self.title
+
+
+def income(source: str, amount: str, frequency: Frequency = Frequency.YEARLY):
+    return Income(source=source, frequency=frequency, amount=decimal.Decimal(amount))
+
+
+def test_entity_list_reductions() -> None:
+    incomes = pydoca.EntityList(
+        [income("a", "10000", Frequency.MONTHLY), income("b", "1"), income("c", "1.55")]
+    )
+    assert incomes.sum("amount") == decimal.Decimal("10002.55")
+    assert str(incomes.sum("amount")) == str(sum(i.amount for i in incomes))
+    assert incomes.sumprod("amount", "frequency") == decimal.Decimal("120002.55")
+    assert incomes.sumprod("frequency", "amount") == decimal.Decimal("120002.55")
+    assert incomes.sum("frequency") == 14
+    assert incomes.sum("count") == 3
+    assert incomes.sum("rate") == 3.0
+    assert incomes.mean("count") == 1
+    assert list(incomes.column("amount")) == [1000000, 100, 155]
+    assert incomes.scale("amount") == 2
+
+    with pytest.raises(KeyError):
+        incomes.sum("unknown")
+    with pytest.raises(TypeError):
+        incomes.sum("source")
+
+
+def test_entity_list_empty() -> None:
+    incomes: pydoca.EntityList[Income] = pydoca.EntityList()
+    assert incomes.sum("amount") == 0
+    assert incomes.sumprod("amount", "frequency") == 0
+    assert len(incomes.column("amount")) == 0
+    with pytest.raises(ValueError):
+        incomes.mean("amount")
+
+
+def test_entity_list_mutations() -> None:
+    incomes = pydoca.EntityList([income("a", "1")])
+    incomes.append(income("b", "2"))
+    incomes.extend([income("c", "3.5")])
+    incomes += [income("d", "4")]
+    incomes.insert(-1, income("e", "5"))
+    incomes.insert(100, income("f", "6"))
+    assert incomes.sum("amount") == decimal.Decimal("21.5")
+
+    incomes.remove(income("a", "1"))
+    assert incomes.pop(0).source == "b"
+    del incomes[0]
+    incomes[0] = income("g", "10")
+    assert [i.source for i in incomes] == ["g", "d", "f"]
+    assert list(incomes.column("amount")) == [100, 40, 60]
+
+    incomes.reverse()
+    assert list(incomes.column("amount")) == [60, 40, 100]
+    incomes.sort(key=lambda i: i.amount)  # Rebuilds the columns, without 3.5 anymore
+    assert list(incomes.column("amount")) == [4, 6, 10]
+    assert incomes.scale("amount") == 0
+    incomes[1:] = [income("h", "1.25")]
+    assert list(incomes.column("amount")) == [400, 125]
+    del incomes[:1]
+    assert list(incomes.column("amount")) == [125]
+
+    incomes[0].amount = decimal.Decimal(20)  # Assigned in place
+    assert incomes.sum("amount") == 20
+    assert list(incomes.column("amount")) == [20]
+
+    incomes.clear()
+    assert incomes.sum("amount") == 0
+    incomes.append(income("i", "7"))
+    assert incomes.sum("amount") == 7
+
+
+def test_assignments_mirrored_only_once_held() -> None:
+    class Expense(pydoca.Entity):
+        label: str
+        amount: int
+
+        def _id(self) -> str:
+            return self.label
+
+    rent = Expense(label="rent", amount=1)
+    assert "__setattr__" not in Expense.__dict__
+    expenses = pydoca.EntityList([rent])
+    assert expenses.sum("amount") == 1
+    assert "__setattr__" in Expense.__dict__
+    assert "__setattr__" not in pydoca.Entity.__dict__
+    rent.amount = 3
+    assert expenses.sum("amount") == 3
+
+
+def test_entity_list_rebuilt_only_for_own_entities() -> None:
+    incomes = pydoca.EntityList([income("a", "1"), income("b", "2")])
+    column = incomes.column("amount")
+    income("c", "5").amount = decimal.Decimal(6)  # Not in the list
+    assert incomes.column("amount") is column  # Not rebuilt
+
+    other = pydoca.EntityList([incomes[0]])  # Entity held by both lists
+    incomes[0].amount = decimal.Decimal(10)
+    assert incomes.sum("amount") == 12 and other.sum("amount") == 10
+
+
+def test_entity_list_dropped_column() -> None:
+    incomes = pydoca.EntityList([income("a", "1"), income("b", "2E+30")])
+    assert incomes.sum("amount") == decimal.Decimal("2E+30") + 1
+    with pytest.raises(ValueError):
+        incomes.column("amount")
+    assert incomes.sumprod("amount", "frequency") == decimal.Decimal("2E+30") + 1
+
+
+def test_entity_list_aggregate_field() -> None:
+    budget = Budget(title="budget")
+    assert isinstance(budget.incomes, pydoca.EntityList)
+    assert Budget(title="other").incomes is not budget.incomes
+    budget.incomes.append(income("a", "12.5", Frequency.MONTHLY))
+
+    loaded = Budget.model_validate(budget.model_dump())
+    assert isinstance(loaded.incomes, pydoca.EntityList)
+    assert loaded.incomes.sumprod("amount", "frequency") == 150
+    loaded.incomes[0].amount = decimal.Decimal(1)
+    assert loaded.incomes.sumprod("amount", "frequency") == 12
+    assert copy.deepcopy(budget).incomes.sum("amount") == decimal.Decimal("12.5")
+
+
+class LazyBudget(pydoca.AggregateRoot):
+    title: str
+    incomes: pydoca.LazyList[Income] = pydoca.LazyList()
+
+    def _id(self) -> str:
+        return self.title
+
+
+def test_lazy_list() -> None:
+    def incomes() -> list[Income]:
+        return [income("1", "1"), income("2", "2"), income("3", "3")]
+
+    budget = LazyBudget(title="new", incomes=incomes()[:2])
+    assert isinstance(budget.incomes, pydoca.LazyList)
+    assert budget.incomes.loaded
+    assert budget.incomes.sum("amount") == 3
+
+    lazy = pydoca.LazyList.unloaded()
+    budget = LazyBudget(title="loaded", incomes=lazy)
+    assert budget.incomes is lazy  # Not validated, it would load it
+    with pytest.raises(pydoca.LazyLoadError):
+        len(budget.incomes)
+
+    loads = []
+
+    def loader() -> None:
+        loads.append(True)
+        lazy.set_loaded(incomes()[:3])
+
+    lazy.bind(loader)
+    assert not lazy.loaded
+    assert budget.model_dump()["incomes"][2]["source"] == "3"  # Serializing loads it
+    assert lazy.sum("amount") == 6
+    assert lazy[0].source == "1"
+    assert loads == [True]
+
+    lazy = pydoca.LazyList.unloaded()
+    lazy.clear()  # Does not need to load it
+    lazy.append(incomes()[0])
+    assert lazy.loaded and len(lazy) == 1
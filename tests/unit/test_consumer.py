@@ -0,0 +1,132 @@
+import asyncio
+import collections
+import threading
+import time
+
+import pytest
+
+import pydoca
+
+
+class Moved(pydoca.Event):
+    seq: int
+
+
+def moved_events(aggregates: int, per_aggregate: int) -> list[Moved]:
+    return [
+        Moved(seq=seq, aggregate_id=f"item-{aggregate}")
+        for seq in range(per_aggregate)
+        for aggregate in range(aggregates)
+    ]
+
+
+class Recorder:
+    def __init__(self, delay: float = 0) -> None:
+        self.delay = delay
+        self.seqs: dict[str, list[int]] = collections.defaultdict(list)
+        self.threads: set[str] = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, event: Moved) -> None:
+        time.sleep(self.delay)
+        with self.lock:
+            self.seqs[event.aggregate_id].append(event.seq)
+            self.threads.add(threading.current_thread().name)
+
+
+def test_routing() -> None:
+    consumer = pydoca.PartitionedConsumer(Recorder(), lanes=8, workers=3)
+    event = Moved(seq=0, aggregate_id="item-1")
+    assert consumer.lane(event) == consumer.lane(Moved(seq=1, aggregate_id="item-1"))
+    assert len({consumer.lane(event) for event in moved_events(50, 1)}) == 8
+
+    # Lag of the lanes until the workers start
+    assert consumer.submit(moved_events(10, 3)) == 30
+    lag = consumer.lag()
+    assert sum(lane.pending for lane in lag.values()) == consumer.pending == 30
+    assert all(
+        lane.age >= 0 and lane.worker == index % 3 for index, lane in lag.items()
+    )
+    with pytest.raises(ValueError):
+        consumer.resize(0)
+
+
+def test_threads_keep_aggregate_order(sink) -> None:
+    recorder = Recorder(delay=0.001)
+    consumer = pydoca.PartitionedConsumer(recorder, lanes=8, workers=4)
+    consumer.start()
+    with pytest.raises(RuntimeError):
+        consumer.start()
+    consumer.submit(moved_events(20, 10))
+    consumer.resize(2)  # Lanes moved between workers while handling events
+    consumer.submit(moved_events(20, 10))
+    consumer.resize(6)
+    assert consumer.join(timeout=10)
+    consumer.stop()
+
+    assert consumer.lag() == {}
+    assert len(recorder.seqs) == 20
+    assert all(seqs == list(range(10)) * 2 for seqs in recorder.seqs.values())
+    assert len(recorder.threads) > 1
+    assert (
+        sum(sink.histogram("consumer.lag", lane=str(lane)).count for lane in range(8))
+        == 400
+    )
+
+
+def test_process_pending_and_errors(sink) -> None:
+    def fail_odd(event: Moved) -> None:
+        if event.seq % 2:
+            raise ValueError(event.seq)
+        handled.append(event.seq)
+
+    handled: list[int] = []
+    consumer = pydoca.PartitionedConsumer(fail_odd, lanes=2, workers=1)
+    pydoca.EventBus.publish_events(iter(moved_events(1, 4)))
+    assert consumer.process_pending() == 4
+    consumer.start()
+    assert consumer.join(timeout=10)
+    consumer.stop()
+    assert handled == [0, 2]
+    lane = str(consumer.lane(Moved(seq=0, aggregate_id="item-0")))
+    assert sink.counter("consumer.errors", lane=lane) == 2
+
+
+def test_asyncio_workers() -> None:
+    seqs: dict[str, list[int]] = collections.defaultdict(list)
+
+    async def on_event(event: Moved) -> None:
+        await asyncio.sleep(0)
+        seqs[event.aggregate_id].append(event.seq)
+
+    async def main() -> None:
+        consumer = pydoca.PartitionedConsumer(on_event, lanes=4, workers=2)
+        consumer.start()
+        consumer.submit(moved_events(8, 5))
+        consumer.resize(3)
+        consumer.submit(moved_events(8, 5))
+        assert await consumer.join_async(timeout=10)
+        consumer.stop()
+
+    asyncio.run(main())
+    assert len(seqs) == 8
+    assert all(values == list(range(5)) * 2 for values in seqs.values())
+
+
+def test_asyncio_workers_resized_from_another_thread() -> None:
+    seqs: dict[str, list[int]] = collections.defaultdict(list)
+
+    async def on_event(event: Moved) -> None:
+        seqs[event.aggregate_id].append(event.seq)
+
+    async def main() -> None:
+        consumer = pydoca.PartitionedConsumer(on_event, lanes=4, workers=2)
+        consumer.start()
+        await asyncio.to_thread(consumer.resize, 3)
+        await asyncio.to_thread(consumer.submit, moved_events(8, 5))
+        assert await consumer.join_async(timeout=10)
+        assert consumer.workers == 3
+        consumer.stop()
+
+    asyncio.run(main())
+    assert all(values == list(range(5)) for values in seqs.values())
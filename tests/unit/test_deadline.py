@@ -0,0 +1,145 @@
+import abc
+import asyncio
+import threading
+import time
+from typing import ClassVar
+
+import pytest
+
+import pydoca
+from pydoca import bulkhead
+
+
+class Note(pydoca.AggregateRoot):
+    title: str
+
+    def _id(self) -> str:
+        return self.title
+
+
+class NoteRepository(pydoca.Repository):
+    @abc.abstractmethod
+    def save(self, note: Note) -> None:
+        """Saves the note."""
+
+
+class NoteDatabase(pydoca.InMemorySession):
+    database = "notes"
+
+
+class InMemoryNoteRepo(pydoca.InMemoryRepository[Note], NoteRepository):
+    sessionT = NoteDatabase
+    aggregateT = Note
+
+    def save(self, note: Note) -> None:
+        self.store(note)
+
+
+class Clock(pydoca.Service):
+    @abc.abstractmethod
+    def budget(self) -> float:
+        """Returns the seconds left to the call."""
+
+
+class DeadlineClock(Clock):
+    def budget(self) -> float:
+        self.check_deadline()
+        return self.remaining_time() or float("inf")
+
+
+class WriteNote(pydoca.UseCase):
+    __timeout__ = 0.05
+    delay: ClassVar[float] = 0
+    budgets: ClassVar[list[float]] = []
+    clock: Clock
+
+    class UnitOfWork:
+        note_repo: NoteRepository
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        self.budgets.append(self.clock.budget())
+        with self.uow as uow:
+            uow.note_repo.save(Note(title="note"))
+            time.sleep(self.delay)
+
+
+@pytest.fixture(autouse=True)
+def adapters():
+    pydoca.bind(NoteRepository, InMemoryNoteRepo)
+    pydoca.bind(Clock, DeadlineClock)
+    WriteNote.delay = 0
+    WriteNote.budgets.clear()
+    yield
+    NoteDatabase.drop()
+
+
+def test_deadline_context() -> None:
+    assert pydoca.remaining_time() is None
+    pydoca.check_deadline()
+    with pydoca.deadline(10) as outer:
+        assert 9 < pydoca.remaining_time() <= 10
+        with pydoca.deadline(60) as inner:
+            assert inner == outer  # Can only shorten the enclosing deadline
+        with pydoca.deadline(-1):
+            with pytest.raises(pydoca.DeadlineExceededError) as exc_info:
+                pydoca.check_deadline()
+            assert isinstance(exc_info.value, TimeoutError)
+            assert DeadlineClock().remaining_time() < 0
+        pydoca.check_deadline()
+
+        # Propagated to worker threads and tasks
+        assert 0 < asyncio.run(asyncio.to_thread(pydoca.remaining_time)) <= 10
+    assert pydoca.remaining_time() is None
+
+
+def test_use_case_timeout_rolls_back() -> None:
+    WriteNote().exec(pydoca.Command())
+    assert 0 < WriteNote.budgets[0] <= 0.05
+    NoteDatabase.drop()
+
+    WriteNote.delay = 0.06
+    with pytest.raises(pydoca.DeadlineExceededError):
+        WriteNote().exec(pydoca.Command())
+    assert InMemoryNoteRepo().load("note") is None
+
+    # The earlier deadline of the caller is kept
+    with pytest.raises(pydoca.DeadlineExceededError):
+        with pydoca.deadline(0):
+            WriteNote().exec(pydoca.Command())
+    with pytest.raises(pydoca.DeadlineExceededError):
+        with pydoca.deadline(0.01):
+            asyncio.run(WriteNote().aexec(pydoca.Command()))
+    assert InMemoryNoteRepo().count() == 0
+
+
+def test_bulkhead_wait_bounded_by_deadline(sink) -> None:
+    limiter = pydoca.Bulkhead(max_in_flight=1, max_queued=1)
+    limiter.acquire()
+    errors = []
+
+    def queued() -> None:
+        try:
+            with pydoca.deadline(0.01):
+                limiter.acquire({"use_case": "Queued"})
+        except Exception as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=queued)
+    thread.start()
+    thread.join()
+    assert isinstance(errors[0], pydoca.DeadlineExceededError)
+    assert limiter.queued == 0
+    assert sink.counter("bulkhead.rejected", use_case="Queued", reason="deadline")
+    limiter.release()
+
+
+def test_bulkhead_rejected_once_at_the_deadline(sink, monkeypatch) -> None:
+    # Deadline reached exactly, not expired yet for check_deadline
+    monkeypatch.setattr(bulkhead, "remaining_time", lambda: 0.0)
+    limiter = pydoca.Bulkhead(max_in_flight=1, max_queued=1)
+    limiter.acquire()
+    with pytest.raises(pydoca.DeadlineExceededError):
+        limiter.acquire({"use_case": "Queued"})
+    assert sink.counter("bulkhead.rejected", use_case="Queued", reason="deadline") == 1
+    assert sink.counter("bulkhead.rejected", use_case="Queued", reason="timeout") == 0
+    limiter.release()
@@ -29,3 +29,35 @@ def test_entity_hash() -> None:
 def test_entity_str() -> None:
     entity = TestEntity(name="test")
     assert str(entity) == "TestEntity test"
+
+
+class CompactTestEntity(pydoca.CompactEntity):
+    name: str
+    value: int = 0
+
+    def _id(self) -> str:
+        return self.name
+
+
+def test_compact_entity_shares_fields_set() -> None:
+    entity1 = CompactTestEntity(name="test1")
+    entity2 = CompactTestEntity(name="test2")
+    assert entity1.model_fields_set is entity2.model_fields_set
+    assert entity1 != entity2
+    assert entity1 == CompactTestEntity(name="test1", value=2)
+
+
+def test_compact_entity_assignment() -> None:
+    entity1 = CompactTestEntity(name="test1")
+    entity2 = CompactTestEntity(name="test2")
+    entity1.name = "renamed"  # Already set, the fields set stays shared
+    assert entity1.model_fields_set is entity2.model_fields_set
+
+    entity1.value = 10
+    assert entity1.model_fields_set == {"name", "value"}
+    assert entity2.model_fields_set == {"name"}
+
+    copied = entity2.model_copy(update={"value": 5})
+    assert copied.value == 5
+    assert copied.model_fields_set == {"name", "value"}
+    assert entity2.model_fields_set == {"name"}
@@ -55,3 +55,63 @@ def test_event_timestamp_default() -> None:
     assert (
         event.timestamp <= now
     )  # The timestamp should be less than or equal to the current time
+
+
+class Renamed(pydoca.Event):
+    __compaction__ = pydoca.LatestWins()
+    name: str
+
+
+class ItemsAdded(pydoca.Event):
+    items: list[str]
+
+
+class ItemAdded(pydoca.Event):
+    __compaction__ = pydoca.Merge(
+        lambda events: ItemsAdded(items=[e.item for e in events])
+    )
+    item: str
+
+
+class Moved(pydoca.Event):
+    __compaction__ = pydoca.LatestWins(key=("aggregate_id", "piece"))
+    piece: str
+    square: str
+
+
+def test_compact_events(sink) -> None:
+    def stamped(event: pydoca.Event, aggregate_id: str) -> pydoca.Event:
+        event._set_aggregate_id(aggregate_id)
+        return event
+
+    events = [
+        stamped(ItemAdded(item="apple"), "a"),
+        stamped(Renamed(name="first"), "a"),
+        stamped(ItemAdded(item="pear"), "b"),
+        stamped(FakeEvent(attribute1=1, attribute2="kept"), "a"),
+        stamped(Moved(piece="king", square="e2"), "a"),
+        stamped(Renamed(name="second"), "a"),
+        stamped(ItemAdded(item="plum"), "a"),
+        stamped(Moved(piece="queen", square="d2"), "a"),
+        stamped(Moved(piece="king", square="e3"), "a"),
+    ]
+    compacted = list(pydoca.compact_events(events))
+    assert [type(event) for event in compacted] == [
+        ItemAdded,  # Alone for its aggregate
+        FakeEvent,
+        Renamed,
+        ItemsAdded,  # At the position of the last merged event
+        Moved,
+        Moved,
+    ]
+    assert compacted[2] is events[5]
+    assert compacted[3].items == ["apple", "plum"]
+    assert compacted[3].aggregate_id == "a"
+    assert [(e.piece, e.square) for e in compacted[4:]] == [
+        ("queen", "d2"),
+        ("king", "e3"),
+    ]
+    assert sink.counter("event_bus.compacted") == 3
+
+    uncompacted = [stamped(ItemAdded(item="apple"), "a"), events[3]]
+    assert pydoca.compact_events(uncompacted) == uncompacted
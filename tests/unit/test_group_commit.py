@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+
+import pydoca
+
+
+def test_batches_and_errors() -> None:
+    group_commit: pydoca.GroupCommit[int] = pydoca.GroupCommit(max_batch=4)
+    batches: list[list[int]] = []
+    errors: dict[int, BaseException] = {}
+
+    def flush(batch: list[int]) -> list[BaseException | None]:
+        time.sleep(0.01)  # Commits arriving meanwhile are merged in the next batch
+        batches.append(batch)
+        return [ValueError(request) if request % 5 == 0 else None for request in batch]
+
+    def commit(request: int) -> None:
+        try:
+            group_commit.commit(request, flush)
+        except ValueError as exc:
+            errors[request] = exc
+
+    threads = [
+        threading.Thread(target=commit, args=(request,)) for request in range(1, 13)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(request for batch in batches for request in batch) == list(
+        range(1, 13)
+    )
+    assert 3 <= len(batches) < 12 and all(len(batch) <= 4 for batch in batches)
+    assert sorted(errors) == [5, 10]
+
+
+def test_failed_flush() -> None:
+    group_commit: pydoca.GroupCommit[int] = pydoca.GroupCommit(max_batch=2, window=10)
+    errors: list[BaseException] = []
+
+    def flush(batch: list[int]) -> list[BaseException | None]:
+        raise RuntimeError("disk full")
+
+    def commit() -> None:
+        try:
+            group_commit.commit(1, flush)
+        except BaseException as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=commit) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Raised as is to the leader, wrapped for the other thread
+    follower, leader = sorted(errors, key=lambda exc: type(exc).__name__)
+    assert isinstance(leader, RuntimeError)
+    assert isinstance(follower, pydoca.GroupCommitError)
+    assert follower.error is leader and follower.__cause__ is leader
+    group_commit.window = 0
+    assert group_commit.commit(2, lambda batch: [None] * len(batch)) is None
+    with pytest.raises(ValueError):
+        pydoca.GroupCommit(max_batch=0)
+
+
+def test_waits_until_the_deadline() -> None:
+    group_commit: pydoca.GroupCommit[int] = pydoca.GroupCommit()
+    flushing, release = threading.Event(), threading.Event()
+    batches: list[list[int]] = []
+
+    def flush(batch: list[int]) -> list[BaseException | None]:
+        flushing.set()
+        release.wait()
+        batches.append(batch)
+        return [None] * len(batch)
+
+    leader = threading.Thread(target=group_commit.commit, args=(1, flush))
+    leader.start()
+    flushing.wait()
+    with pytest.raises(pydoca.DeadlineExceededError), pydoca.deadline(0.01):
+        group_commit.commit(2, flush)  # Queued for the next batch, dropped
+    release.set()
+    leader.join()
+    group_commit.commit(3, flush)
+    assert batches == [[1], [3]]
+
+
+def test_batches_per_key() -> None:
+    group_commit: pydoca.GroupCommit[str] = pydoca.GroupCommit(max_batch=4, window=0.05)
+    batches: list[list[str]] = []
+
+    def flush(batch: list[str]) -> list[BaseException | None]:
+        batches.append(batch)
+        return [None] * len(batch)
+
+    threads = [
+        threading.Thread(target=group_commit.commit, args=(database, flush, database))
+        for database in ("a.db", "b.db", "a.db", "b.db")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(len(set(batch)) == 1 for batch in batches)
+    assert sorted(request for batch in batches for request in batch) == [
+        "a.db",
+        "a.db",
+        "b.db",
+        "b.db",
+    ]
+
+
+def test_leadership_released_when_the_leader_fails() -> None:
+    group_commit: pydoca.GroupCommit[int] = pydoca.GroupCommit(max_batch=2, window=10)
+    errors: list[BaseException] = []
+
+    def wrong_flush(batch: list[int]) -> list[BaseException | None]:
+        return []  # One error per request expected
+
+    def commit() -> None:
+        try:
+            group_commit.commit(1, wrong_flush)
+        except BaseException as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=commit) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(1)
+    assert not any(thread.is_alive() for thread in threads)
+    assert sorted(type(exc).__name__ for exc in errors) == [
+        "GroupCommitError",
+        "ValueError",
+    ]
+    group_commit.window = 0
+    assert group_commit.commit(2, lambda batch: [None] * len(batch)) is None
@@ -0,0 +1,160 @@
+import abc
+from typing import Self
+
+import pytest
+
+import pydoca
+from pydoca import ID
+from pydoca.instrumentation import Histogram
+
+
+class Counter(pydoca.AggregateRoot):
+    name: str
+
+    def _id(self) -> ID:
+        return self.name
+
+
+class Incremented(pydoca.Event):
+    name: str
+
+
+class CounterRepo(pydoca.Repository):
+    @abc.abstractmethod
+    def save(self, counter: Counter) -> None:
+        """Saves the counter."""
+
+
+class NullSession(pydoca.Session):
+    @classmethod
+    def start(cls) -> Self:
+        return cls()
+
+    @classmethod
+    def url(cls) -> str:
+        return "//null"
+
+    def commit(self) -> None:
+        return
+
+    def rollback(self) -> None:
+        return
+
+
+class NullCounterRepo(CounterRepo):
+    sessionT = NullSession
+
+    def save(self, counter: Counter) -> None:
+        return
+
+
+class IncrementCmd(pydoca.Command):
+    name: str
+
+
+class Increment(pydoca.UseCase):
+    class UnitOfWork:
+        counter_repo: CounterRepo
+
+    def exec(self, cmd: IncrementCmd) -> None:
+        with self.uow as uow:
+            counter = Counter(name=cmd.name)
+            counter.add_event(Incremented(name=cmd.name))
+            uow.counter_repo.save(counter)
+
+
+def test_histogram_percentiles() -> None:
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.record(value)
+
+    assert histogram.count == 1000
+    assert histogram.mean == 500.5
+    assert 500 <= histogram.percentile(50) <= 500 * 1.1
+    assert 990 <= histogram.percentile(99) <= 1000
+    assert Histogram().percentile(50) == 0.0
+
+
+def test_disabled_by_default() -> None:
+    pydoca.bind(CounterRepo, NullCounterRepo)
+    Increment().exec(IncrementCmd(name="a"))  # Must not fail without sink
+
+
+def test_use_case_spans(sink: pydoca.InMemorySink) -> None:
+    pydoca.bind(CounterRepo, NullCounterRepo)
+    for _ in range(3):
+        Increment().exec(IncrementCmd(name="a"))
+
+    exec_histogram = sink.histogram(
+        "use_case.exec", use_case="Increment", command="IncrementCmd"
+    )
+    assert exec_histogram.count == 3
+    assert sink.histogram("use_case.inject", use_case="Increment").count == 3
+    assert sink.histogram("uow.enter").count == 3
+    assert sink.histogram("uow.commit").count == 3
+    assert sink.histogram("uow.exit").count == 3
+    assert (
+        sink.histogram(
+            "repository.call", repository="NullCounterRepo", method="save"
+        ).count
+        == 3
+    )
+    assert sink.histogram("event_bus.publish").count == 3
+    assert sink.counter("event_bus.events") == 3
+    assert {serie["name"] for serie in sink.summary()} >= {"use_case.exec"}
+
+
+def test_error_span(sink: pydoca.InMemorySink) -> None:
+    spans = []
+
+    class ListSink(pydoca.Sink):
+        def record_span(self, span: pydoca.Span) -> None:
+            spans.append(span)
+
+        def add(self, name, value, attributes) -> None:
+            return
+
+    class Failing(pydoca.UseCase):
+        def exec(self, cmd: pydoca.Command) -> None:
+            raise ValueError()
+
+    pydoca.set_sink(ListSink())
+    with pytest.raises(ValueError):
+        Failing().exec(pydoca.Command())
+
+    assert [(span.name, span.status) for span in spans] == [
+        ("use_case.inject", "OK"),
+        ("use_case.exec", "ERROR"),
+    ]
+    assert spans[1].duration_ns >= 0
+
+
+def test_opentelemetry_sink() -> None:
+    calls = []
+
+    class FakeSpan:
+        def end(self, end_time: int) -> None:
+            calls.append(("end", end_time))
+
+    class FakeTracer:
+        def start_span(self, name, start_time, attributes):
+            calls.append(("start", name, start_time, attributes))
+            return FakeSpan()
+
+    class FakeCounter:
+        def add(self, value, attributes):
+            calls.append(("add", value, attributes))
+
+    class FakeMeter:
+        def create_counter(self, name):
+            return FakeCounter()
+
+    sink = pydoca.OpenTelemetrySink(FakeTracer(), FakeMeter())
+    sink.record_span(pydoca.Span("op", {"a": "b"}, 1, 5))
+    sink.add("counter", 2, {})
+
+    assert calls == [
+        ("start", "op", 1, {"a": "b", "pydoca.status": "OK"}),
+        ("end", 5),
+        ("add", 2, {}),
+    ]
@@ -0,0 +1,405 @@
+import abc
+import decimal
+import enum
+import random
+import threading
+
+import pytest
+
+import pydoca
+from pydoca.memory import _SortedIndex
+
+
+class Currency(enum.Enum):
+    CAD = "CAD"
+    EUR = "EUR"
+
+
+class Line(pydoca.Entity):
+    label: str
+    amount: decimal.Decimal
+
+    def _id(self) -> str:
+        return self.label
+
+
+class Budget(pydoca.AggregateRoot):
+    title: str
+    currency: Currency
+    total: decimal.Decimal = decimal.Decimal(0)
+    lines: pydoca.LazyList[Line] = pydoca.LazyList()
+
+    def _id(self) -> str:
+        return self.title
+
+
+class BudgetRepository(pydoca.Repository):
+    @abc.abstractmethod
+    def get(self, title: str) -> Budget:
+        """Returns the budget."""
+
+    @abc.abstractmethod
+    def save(self, budget: Budget) -> None:
+        """Saves the budget."""
+
+    @abc.abstractmethod
+    def delete(self, budget: Budget) -> None:
+        """Deletes the budget."""
+
+
+class BudgetDatabase(pydoca.InMemorySession):
+    database = "budgets"
+
+
+class InMemoryBudgetRepo(pydoca.InMemoryRepository[Budget], BudgetRepository):
+    sessionT = BudgetDatabase
+    aggregateT = Budget
+    __indexes__ = {"currency": pydoca.HASH, "total": pydoca.SORTED}
+
+    def get(self, title: str) -> Budget:
+        if budget := self.load(title):
+            return budget
+        raise pydoca.EntityNotFoundError(class_id=(Budget, title))
+
+    def save(self, budget: Budget) -> None:
+        self.store(budget)
+
+    def delete(self, budget: Budget) -> None:
+        self.remove(budget)
+
+
+class Plan(pydoca.UseCase):
+    class UnitOfWork:
+        budget_repo: BudgetRepository
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+@pytest.fixture(autouse=True)
+def database():
+    pydoca.bind(BudgetRepository, InMemoryBudgetRepo)
+    yield
+    BudgetDatabase.drop()
+
+
+def budget(title: str, currency: Currency = Currency.CAD, total: int = 0) -> Budget:
+    return Budget(title=title, currency=currency, total=decimal.Decimal(total))
+
+
+def save(*budgets: Budget) -> None:
+    uow = Plan().uow
+    with uow:
+        for budget in budgets:
+            uow.budget_repo.save(budget)
+
+
+def test_store_and_load_snapshots() -> None:
+    home = budget("home", total=10)
+    home.lines.append(Line(label="rent", amount=decimal.Decimal(10)))
+    save(home, budget("trip"))
+
+    loaded = InMemoryBudgetRepo().get("home")
+    assert loaded is not home
+    assert loaded.version == 1
+    assert loaded.model_dump() == home.model_dump()
+    loaded.title = "changed"  # Not stored
+    assert InMemoryBudgetRepo().get("home").title == "home"
+    assert InMemoryBudgetRepo().count() == 2
+
+    uow = Plan().uow
+    with uow:
+        loaded = uow.budget_repo.get("home")
+        assert not loaded.lines.loaded
+        loaded.lines.append(Line(label="food", amount=decimal.Decimal(5)))
+        uow.budget_repo.save(loaded)
+        assert uow.budget_repo.get("home") is loaded  # Staged writes are read back
+    stored = InMemoryBudgetRepo().get("home")
+    assert stored.version == 2
+    assert stored.lines.sum("amount") == 15
+
+    with uow:
+        uow.budget_repo.delete(uow.budget_repo.get("trip"))
+    assert InMemoryBudgetRepo().load("trip") is None
+
+
+def test_concurrent_update_conflict() -> None:
+    save(budget("home"))
+    uow = Plan().uow
+    with pytest.raises(pydoca.ConcurrencyConflictError) as exc_info:
+        with uow:
+            home = uow.budget_repo.get("home")
+            uow.budget_repo.save(home)
+            # Another unit of work, sessions stage the writes per thread
+            other = threading.Thread(
+                target=save, args=[InMemoryBudgetRepo().get("home")]
+            )
+            other.start()
+            other.join()
+    assert (exc_info.value.expected, exc_info.value.stored) == (1, 2)
+    assert home.version == 1
+
+    with pytest.raises(pydoca.ConcurrencyConflictError):
+        save(budget("home"))  # Already created by another unit of work
+
+
+def test_store_outside_unit_of_work() -> None:
+    repo, trip = InMemoryBudgetRepo(), budget("trip", total=5)
+    repo.store(trip)
+    repo.session.commit()
+    trip.total = decimal.Decimal(8)
+    repo.store(trip)  # Not versioned without a unit of work
+    repo.session.commit()
+    assert (repo.get("trip").total, repo.get("trip").version) == (8, 0)
+
+    repo.remove(trip)
+    repo.session.commit()
+    assert repo.load("trip") is None
+
+
+def test_rollback_discards_staged_writes() -> None:
+    uow = Plan().uow
+    with pytest.raises(RuntimeError):
+        with uow:
+            uow.budget_repo.save(budget("home"))
+            raise RuntimeError()
+    assert InMemoryBudgetRepo().load("home") is None
+
+
+def test_secondary_indexes() -> None:
+    save(*(budget(str(i), [Currency.CAD, Currency.EUR][i % 2], i) for i in range(10)))
+    repo = InMemoryBudgetRepo()
+
+    def titles(budgets: list[Budget]) -> list[str]:
+        return [budget.title for budget in budgets]
+
+    assert titles(repo.find("currency", Currency.EUR)) == ["1", "3", "5", "7", "9"]
+    assert titles(repo.find("total", 4)) == ["4"]
+    assert titles(repo.find("title", "2")) == ["2"]  # Not indexed, scanned
+    assert titles(repo.range("total", 3, 6)) == ["3", "4", "5"]
+    assert titles(repo.range("total", stop=2)) == ["0", "1"]
+    assert titles(repo.range("total", 8)) == ["8", "9"]
+    with pytest.raises(ValueError):
+        repo.range("currency", Currency.CAD)
+
+    uow = Plan().uow
+    with uow:
+        moved = uow.budget_repo.get("1")
+        moved.currency = Currency.CAD
+        moved.total = decimal.Decimal(20)
+        uow.budget_repo.save(moved)
+        uow.budget_repo.delete(uow.budget_repo.get("3"))
+    assert titles(repo.find("currency", Currency.EUR)) == ["5", "7", "9"]
+    assert titles(repo.range("total", 8)) == ["8", "9", "1"]
+    assert titles(repo.iter_where({"currency": Currency.EUR}, chunk_size=2)) == [
+        "5",
+        "7",
+        "9",
+    ]
+    assert titles(repo.iter_where({"currency": Currency.CAD, "total": 20})) == ["1"]
+    assert len(list(repo.iter_all(chunk_size=3))) == 9
+
+
+def test_index_declared_on_existing_table() -> None:
+    save(budget("home", total=5))
+
+    class TitleIndexedRepo(InMemoryBudgetRepo):
+        __indexes__ = {**InMemoryBudgetRepo.__indexes__, "title": pydoca.SORTED}
+
+    assert [b.title for b in TitleIndexedRepo().range("title", "a")] == ["home"]
+
+    class UnknownIndexRepo(InMemoryBudgetRepo):
+        __indexes__ = {"unknown": pydoca.HASH}
+
+    with pytest.raises(KeyError):
+        UnknownIndexRepo().count()
+
+
+def test_keyset_pagination() -> None:
+    save(*(budget(str(i), Currency.EUR if i % 2 else Currency.CAD) for i in range(10)))
+    repo = InMemoryBudgetRepo()
+
+    def titles(budgets: list[Budget]) -> list[str]:
+        return [budget.title for budget in budgets]
+
+    page = repo.page(limit=4)
+    assert titles(page.items) == ["0", "1", "2", "3"]
+    assert page.cursor == 4  # Number of the last aggregate returned
+    uow = Plan().uow
+    with uow:
+        uow.budget_repo.delete(uow.budget_repo.get("4"))
+        uow.budget_repo.save(budget("new"))
+    page = repo.page(page.cursor, limit=4)
+    assert titles(page.items) == ["5", "6", "7", "8"]
+    page = repo.page(page.cursor, limit=4)
+    assert (titles(page.items), page.cursor) == (["9", "new"], None)
+
+    euro = {"currency": Currency.EUR}
+    page = repo.page(limit=4, where=euro)  # Sorts the few indexed IDs
+    assert titles(page.items) == ["1", "3", "5", "7"]
+    assert titles(repo.page(page.cursor, limit=4, where=euro).items) == ["9"]
+    page = repo.page(limit=1, where=euro)  # Scans for the many indexed IDs
+    assert titles(page.items) == ["1"]
+    assert titles(repo.page(page.cursor, limit=1, where=euro).items) == ["3"]
+    page = repo.page(limit=2, where={"title": "new"})  # Scanned
+    assert (titles(page.items), page.cursor) == (["new"], None)
+
+    with uow:
+        for title in "0123567":
+            uow.budget_repo.delete(uow.budget_repo.get(title))
+    # Entries of the deleted aggregates are compacted, a new aggregate is listed last
+    table = BudgetDatabase.start()._database.tables["Budget"]
+    assert len(table.order[1]) < 11
+    save(budget("0"))
+    assert titles(repo.iter_all(chunk_size=2)) == ["8", "9", "new", "0"]
+
+
+def test_sorted_index_blocks(monkeypatch) -> None:
+    monkeypatch.setattr(_SortedIndex, "_LOAD", 4)
+    index = _SortedIndex()
+    values = {i: random.randrange(50) for i in range(200)}
+    for aggregate_id, value in values.items():
+        index.add(aggregate_id, value)
+    for aggregate_id in range(0, 200, 3):
+        index.discard(aggregate_id, values.pop(aggregate_id))
+    index.add(1, values[1])  # Already indexed
+    index.discard(1, values.pop(1))
+    index.add(1, None)  # Not indexed
+
+    expected = sorted((value, i) for i, value in values.items() if 10 <= value < 30)
+    assert index.range(10, 30) == [i for _, i in expected]
+    assert index.equal(12) == [i for value, i in expected if value == 12]
+    assert len(index.range()) == len(values)
+
+    with index.batch():
+        index.add(1000, 12)
+        index.discard(2, values[2])
+        assert len(index.range()) == len(values)  # Published at the end of the batch
+    assert 1000 in index.equal(12) and 2 not in index.range()
+
+
+def test_readers_do_not_lock_during_writes(monkeypatch) -> None:
+    monkeypatch.setattr(_SortedIndex, "_LOAD", 4)
+    save(*(budget(str(i), total=i) for i in range(100)))
+    errors = []
+
+    def read() -> None:
+        repo = InMemoryBudgetRepo()
+        try:
+            for _ in range(50):
+                totals = [b.total for b in repo.range("total", 10, 90)]
+                assert totals == sorted(totals)
+                assert all(10 <= total < 90 for total in totals)
+                assert all(
+                    b.currency == Currency.EUR
+                    for b in repo.find("currency", Currency.EUR)
+                )
+        except Exception as exc:
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(100):
+        moved = InMemoryBudgetRepo().get(str(i))
+        moved.total = decimal.Decimal(99 - i)
+        moved.currency = Currency.EUR
+        save(moved)
+    for reader in readers:
+        reader.join()
+    assert errors == []
+
+
+def test_snapshot_isolation() -> None:
+    home = budget("home", total=1)
+    home.lines.append(Line(label="rent", amount=decimal.Decimal(1)))
+    save(home, budget("trip", Currency.EUR))
+
+    def other_unit_of_work() -> None:
+        uow = Plan().uow
+        with uow:
+            changed = uow.budget_repo.get("home")
+            changed.total = decimal.Decimal(2)
+            changed.currency = Currency.EUR
+            changed.lines.append(Line(label="food", amount=decimal.Decimal(1)))
+            uow.budget_repo.save(changed)
+            uow.budget_repo.delete(uow.budget_repo.get("trip"))
+            uow.budget_repo.save(budget("new"))
+
+    uow = Plan().uow
+    with uow:
+        repo = uow.budget_repo
+        assert repo.get("home").total == 1  # Begins reading the snapshot
+        thread = threading.Thread(target=other_unit_of_work)
+        thread.start()
+        thread.join()
+        # Reads the database as it was when the unit of work began
+        home = repo.get("home")
+        assert (home.total, home.currency) == (1, Currency.CAD)
+        assert len(home.lines) == 1
+        assert repo.load("trip") is not None and repo.load("new") is None
+        assert [b.title for b in repo.find("currency", Currency.EUR)] == ["trip"]
+        assert [b.title for b in repo.range("total", 1)] == ["home"]
+        assert repo.count() == 2
+        assert sorted(b.title for b in repo.iter_all()) == ["home", "trip"]
+        # Latest commit outside of the unit of work
+        assert InMemoryBudgetRepo().get("home").total == 2
+        assert InMemoryBudgetRepo().count() == 2
+
+    repo = InMemoryBudgetRepo()
+    assert [b.title for b in repo.find("currency", Currency.EUR)] == ["home"]
+    assert [b.title for b in repo.range("total", 1)] == ["home"]
+    assert sorted(b.title for b in repo.load_all()) == ["home", "new"]
+    assert len(repo.get("home").lines) == 2
+
+    # Previous versions and index values are dropped once no snapshot reads them
+    table = repo._table()
+    assert all(version.previous is None for version in table.rows.values())
+    assert "trip" not in table.rows
+    assert table.indexes["currency"].equal(Currency.CAD) == ["new"]
+    assert len(table.sizes) == 1
+
+
+def test_failed_unit_of_work_writes_nothing() -> None:
+    save(budget("home"), budget("trip"))
+    uow = Plan().uow
+    with pytest.raises(pydoca.ConcurrencyConflictError):
+        with uow:
+            for title in ("home", "trip"):
+                changed = uow.budget_repo.get(title)
+                changed.total = decimal.Decimal(10)
+                uow.budget_repo.save(changed)
+            # Another unit of work changes trip first
+            other = threading.Thread(
+                target=save, args=[InMemoryBudgetRepo().get("trip")]
+            )
+            other.start()
+            other.join()
+    assert uow.budget_repo.memory_session.snapshot is None
+    assert [b.total for b in InMemoryBudgetRepo().load_all()] == [0, 0]
+
+    with uow:  # Reusable after the conflict
+        uow.budget_repo.save(uow.budget_repo.get("home"))
+    assert InMemoryBudgetRepo().get("home").version == 2
+
+
+class Settings(pydoca.InMemoryMappingSession):
+    database = "settings"
+
+
+def test_mapping_session_stages_writes() -> None:
+    Settings.drop()
+    session, other = Settings.start(), Settings.start()
+    session["theme"] = "dark"
+    session["lang"] = "fr"
+    assert dict(session) == {"theme": "dark", "lang": "fr"} and len(other) == 0
+    session.commit()
+    assert dict(other) == {"theme": "dark", "lang": "fr"}
+
+    del session["lang"]
+    session["theme"] = "light"
+    assert dict(session) == {"theme": "light"} and other["lang"] == "fr"
+    session.rollback()
+    assert dict(session) == {"theme": "dark", "lang": "fr"}
+    with pytest.raises(KeyError):
+        del session["missing"]
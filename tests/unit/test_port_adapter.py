@@ -1,8 +1,11 @@
 import abc
+import contextlib
 
+import pydantic
 import pytest
 
 import pydoca
+from pydoca.codec import _CODECS
 
 
 class EmailService(pydoca.Service):
@@ -43,3 +46,171 @@ def test_clear_and_error():
         match="Adapter for EmailService port not configured",
     ):
         pydoca.inject(EmailService)
+
+
+def test_freeze_inject():
+    email_svc = FakeEmailService()
+    pydoca.bind(EmailService, email_svc)
+    pydoca.freeze()
+    assert pydoca.is_frozen()
+    assert pydoca.inject(EmailService) is email_svc
+
+
+def test_freeze_factory_and_singleton():
+    pydoca.bind(EmailService, FakeEmailService)
+    pydoca.freeze()
+    assert pydoca.inject(EmailService) is not pydoca.inject(EmailService)
+
+    pydoca.unfreeze()
+    pydoca.freeze(singletons=[EmailService])
+    assert isinstance(pydoca.inject(EmailService), FakeEmailService)
+    assert pydoca.inject(EmailService) is pydoca.inject(EmailService)
+
+
+def test_freeze_forbids_rebinding():
+    pydoca.freeze()
+    with pytest.raises(pydoca.AdaptersFrozenError):
+        pydoca.bind(EmailService, FakeEmailService)
+    with pytest.raises(pydoca.AdaptersFrozenError):
+        pydoca.clear()
+    with pytest.raises(pydoca.AdapterNotConfiguredError):
+        pydoca.inject(EmailService)
+
+    pydoca.unfreeze()
+    pydoca.bind(EmailService, FakeEmailService)
+    assert isinstance(pydoca.inject(EmailService), FakeEmailService)
+
+
+def test_freeze_unbound_singleton():
+    with pytest.raises(pydoca.AdapterNotConfiguredError):
+        pydoca.freeze(singletons=[EmailService])
+    assert not pydoca.is_frozen()
+
+
+def test_bootstrap_frozen():
+    class Configuration(pydoca.AdaptersConfig):
+        __singletons__ = ("EmailService",)
+        EmailService = FakeEmailService
+
+    pydoca.bootstrap(adapters_config=Configuration, frozen=True)
+    assert pydoca.is_frozen()
+    assert pydoca.inject(EmailService) is pydoca.inject(EmailService)
+
+
+class Message(pydoca.Entity):
+    subject: str
+
+    def _id(self) -> str:
+        return self.subject
+
+
+class Inbox(pydoca.AggregateRoot):
+    owner: "Owner"  # Not defined yet, pydantic builds the model on first use
+    messages: pydoca.LazyList[Message] = pydoca.LazyList()
+
+    def _id(self) -> str:
+        return self.owner.name
+
+
+class Owner(pydoca.ValueObject):
+    name: str
+
+
+class SendCmd(pydoca.Command):
+    tags: list[str] = pydantic.Field(default_factory=list)
+
+
+class Send(pydoca.UseCase):
+    class UnitOfWork:
+        pass
+
+    def exec(self, cmd: SendCmd) -> None:
+        return
+
+
+def test_bootstrap_warm_up():
+    class Configuration(pydoca.AdaptersConfig):
+        __singletons__ = ("EmailService",)
+        EmailService = FakeEmailService
+
+    assert not Inbox.__pydantic_complete__
+    report = pydoca.bootstrap(adapters_config=Configuration, frozen=True, warm_up=True)
+    assert Inbox.__pydantic_complete__
+    assert Inbox in _CODECS and Message in _CODECS
+    names = {name.rsplit(".", 1)[-1] for name in report}
+    assert {"Inbox", "Message", "Owner", "SendCmd", "Send", "EmailService"} <= names
+    assert not any(name.startswith("pydoca.") for name in report)
+    assert all(duration > 0 for duration in report.values())
+
+    pydoca.unfreeze()
+    assert pydoca.bootstrap(adapters_config=Configuration) == {}
+
+
+def test_bootstrap_unknown_singleton():
+    class Configuration(pydoca.AdaptersConfig):
+        __singletons__ = ("SmsService",)
+        EmailService = FakeEmailService
+
+    with pytest.raises(pydoca.PortNotFoundError):
+        pydoca.bootstrap(adapters_config=Configuration, frozen=True)
+    assert not pydoca.is_frozen()
+
+
+class OtherEmailService(EmailService):
+    def send_email(self, message: str) -> None:
+        return
+
+
+def test_scope_override():
+    pydoca.bind(EmailService, FakeEmailService)
+    with pydoca.scope({EmailService: OtherEmailService}):
+        assert isinstance(pydoca.inject(EmailService), OtherEmailService)
+    assert isinstance(pydoca.inject(EmailService), FakeEmailService)
+
+
+def test_scope_nested_and_frozen_root():
+    class SmsService(pydoca.Service):
+        @abc.abstractmethod
+        def send_sms(self) -> None:
+            """Sends a sms."""
+
+    class FakeSmsService(SmsService):
+        def send_sms(self) -> None:
+            return
+
+    sms_svc = FakeSmsService()
+    pydoca.bind(EmailService, FakeEmailService)
+    pydoca.freeze()
+    with pydoca.scope({SmsService: sms_svc}):
+        with pydoca.scope({EmailService: OtherEmailService}) as inner:
+            assert isinstance(pydoca.inject(EmailService), OtherEmailService)
+            assert pydoca.inject(SmsService) is sms_svc
+            assert len(inner.resolvers) == 2
+        assert isinstance(pydoca.inject(EmailService), FakeEmailService)
+    with pytest.raises(pydoca.AdapterNotConfiguredError):
+        pydoca.inject(SmsService)
+
+
+def test_scope_per_thread():
+    import threading
+
+    pydoca.bind(EmailService, FakeEmailService)
+    tenant = pydoca.AdaptersScope({EmailService: OtherEmailService})
+    results = {}
+    barrier = threading.Barrier(2)
+
+    def run(name, scope):
+        with scope.activate() if scope else contextlib.nullcontext():
+            barrier.wait()
+            results[name] = type(pydoca.inject(EmailService))
+
+    threads = [
+        threading.Thread(target=run, args=("tenant", tenant)),
+        threading.Thread(target=run, args=("root", None)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {"tenant": OtherEmailService, "root": FakeEmailService}
@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import ClassVar
+
+import pytest
+
+import pydoca
+
+
+class ReportCmd(pydoca.Command):
+    rows: int
+
+
+class OtherCmd(pydoca.Command):
+    pass
+
+
+def build_rows(count: int) -> list[str]:
+    rows = [f"row {i}" * 10 for i in range(count)]
+    deadline = time.monotonic() + 0.02
+    while time.monotonic() < deadline:
+        pass
+    return rows
+
+
+class BuildReport(pydoca.UseCase):
+    reports: ClassVar[list[list[str]]] = []
+
+    def exec(self, cmd: ReportCmd | OtherCmd) -> int:
+        rows = build_rows(cmd.rows if isinstance(cmd, ReportCmd) else 1)
+        self.reports.append(rows)  # Kept, allocations not freed
+        return len(rows)
+
+
+@pytest.fixture
+def profiler():
+    profiler = pydoca.Profiler(rate=1, interval=0.001, memory=True)
+    pydoca.set_profiler(profiler)
+    yield profiler
+    pydoca.set_profiler(None)
+    profiler.close()
+    BuildReport.reports.clear()
+
+
+def test_profiler_stacks_and_allocations(profiler, tmp_path) -> None:
+    assert BuildReport().exec(ReportCmd(rows=1000)) == 1000
+    BuildReport().exec(OtherCmd())
+
+    profile = profiler.profiles["BuildReport", "ReportCmd"]
+    assert profile.calls == 1 and profile.duration_ns >= 20_000_000
+    assert any(
+        stack[-1].endswith("test_profiling.build_rows") for stack in profile.stacks
+    )
+    location, size = profile.allocations.most_common(1)[0]
+    assert location.endswith(
+        f"test_profiling.py:{build_rows.__code__.co_firstlineno + 1}"
+    )
+    assert size > 100_000
+    assert profile.peak_bytes >= size
+
+    summary = {entry["command"]: entry for entry in profiler.summary()}
+    assert summary.keys() == {"ReportCmd", "OtherCmd"}
+    assert summary["OtherCmd"]["calls"] == 1
+
+    path = tmp_path / "use_cases.folded"
+    profiler.dump(str(path))
+    lines = path.read_text().splitlines()
+    assert all(line.startswith("BuildReport;") for line in lines)
+    assert any(
+        "BuildReport;ReportCmd;tests.unit.test_profiling.BuildReport.exec;" in line
+        for line in lines
+    )
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) >= 2
+
+
+def test_profiler_sampling_and_toggle(profiler) -> None:
+    pydoca.set_profiler(pydoca.Profiler(rate=0))
+    BuildReport().exec(OtherCmd())
+    assert BuildReport.exec.__wrapped__.__wrapped__ is BuildReport.__exec__
+    with pytest.raises(ValueError):
+        pydoca.Profiler(rate=2)
+
+    pydoca.set_profiler(None)
+    assert BuildReport.exec.__wrapped__ is BuildReport.__exec__
+
+    # Sampled calls of other threads are profiled concurrently
+    sampled = pydoca.Profiler(rate=1)
+    pydoca.set_profiler(sampled)
+    threads = [
+        threading.Thread(target=BuildReport().exec, args=(OtherCmd(),))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sampled.close()
+    BuildReport().exec(OtherCmd())  # Not sampled once closed
+    assert sampled.profiles["BuildReport", "OtherCmd"].calls == 3
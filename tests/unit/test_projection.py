@@ -0,0 +1,148 @@
+import decimal
+
+import pytest
+
+import pydoca
+
+
+class IncomeAdded(pydoca.Event):
+    amount: decimal.Decimal
+
+
+class BonusAdded(IncomeAdded):
+    pass
+
+
+class ExpenseAdded(pydoca.Event):
+    amount: decimal.Decimal
+
+
+class BudgetClosed(pydoca.Event):
+    pass
+
+
+class Budget(pydoca.AggregateRoot):
+    title: str
+
+    def _id(self) -> str:
+        return self.title
+
+    def add_income(self, amount: str) -> None:
+        self.add_event(IncomeAdded(amount=decimal.Decimal(amount)))
+
+    def add_expense(self, amount: str) -> None:
+        self.add_event(ExpenseAdded(amount=decimal.Decimal(amount)))
+
+
+class CashFlow(pydoca.Projection):
+    def on_income(self, event: IncomeAdded) -> None:
+        total = self.store.get(event.aggregate_id, decimal.Decimal(0))
+        self.store.put(event.aggregate_id, total + event.amount)
+
+    def on_expense(self, event: ExpenseAdded) -> None:
+        total = self.store.get(event.aggregate_id, decimal.Decimal(0))
+        self.store.put(event.aggregate_id, total - event.amount)
+
+
+class ReadModelsDatabase(pydoca.InMemoryMappingSession):
+    database = "read_models"
+
+
+@pytest.fixture(autouse=True)
+def drain_event_bus():
+    while pydoca.EventBus.get_event():
+        pass
+
+
+def publish_budget_events() -> None:
+    budget = Budget(title="budget")
+    budget.add_income("100")
+    budget.add_expense("30")
+    budget.add_event(BonusAdded(amount=decimal.Decimal("5")))
+    budget.add_event(BudgetClosed())
+    pydoca.EventBus.publish_events(iter(budget.get_events()))
+
+
+def test_events_aggregate_id() -> None:
+    budget = Budget(title="budget")
+    event = IncomeAdded(amount=decimal.Decimal(1))
+    assert event.aggregate_id is None
+    budget.add_event(event)
+    assert event.aggregate_id == "budget"
+    assert "aggregate_id" in event.model_fields_set
+
+
+def test_projection_handlers() -> None:
+    assert set(CashFlow.__handlers__) == {IncomeAdded, ExpenseAdded}
+    cash_flow = CashFlow()
+    assert cash_flow.handler(BonusAdded) is CashFlow.on_income
+    assert cash_flow.handler(BudgetClosed) is None
+
+
+def test_projector_process_pending() -> None:
+    cash_flow = CashFlow()
+    projector = pydoca.Projector([cash_flow])
+    publish_budget_events()
+
+    assert projector.process_pending() == 4
+    assert cash_flow.store.get("budget") == decimal.Decimal(75)
+    assert cash_flow.store.get_checkpoint() == 4
+    assert projector.process_pending() == 0
+
+
+def test_projector_catch_up_and_rebuild() -> None:
+    event_store = pydoca.InMemoryEventStore()
+    cash_flow = CashFlow()
+    projector = pydoca.Projector([cash_flow], event_store=event_store, batch_size=3)
+    publish_budget_events()
+    projector.process_pending()
+    assert len(event_store.events) == 4
+
+    # A new projection catches up from the event store
+    late = CashFlow()
+    pydoca.Projector([late], event_store=event_store, batch_size=3).catch_up()
+    assert late.store.get("budget") == decimal.Decimal(75)
+    assert late.store.get_checkpoint() == 4
+
+    # Already handled events are not applied twice
+    projector.catch_up()
+    assert cash_flow.store.get("budget") == decimal.Decimal(75)
+
+    cash_flow.store.put("budget", decimal.Decimal(0))  # Corrupted read model
+    projector.rebuild(cash_flow)
+    assert cash_flow.store.get("budget") == decimal.Decimal(75)
+
+
+def test_projector_without_event_store() -> None:
+    projector = pydoca.Projector([CashFlow()])
+    with pytest.raises(RuntimeError):
+        projector.rebuild(projector.projections[0])
+
+
+def test_session_read_model_store() -> None:
+    ReadModelsDatabase.drop()
+    session = ReadModelsDatabase.start()
+    cash_flow = CashFlow(pydoca.SessionReadModelStore(session, "cash_flow"))
+    projector = pydoca.Projector([cash_flow])
+    publish_budget_events()
+    projector.process_pending()
+
+    committed = ReadModelsDatabase.start()  # Another session sees the checkpoint commit
+    assert committed["cash_flow:budget"] == decimal.Decimal(75)
+    assert committed["cash_flow#checkpoint"] == 4
+
+    # After a restart, events are numbered after the stored checkpoint
+    restarted = CashFlow(
+        pydoca.SessionReadModelStore(ReadModelsDatabase.start(), "cash_flow")
+    )
+    publish_budget_events()
+    pydoca.Projector([restarted]).process_pending()
+    assert committed["cash_flow:budget"] == decimal.Decimal(150)
+    assert committed["cash_flow#checkpoint"] == 8
+
+    restarted.store.clear()
+    assert list(committed) == ["cash_flow#checkpoint"]
+    assert restarted.store.get_checkpoint() == 0
+
+    with pytest.raises(TypeError):
+        pydoca.SessionReadModelStore(object(), "cash_flow")
@@ -0,0 +1,146 @@
+import abc
+from typing import Any, Optional, Self
+
+import pytest
+
+import pydoca
+
+
+class Ticked(pydoca.Event):
+    pass
+
+
+class Clock(pydoca.AggregateRoot):
+    name: str
+    zone: str = "utc"
+
+    def _id(self) -> str:
+        return self.name
+
+
+class ClockRepo(pydoca.Repository):
+    @abc.abstractmethod
+    def get(self, name: str) -> Clock:
+        """Returns the clock."""
+
+
+class NullSession(pydoca.Session):
+    @classmethod
+    def start(cls) -> Self:
+        return cls()
+
+    @classmethod
+    def url(cls) -> str:
+        return "//null"
+
+    def commit(self) -> None:
+        return
+
+    def rollback(self) -> None:
+        return
+
+
+class Ring(pydoca.Entity):
+    at: int
+
+    def _id(self) -> int:
+        return self.at
+
+
+class Alarm(pydoca.AggregateRoot):
+    name: str
+    rings: pydoca.LazyList[Ring] = pydoca.LazyList()
+
+    def _id(self) -> str:
+        return self.name
+
+
+CLOCKS = [Clock(name=str(i), zone="utc" if i % 2 else "cet") for i in range(10)]
+
+
+class ListClockRepo(ClockRepo):
+    sessionT = NullSession
+
+    def get(self, name: str) -> Clock:
+        return next(clock for clock in CLOCKS if clock.name == name)
+
+    def _page(
+        self, cursor: Optional[int], limit: int, where: dict[str, Any]
+    ) -> pydoca.Page[Clock]:
+        matching = [
+            clock
+            for clock in CLOCKS
+            if all(getattr(clock, name) == value for name, value in where.items())
+        ]
+        start = cursor or 0
+        end = start + limit
+        return pydoca.Page(matching[start:end], end if end < len(matching) else None)
+
+
+class NoQueryClockRepo(ClockRepo):
+    sessionT = NullSession
+
+    def get(self, name: str) -> Clock:
+        return Clock(name=name)
+
+
+class ReadClocks(pydoca.UseCase):
+    class UnitOfWork:
+        clock_repo: ClockRepo
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+def test_page_and_iterators() -> None:
+    repo = ListClockRepo()
+    page = repo.page(limit=4)
+    assert (len(page.items), page.cursor) == (4, 4)
+    assert [clock.name for clock in repo.iter_where({"zone": "cet"}, 2)] == [
+        "0",
+        "2",
+        "4",
+        "6",
+        "8",
+    ]
+    assert [len(chunk) for chunk in repo.iter_chunks(chunk_size=4)] == [4, 4, 2]
+
+
+def test_iter_chunks_releases_clean_aggregates() -> None:
+    pydoca.bind(ClockRepo, ListClockRepo)
+    with ReadClocks().uow as uow:
+        repo = uow.clock_repo
+        for clock in repo.iter_all(chunk_size=3):
+            if clock.name == "4":
+                clock.add_event(Ticked())
+        assert list(repo.aggregates) == [(Clock, "4")]
+        assert [event.aggregate_id for event in repo.pull_events()] == ["4"]
+
+        chunks = repo.iter_chunks(chunk_size=3)
+        next(chunks)
+        chunks.close()  # Stopped early, the current chunk is released too
+        assert list(repo.aggregates) == [(Clock, "4")]
+
+
+def test_not_tracked_outside_of_unit_of_work() -> None:
+    repo = ListClockRepo()
+    for clock in repo.iter_all():
+        clock.add_event(Ticked())
+    repo.get("4")
+    assert (repo.aggregates, repo.versions, repo.written) == ({}, {}, set())
+    for clock in CLOCKS:
+        clock.clear_events()
+
+
+def test_queries_not_supported() -> None:
+    with pytest.raises(pydoca.QueryNotSupportedError, match="NoQueryClockRepo"):
+        list(NoQueryClockRepo().iter_all())
+    with pytest.raises(pydoca.QueryNotSupportedError):
+        NoQueryClockRepo().page()
+
+
+def test_lazy_loading_not_supported() -> None:
+    alarm = Alarm(name="wake", rings=pydoca.LazyList.unloaded())
+    NoQueryClockRepo().bind_lazy(alarm)
+    with pytest.raises(pydoca.LazyLoadNotSupportedError, match="NoQueryClockRepo"):
+        len(alarm.rings)
@@ -0,0 +1,177 @@
+import abc
+import decimal
+import io
+import pickle
+import threading
+
+import pytest
+
+import pydoca
+from pydoca.snapshot import _HEADER, _RowUnpickler, _StoredVersion
+
+
+class Line(pydoca.Entity):
+    label: str
+    amount: decimal.Decimal
+
+    def _id(self) -> str:
+        return self.label
+
+
+class Money(pydoca.ValueObject):
+    currency: str
+    amount: decimal.Decimal
+
+
+class Budget(pydoca.AggregateRoot):
+    title: str
+    total: decimal.Decimal = decimal.Decimal(0)
+    limit: Money = Money(currency="EUR", amount=decimal.Decimal(0))
+    tags: list[str] = []
+    lines: pydoca.LazyList[Line] = pydoca.LazyList()
+
+    def _id(self) -> str:
+        return self.title
+
+
+class BudgetRepository(pydoca.Repository):
+    @abc.abstractmethod
+    def save(self, budget: Budget) -> None:
+        """Saves the budget."""
+
+
+class BudgetDatabase(pydoca.InMemorySession):
+    database = "snapshot-budgets"
+
+
+class InMemoryBudgetRepo(pydoca.InMemoryRepository[Budget], BudgetRepository):
+    sessionT = BudgetDatabase
+    aggregateT = Budget
+    __indexes__ = {"total": pydoca.SORTED}
+
+    def save(self, budget: Budget) -> None:
+        self.store(budget)
+
+
+class Plan(pydoca.UseCase):
+    class UnitOfWork:
+        budget_repo: BudgetRepository
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+@pytest.fixture(autouse=True)
+def database():
+    pydoca.bind(BudgetRepository, InMemoryBudgetRepo)
+    yield
+    BudgetDatabase.drop()
+
+
+def save(*budgets: Budget) -> None:
+    uow = Plan().uow
+    with uow:
+        for budget in budgets:
+            uow.budget_repo.save(budget)
+
+
+def test_save_and_load(tmp_path, sink) -> None:
+    path = str(tmp_path / "budgets.snapshot")
+    home = Budget(title="home", total=decimal.Decimal(10), tags=["family"])
+    home.lines.append(Line(label="rent", amount=decimal.Decimal(10)))
+    save(home, *(Budget(title=str(i)) for i in range(3)))
+    uow = Plan().uow
+    with uow:
+        uow.budget_repo.remove(uow.budget_repo.load("0"))
+
+    seq = pydoca.save_snapshot(BudgetDatabase, path)
+    assert sink.counter("snapshot.bytes", database="snapshot-budgets") > _HEADER.size
+    BudgetDatabase.drop()
+    assert InMemoryBudgetRepo().count() == 0
+
+    assert pydoca.load_snapshot(BudgetDatabase, path) == seq
+    (table,) = BudgetDatabase.start()._database.tables.values()
+    assert all(isinstance(v, _StoredVersion) for v in table.rows.values())
+    # Decoded when first read, the indexes creation reads them all
+    assert not any("row" in v.__dict__ for v in table.rows.values())
+    repo = InMemoryBudgetRepo()
+    assert repo.count() == 3
+    loaded = repo.load("home")
+    assert loaded.model_dump() == home.model_dump()
+    assert loaded.version == 1
+    assert loaded.lines.sum("amount") == 10
+    assert repo.load("0") is None
+    assert [b.title for b in repo.range("total", 5)] == ["home"]
+    # Rows keep the nested rows tuples and the sequences lists
+    limit = Money(currency="EUR", amount=decimal.Decimal(0))
+    assert len(list(repo.iter_where({"limit": limit}))) == 3
+    assert [b.title for b in repo.iter_where({"tags": ["family"]})] == ["home"]
+
+    # Committed on top of the snapshot, then snapshotted again
+    loaded.total = decimal.Decimal(20)
+    save(loaded)
+    with pytest.raises(pydoca.ConcurrencyConflictError):
+        save(Budget(title="1"))
+    assert pydoca.save_snapshot(BudgetDatabase, path) == seq + 1
+    pydoca.load_snapshot(BudgetDatabase, path)
+    assert InMemoryBudgetRepo().load("home").total == 20
+    assert sorted(b.title for b in InMemoryBudgetRepo().load_all()) == [
+        "1",
+        "2",
+        "home",
+    ]
+
+
+def test_snapshot_does_not_block_writers(tmp_path) -> None:
+    path = str(tmp_path / "budgets.snapshot")
+    save(*(Budget(title=str(i)) for i in range(100)))
+    database = BudgetDatabase.start()._database
+    seq = database.seq
+    written = threading.Event()
+    original = pydoca.snapshot._encoded
+
+    def slow_encoded(version):
+        if not written.is_set():
+            # Commits while the snapshot is being written
+            thread = threading.Thread(target=save, args=[Budget(title="late")])
+            thread.start()
+            thread.join()
+            written.set()
+        return original(version)
+
+    pydoca.snapshot._encoded = slow_encoded
+    try:
+        assert pydoca.save_snapshot(BudgetDatabase, path) == seq
+    finally:
+        pydoca.snapshot._encoded = original
+    assert database.seq == seq + 1 and not database.snapshots
+
+    pydoca.load_snapshot(BudgetDatabase, path)
+    assert InMemoryBudgetRepo().count() == 100
+    assert InMemoryBudgetRepo().load("late") is None
+
+
+def test_invalid_files(tmp_path) -> None:
+    path = tmp_path / "budgets.snapshot"
+    path.write_bytes(b"not a snapshot" * 10)
+    with pytest.raises(ValueError, match="not a pydoca snapshot"):
+        pydoca.load_snapshot(BudgetDatabase, str(path))
+    path.write_bytes(_HEADER.pack(b"PYDOCASN", 99, 0, _HEADER.size, 0))
+    with pytest.raises(ValueError, match="format 99"):
+        pydoca.load_snapshot(BudgetDatabase, str(path))
+    # Rows never load classes
+    with pytest.raises(pickle.UnpicklingError):
+        _RowUnpickler(io.BytesIO(pickle.dumps(decimal.Decimal(1)))).load()
+
+
+def test_periodic_snapshot(tmp_path) -> None:
+    path = str(tmp_path / "budgets.snapshot")
+    snapshots = pydoca.PeriodicSnapshot(BudgetDatabase, path, interval=0.01)
+    snapshots.start()
+    save(Budget(title="home"))
+    snapshots.stop()
+    assert snapshots.seq == 1
+    assert snapshots.save() is None  # Unchanged
+
+    pydoca.load_snapshot(BudgetDatabase, path)
+    assert InMemoryBudgetRepo().load("home") is not None
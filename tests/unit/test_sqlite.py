@@ -0,0 +1,409 @@
+import abc
+import decimal
+import sqlite3
+import threading
+
+import pytest
+
+import pydoca
+
+
+class Item(pydoca.Entity):
+    name: str
+    price: decimal.Decimal
+
+    def _id(self) -> str:
+        return self.name
+
+
+class Cart(pydoca.AggregateRoot):
+    owner: str
+    items: pydoca.EntityList[Item] = pydoca.EntityList()
+
+    def _id(self) -> str:
+        return self.owner
+
+    def add_item(self, name: str, price: str) -> None:
+        self.items.append(Item(name=name, price=decimal.Decimal(price)))
+
+
+class CartRepository(pydoca.Repository):
+    @abc.abstractmethod
+    def get(self, owner: str) -> Cart:
+        """Returns the cart."""
+
+    @abc.abstractmethod
+    def save(self, cart: Cart) -> None:
+        """Saves the cart."""
+
+    @abc.abstractmethod
+    def delete(self, cart: Cart) -> None:
+        """Deletes the cart."""
+
+
+class CartDatabase(pydoca.SQLiteSession):
+    database = ""
+
+
+class SQLiteCartRepo(pydoca.SQLiteRepository[Cart], CartRepository):
+    sessionT = CartDatabase
+    aggregateT = Cart
+
+    def get(self, owner: str) -> Cart:
+        if cart := self.load(owner):
+            return cart
+        raise pydoca.EntityNotFoundError(class_id=(Cart, owner))
+
+    def save(self, cart: Cart) -> None:
+        self.store(cart)
+
+    def delete(self, cart: Cart) -> None:
+        self.remove(cart)
+
+
+class Shop(pydoca.UseCase):
+    class UnitOfWork:
+        cart_repo: CartRepository
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(CartDatabase, "database", str(tmp_path / "carts.db"))
+    pydoca.bind(CartRepository, SQLiteCartRepo)
+    yield CartDatabase.database
+    CartDatabase.close()
+
+
+def save(*carts: Cart) -> None:
+    uow = Shop().uow
+    with uow:
+        for cart in carts:
+            uow.cart_repo.save(cart)
+
+
+def test_store_and_load() -> None:
+    cart = Cart(owner="alice")
+    cart.add_item("apple", "1.10")
+    save(cart, Cart(owner="bob"))
+
+    loaded = SQLiteCartRepo().get("alice")
+    assert loaded is not cart
+    assert loaded.version == 1
+    assert loaded.model_dump() == cart.model_dump()
+    assert loaded.items.sum("price") == decimal.Decimal("1.10")
+    assert [c.owner for c in SQLiteCartRepo().load_all()] == ["alice", "bob"]
+    assert SQLiteCartRepo().count() == 2
+
+    uow = Shop().uow
+    with uow:
+        loaded = uow.cart_repo.get("alice")
+        loaded.add_item("pear", "2")
+        uow.cart_repo.save(loaded)
+        assert uow.cart_repo.get("alice") is loaded  # Staged writes are read back
+    assert SQLiteCartRepo().get("alice").version == 2
+    assert len(SQLiteCartRepo().get("alice").items) == 2
+
+    with uow:
+        uow.cart_repo.delete(uow.cart_repo.get("bob"))
+    assert SQLiteCartRepo().load("bob") is None
+
+
+def test_wal_mode_and_connection_reuse(database) -> None:
+    session = CartDatabase.start()
+    assert session.connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert CartDatabase.start().connection is session.connection
+
+    connections = []
+    thread = threading.Thread(
+        target=lambda: connections.append(CartDatabase.start().connection)
+    )
+    thread.start()
+    thread.join()
+    assert connections[0] is not session.connection
+
+
+def test_batched_flush() -> None:
+    statements = []
+    CartDatabase.start().connection.set_trace_callback(statements.append)
+    save(*(Cart(owner=str(i)) for i in range(100)))
+    assert sum(statement.startswith("INSERT") for statement in statements) == 100
+    assert statements.count("BEGIN IMMEDIATE") == 1
+    assert statements.count("COMMIT") == 1
+    assert SQLiteCartRepo().count() == 100
+
+
+def test_concurrent_update_conflict(database) -> None:
+    save(Cart(owner="alice"))
+    uow = Shop().uow
+    with pytest.raises(pydoca.ConcurrencyConflictError) as exc_info:
+        with uow:
+            cart = uow.cart_repo.get("alice")
+            cart.add_item("apple", "1")
+            uow.cart_repo.save(cart)
+            with sqlite3.connect(database) as other:
+                other.execute('UPDATE "Cart" SET version = 2')
+    assert (exc_info.value.expected, exc_info.value.stored) == (1, 2)
+    assert cart.version == 1
+    assert SQLiteCartRepo().get("alice").items == []
+
+    with pytest.raises(pydoca.ConcurrencyConflictError):
+        save(Cart(owner="alice"))  # Already created by another unit of work
+
+
+def test_store_outside_unit_of_work() -> None:
+    repo, cart = SQLiteCartRepo(), Cart(owner="alice")
+    repo.store(cart)
+    repo.session.commit()
+    cart.add_item("apple", "1")
+    repo.store(cart)  # Not versioned without a unit of work
+    repo.session.commit()
+    assert (len(repo.get("alice").items), repo.get("alice").version) == (1, 0)
+
+    repo.remove(cart)
+    repo.remove(Cart(owner="bob"))  # Never stored
+    repo.session.commit()
+    assert repo.load("alice") is None
+
+
+def test_rollback_discards_staged_writes() -> None:
+    uow = Shop().uow
+    with pytest.raises(RuntimeError):
+        with uow:
+            uow.cart_repo.save(Cart(owner="alice"))
+            raise RuntimeError()
+    assert SQLiteCartRepo().load("alice") is None
+    save(Cart(owner="bob"))
+    assert SQLiteCartRepo().count() == 1
+
+
+@pytest.mark.parametrize("group_commit", [None, pydoca.GroupCommit()])
+def test_tables_created_outside_failed_transactions(monkeypatch, group_commit) -> None:
+    def failing_dump(aggregate: pydoca.AggregateRoot) -> bytes:
+        raise ValueError("Not encodable")
+
+    monkeypatch.setattr(CartDatabase, "__group_commit__", group_commit)
+    with monkeypatch.context() as patch, pytest.raises(ValueError):
+        patch.setattr(pydoca.sqlite, "_dump", failing_dump)
+        save(Cart(owner="alice"))  # First write, creates the table
+    tables = CartDatabase.start().connection.execute("SELECT name FROM sqlite_master")
+    assert ("Cart",) in tables.fetchall()
+    assert SQLiteCartRepo().load("alice") is None
+    save(Cart(owner="bob"))
+    assert SQLiteCartRepo().count() == 1
+
+
+def test_nested_units_of_work_keep_their_writes() -> None:
+    outer, inner = Shop().uow, Shop().uow
+    with outer:
+        outer.cart_repo.save(Cart(owner="alice"))
+        with pytest.raises(RuntimeError), inner:  # Same thread, same connection
+            inner.cart_repo.save(Cart(owner="bob"))
+            raise RuntimeError()
+        assert outer.cart_repo.session.staged("Cart", "alice") is not None
+    assert [cart.owner for cart in SQLiteCartRepo().load_all()] == ["alice"]
+
+
+def test_queries() -> None:
+    carts = [Cart(owner=str(i)) for i in range(10)]
+    for cart in carts[::3]:
+        cart.add_item("apple", "1")
+    save(*carts)
+
+    repo = SQLiteCartRepo()
+    page = repo.page(limit=4)
+    assert [cart.owner for cart in page.items] == ["0", "1", "2", "3"]
+    page = repo.page(page.cursor, limit=4)
+    assert [cart.owner for cart in page.items] == ["4", "5", "6", "7"]
+    page = repo.page(page.cursor, limit=4)
+    assert [cart.owner for cart in page.items] == ["8", "9"]
+    assert page.cursor is None
+
+    assert [cart.owner for cart in repo.iter_all(chunk_size=3)] == [
+        cart.owner for cart in carts
+    ]
+    assert [cart.owner for cart in repo.iter_where({"owner": "5"})] == ["5"]
+    assert list(repo.iter_where({"version": 2})) == []
+    with pytest.raises(KeyError):
+        repo.page(where={"unknown": 1})
+
+
+def test_scan_updates_in_constant_memory() -> None:
+    save(*(Cart(owner=str(i)) for i in range(10)))
+    uow = Shop().uow
+    with uow:
+        for cart in uow.cart_repo.iter_all(chunk_size=3):
+            if cart.owner in ("2", "7"):
+                cart.add_item("pear", "2")
+                uow.cart_repo.save(cart)
+        # Only the written aggregates are still tracked
+        assert {key[1] for key in uow.cart_repo.aggregates} == {"2", "7"}
+    assert [cart.version for cart in SQLiteCartRepo().iter_all()] == [
+        2 if i in (2, 7) else 1 for i in range(10)
+    ]
+
+
+class Order(pydoca.AggregateRoot):
+    number: int
+    lines: pydoca.LazyList[Item] = pydoca.LazyList()
+
+    def _id(self) -> int:
+        return self.number
+
+
+class OrderRepository(pydoca.Repository):
+    @abc.abstractmethod
+    def get(self, number: int) -> Order:
+        """Returns the order."""
+
+    @abc.abstractmethod
+    def save(self, order: Order) -> None:
+        """Saves the order."""
+
+
+class SQLiteOrderRepo(pydoca.SQLiteRepository[Order], OrderRepository):
+    sessionT = CartDatabase
+    aggregateT = Order
+
+    def get(self, number: int) -> Order:
+        if order := self.load(number):
+            return order
+        raise pydoca.EntityNotFoundError(class_id=(Order, number))
+
+    def save(self, order: Order) -> None:
+        self.store(order)
+
+
+class Sell(pydoca.UseCase):
+    class UnitOfWork:
+        order_repo: OrderRepository
+
+    def exec(self, cmd: pydoca.Command) -> None:
+        return
+
+
+def test_lazy_lists() -> None:
+    pydoca.bind(OrderRepository, SQLiteOrderRepo)
+    uow = Sell().uow
+    with uow:
+        for number in range(5):
+            uow.order_repo.save(
+                Order(
+                    number=number,
+                    lines=[
+                        Item(name=str(i), price=decimal.Decimal(number))
+                        for i in range(3)
+                    ],
+                )
+            )
+
+    statements = []
+    CartDatabase.start().connection.set_trace_callback(statements.append)
+    with uow:
+        orders = [uow.order_repo.get(number) for number in range(5)]
+        assert not any(order.lines.loaded for order in orders)
+        assert orders[2].lines.sum("price") == 6
+        # Loaded for every order tracked by the unit of work, in one query
+        assert all(order.lines.loaded for order in orders)
+    assert sum('"Order.lines"' in statement for statement in statements) == 1
+    assert [len(order.lines) for order in orders] == [3] * 5
+
+    statements.clear()
+    with uow:
+        uow.order_repo.save(uow.order_repo.get(1))
+    assert not any("INSERT" in statement for statement in statements)  # Unloaded
+    assert SQLiteOrderRepo().get(1).version == 2
+
+    statements.clear()
+    with uow:
+        order = uow.order_repo.get(2)
+        order.lines.append(Item(name="new", price=decimal.Decimal(1)))
+        uow.order_repo.save(order)
+    assert sum("INSERT" in statement for statement in statements) == 4
+    assert [len(order.lines) for order in SQLiteOrderRepo().load_all()] == [
+        3,
+        3,
+        4,
+        3,
+        3,
+    ]
+
+    repo = SQLiteOrderRepo()
+    chunks = repo.iter_chunks(chunk_size=2, load_with=["lines"])
+    assert all(order.lines.loaded for order in next(chunks))
+
+
+def test_deadline(database) -> None:
+    endless = (
+        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+        "SELECT count(*) FROM c"
+    )
+    uow = Shop().uow
+    with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        with pydoca.deadline(0.02), uow:
+            uow.cart_repo.save(Cart(owner="alice"))
+            uow.cart_repo.sqlite_session.connection.execute(endless).fetchone()
+    assert SQLiteCartRepo().load("alice") is None
+    # Not bounded anymore once the unit of work ended
+    session = CartDatabase.start()
+    assert session.connection.execute("PRAGMA busy_timeout").fetchone() == (5000,)
+
+    locked = threading.Event()
+    release = threading.Event()
+
+    def lock() -> None:
+        connection = sqlite3.connect(database, isolation_level=None)
+        connection.execute("BEGIN IMMEDIATE")
+        locked.set()
+        release.wait()
+        connection.execute("ROLLBACK")
+        connection.close()
+
+    thread = threading.Thread(target=lock)
+    thread.start()
+    locked.wait()
+    try:
+        with pytest.raises(pydoca.DeadlineExceededError):
+            with pydoca.deadline(0.05), uow:
+                uow.cart_repo.save(Cart(owner="bob"))  # Waits for the lock at commit
+    finally:
+        release.set()
+        thread.join()
+    save(Cart(owner="bob"))
+    assert SQLiteCartRepo().get("bob").version == 1
+
+
+def test_group_commit(sink, monkeypatch) -> None:
+    save(Cart(owner="alice"))
+    monkeypatch.setattr(
+        CartDatabase, "__group_commit__", pydoca.GroupCommit(max_batch=5, window=10)
+    )
+    owners = ["alice", "bob", "carol", "dave", "erin"]
+    barrier = threading.Barrier(len(owners))
+    errors: dict[str, Exception] = {}
+
+    def shop(owner: str) -> None:
+        try:
+            barrier.wait()
+            save(Cart(owner=owner))  # Inserting alice again conflicts
+        except Exception as exc:
+            errors[owner] = exc
+        finally:
+            CartDatabase.close()
+
+    threads = [threading.Thread(target=shop, args=(owner,)) for owner in owners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Merged in one transaction once the batch is full, the conflicting unit of work rolled back alone
+    assert sink.counter("group_commit.batches") == 1
+    assert sink.counter("group_commit.commits") == 5
+    assert list(errors) == ["alice"]
+    assert isinstance(errors["alice"], pydoca.ConcurrencyConflictError)
+    repo = SQLiteCartRepo()
+    assert sorted(cart.owner for cart in repo.load_all()) == owners
+    assert all(cart.version == 1 for cart in repo.load_all())
@@ -0,0 +1,244 @@
+import abc
+import threading
+import time
+from typing import Self
+
+import pytest
+
+import pydoca
+
+STORE: dict[str, "Counter"] = {}
+STORED_VERSIONS: dict[str, int] = {}
+
+
+class Incremented(pydoca.Event):
+    pass
+
+
+class ValueChanged(pydoca.Event):
+    __compaction__ = pydoca.LatestWins()
+    value: int
+
+
+class Counter(pydoca.AggregateRoot):
+    name: str
+    value: int = 0
+
+    def _id(self) -> str:
+        return self.name
+
+    def increment(self) -> None:
+        self.value += 1
+        self.add_event(Incremented())
+        self.add_event(ValueChanged(value=self.value))
+
+
+class CounterRepo(pydoca.Repository):
+    @abc.abstractmethod
+    def get(self, name: str) -> Counter:
+        """Gets the counter."""
+
+    @abc.abstractmethod
+    def save(self, counter: Counter) -> None:
+        """Saves the counter."""
+
+
+class DictSession(pydoca.Session):
+    fail = False
+
+    @classmethod
+    def start(cls) -> Self:
+        return cls()
+
+    @classmethod
+    def url(cls) -> str:
+        return "//dict"
+
+    def commit(self) -> None:
+        if self.fail:
+            raise RuntimeError("Commit failed")
+
+    def rollback(self) -> None:
+        return
+
+
+class DictCounterRepo(CounterRepo):
+    sessionT = DictSession
+
+    def get(self, name: str) -> Counter:
+        return STORE[name].model_copy(deep=True)
+
+    def save(self, counter: Counter) -> None:
+        STORE[counter.id] = counter
+
+    def stored_version(self, aggregate: Counter) -> int | None:
+        return STORED_VERSIONS.get(aggregate.id)
+
+
+class IncrementCmd(pydoca.Command):
+    name: str
+
+
+class Increment(pydoca.UseCase):
+    class UnitOfWork:
+        counter_repo: CounterRepo
+
+    def exec(self, cmd: IncrementCmd) -> Counter:
+        with self.uow as uow:
+            counter = uow.counter_repo.get(cmd.name)
+            counter.increment()
+        return counter
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    pydoca.bind(CounterRepo, DictCounterRepo)
+    STORE.clear()
+    STORED_VERSIONS.clear()
+    STORE["counter"] = Counter(name="counter")
+    while pydoca.EventBus.get_event():
+        pass
+    yield
+    DictSession.fail = False
+
+
+def test_loaded_aggregates_events_published() -> None:
+    counter = Increment().exec(IncrementCmd(name="counter"))
+    event = pydoca.EventBus.get_event()
+    assert isinstance(event, Incremented)
+    assert event.aggregate_id == "counter"
+    assert isinstance(pydoca.EventBus.get_event(), ValueChanged)
+    assert counter.get_events() == []
+
+
+def test_events_compacted_before_publish() -> None:
+    uow = Increment().uow
+    with uow:
+        counter = uow.counter_repo.get("counter")
+        for _ in range(3):
+            counter.increment()
+        uow.counter_repo.save(counter)
+    events = []
+    while event := pydoca.EventBus.get_event():
+        events.append(event)
+    assert [type(event) for event in events] == [Incremented] * 3 + [ValueChanged]
+    assert events[-1].value == 3
+
+
+def test_version_incremented_on_change() -> None:
+    counter = Increment().exec(IncrementCmd(name="counter"))
+    assert counter.version == 0  # Only has events, not stored
+
+    uow = Increment().uow
+    with uow:
+        counter = uow.counter_repo.get("counter")
+        counter.increment()
+        uow.counter_repo.save(counter)
+    assert counter.version == 1
+
+    with uow:
+        unchanged = uow.counter_repo.get("counter")
+    assert unchanged.version == 1  # Not changed, not incremented
+
+    with uow:
+        uow.counter_repo.save(Counter(name="new"))
+    assert STORE["new"].version == 1
+
+
+def test_concurrency_conflict() -> None:
+    uow = Increment().uow
+    with pytest.raises(pydoca.ConcurrencyConflictError) as exc_info:
+        with uow:
+            counter = uow.counter_repo.get("counter")
+            counter.increment()
+            STORED_VERSIONS["counter"] = 1  # Concurrent change committed
+    assert exc_info.value.expected == 0
+    assert exc_info.value.stored == 1
+    assert counter.version == 0
+    assert pydoca.EventBus.get_event() is None
+
+
+def test_commit_failure_restores_versions() -> None:
+    DictSession.fail = True
+    uow = Increment().uow
+    with pytest.raises(RuntimeError):
+        with uow:
+            counter = uow.counter_repo.get("counter")
+            counter.increment()
+    assert counter.version == 0
+    assert counter.get_events() == []
+    assert pydoca.EventBus.get_event() is None
+
+
+def test_use_case_conflict_retries() -> None:
+    attempts = []
+
+    class RetriedIncrement(Increment):
+        __conflict_retries__ = 2
+
+        def exec(self, cmd: IncrementCmd) -> Counter:
+            attempts.append(cmd)
+            if len(attempts) == 2:
+                STORED_VERSIONS.pop("counter")  # The conflicting writer is gone
+            with self.uow as uow:
+                counter = uow.counter_repo.get(cmd.name)
+                counter.increment()
+                uow.counter_repo.save(counter)
+            return counter
+
+    STORED_VERSIONS["counter"] = 3
+    assert RetriedIncrement().exec(IncrementCmd(name="counter")).version == 1
+    assert len(attempts) == 2
+
+    STORED_VERSIONS["counter"] = 3
+    attempts.clear()
+    with pytest.raises(pydoca.ConcurrencyConflictError):
+        Increment().exec(IncrementCmd(name="counter"))
+
+
+def test_tracking_reset_when_unit_of_work_ends() -> None:
+    uow = Increment().uow
+    for version in (1, 2):
+        with uow:
+            counter = uow.counter_repo.get("counter")
+            counter.increment()
+            uow.counter_repo.save(counter)
+        assert STORE["counter"].version == version
+    assert uow.counter_repo.aggregates == {}
+
+
+def test_tracking_not_set_when_begin_fails(monkeypatch) -> None:
+    def begin(self) -> None:
+        raise RuntimeError("Begin failed")
+
+    monkeypatch.setattr(DictSession, "begin", begin)
+    uow = Increment().uow
+    with pytest.raises(RuntimeError):
+        with uow:
+            pass
+    uow.counter_repo.get("counter")  # Not tracked outside of a unit of work
+    assert uow.counter_repo.aggregates == {}
+
+
+def test_shared_repository_tracks_each_unit_of_work() -> None:
+    pydoca.bind(CounterRepo, DictCounterRepo())  # One instance, as a singleton adapter
+    errors = []
+
+    def create(thread: int) -> None:
+        for i in range(50):
+            uow = Increment().uow
+            try:
+                with uow:
+                    uow.counter_repo.save(Counter(name=f"{thread}-{i}"))
+                    time.sleep(0.0001)  # Lets the other threads use the repository
+                    assert len(uow.counter_repo.aggregates) == 1
+            except Exception as exc:
+                errors.append(exc)
+
+    threads = [threading.Thread(target=create, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert all(STORE[f"{t}-{i}"].version == 1 for t in range(8) for i in range(50))
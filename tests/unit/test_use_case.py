@@ -1,8 +1,12 @@
 import abc
+import asyncio
+import threading
+from typing import ClassVar
 
 import pytest
 
 import pydoca
+from pydoca import idempotency
 
 
 def test_use_case_no_dependencies():
@@ -13,6 +17,17 @@ def test_use_case_no_dependencies():
     assert UseCaseNoDependency().exec(pydoca.Command()) == "result"
 
 
+def test_use_case_command_by_keyword(sink):
+    class UseCaseByKeyword(pydoca.UseCase):
+        def exec(self, command: pydoca.Command) -> str:
+            return "result"
+
+    assert UseCaseByKeyword().exec(command=pydoca.Command()) == "result"
+    assert sink.histogram(
+        "use_case.exec", use_case="UseCaseByKeyword", command="Command"
+    ).count
+
+
 class Dependency(pydoca.Service):
     """Define an abstract class representing a dependency."""
 
@@ -54,3 +69,376 @@ def test_use_case_missing_dependencies():
         match="Adapter for Dependency port not configured",
     ):
         UseCaseWithDependencies().exec(pydoca.Command())
+
+
+class AddCmd(pydoca.Command):
+    amount: int
+
+
+class Add(pydoca.UseCase):
+    __result_store__ = pydoca.InMemoryResultStore(maxsize=2)
+    executions: ClassVar[list[int]] = []
+    started: ClassVar[threading.Event] = threading.Event()
+    release: ClassVar[threading.Event] = threading.Event()
+
+    def exec(self, cmd: AddCmd) -> int:
+        self.started.set()
+        self.release.wait()
+        self.executions.append(cmd.amount)
+        if cmd.amount < 0:
+            raise ValueError(cmd.amount)
+        return len(self.executions)
+
+
+@pytest.fixture
+def add():
+    Add.executions.clear()
+    Add.release.set()
+    Add.__result_store__.results.clear()
+    return Add()
+
+
+def test_idempotency_keys(add, sink):
+    assert add.exec(AddCmd(amount=1, idempotency_key="a")) == 1
+    assert add.exec(AddCmd(amount=1, idempotency_key="a")) == 1  # Stored result
+    assert add.exec(AddCmd(amount=1)) == 2  # Without key
+    assert add.exec(AddCmd(amount=1, idempotency_key="b")) == 3
+    assert Add.executions == [1, 1, 1]
+    assert sink.counters[("use_case.idempotent_hits", (("use_case", "Add"),))] == 1
+
+    with pytest.raises(pydoca.IdempotencyKeyReusedError):
+        add.exec(AddCmd(amount=2, idempotency_key="a"))
+
+    with pytest.raises(ValueError):
+        add.exec(AddCmd(amount=-1, idempotency_key="c"))
+    with pytest.raises(ValueError):
+        add.exec(AddCmd(amount=-1, idempotency_key="c"))  # Failures are not stored
+    assert Add.executions == [1, 1, 1, -1, -1]
+
+    add.exec(AddCmd(amount=3, idempotency_key="d"))  # Least recently used "b" evicted
+    assert add.exec(AddCmd(amount=1, idempotency_key="a")) == 1
+    assert add.exec(AddCmd(amount=1, idempotency_key="b")) == 7
+
+
+def test_concurrent_duplicates_are_coalesced(add):
+    Add.started.clear()
+    Add.release.clear()
+    results = []
+    first = threading.Thread(
+        target=lambda: results.append(add.exec(AddCmd(amount=1, idempotency_key="a")))
+    )
+    first.start()
+    Add.started.wait()
+    # The duplicates wait for the first execution
+    duplicates = [
+        threading.Thread(
+            target=lambda: results.append(
+                add.exec(AddCmd(amount=1, idempotency_key="a"))
+            )
+        )
+        for _ in range(3)
+    ]
+    for thread in duplicates:
+        thread.start()
+    Add.release.set()
+    for thread in [first, *duplicates]:
+        thread.join()
+    assert results == [1, 1, 1, 1]
+    assert Add.executions == [1]
+
+
+def test_duplicate_waits_until_its_deadline(add):
+    Add.started.clear()
+    Add.release.clear()
+    first = threading.Thread(
+        target=add.exec, args=[AddCmd(amount=1, idempotency_key="a")]
+    )
+    first.start()
+    Add.started.wait()
+    with pytest.raises(pydoca.DeadlineExceededError), pydoca.deadline(0.01):
+        add.exec(AddCmd(amount=1, idempotency_key="a"))
+    Add.release.set()
+    first.join()
+    assert add.exec(AddCmd(amount=1, idempotency_key="a")) == 1
+    assert Add.executions == [1]
+
+
+def test_duplicates_get_their_own_copy():
+    store = pydoca.InMemoryResultStore()
+    results = [store.execute("a", "{}", lambda: [AddCmd(amount=1)]) for _ in range(3)]
+    results[1].append(AddCmd(amount=2))
+    assert results[0] == results[2] == [AddCmd(amount=1)]
+    cmd = store.execute("b", "{}", lambda: AddCmd(amount=3))
+    duplicate = store.execute("b", "{}", lambda: None)
+    assert duplicate == cmd and duplicate is not cmd
+
+
+def test_waiting_duplicates_raise_a_copy_of_the_error(add, monkeypatch):
+    waiting = threading.Semaphore(0)
+
+    def remaining_time() -> None:
+        waiting.release()  # Called by the duplicates before waiting
+
+    monkeypatch.setattr(idempotency, "remaining_time", remaining_time)
+    Add.started.clear()
+    Add.release.clear()
+    errors = []
+
+    def run() -> None:
+        try:
+            add.exec(AddCmd(amount=-1, idempotency_key="a"))
+        except ValueError as exc:
+            errors.append(exc)
+
+    first, *duplicates = [threading.Thread(target=run) for _ in range(3)]
+    first.start()
+    Add.started.wait()
+    for thread in duplicates:
+        thread.start()
+        waiting.acquire()
+    Add.release.set()
+    for thread in [first, *duplicates]:
+        thread.join()
+    assert Add.executions == [-1]
+    original, *copies = sorted(errors, key=lambda error: error.__cause__ is not None)
+    assert copies[0] is not copies[1]
+    assert all(error.__cause__ is original for error in copies)
+
+
+def test_keys_qualified_by_module_and_class(add):
+    class Add(pydoca.UseCase):  # Same name in another scope
+        __result_store__ = add.__result_store__
+
+        def exec(self, cmd: AddCmd) -> int:
+            return -cmd.amount
+
+    assert add.exec(AddCmd(amount=1, idempotency_key="a")) == 1
+    assert Add().exec(AddCmd(amount=1, idempotency_key="a")) == -1
+
+
+class ResultsDatabase(pydoca.InMemoryMappingSession):
+    database = "results"
+
+
+def test_session_result_store():
+    ResultsDatabase.drop()
+    store = pydoca.SessionResultStore(ResultsDatabase, maxsize=2)
+    for key in "abc":
+        assert store.execute(key, "{}", lambda key=key: key.upper()) == key.upper()
+    assert store.execute("c", "{}", lambda: "executed") == "C"
+    assert store.get("a") is None  # Oldest result deleted
+    assert sorted(ResultsDatabase.start()) == [
+        "idempotency#2",
+        "idempotency#3",
+        "idempotency#range",
+        "idempotency:b",
+        "idempotency:c",
+    ]
+
+    # Stored again by another process, its new result is kept
+    store.put("b", pydoca.StoredResult("{}", "B2"))
+    store.put("d", pydoca.StoredResult("{}", "D"))
+    assert store.get("b").result == "B2" and store.get("c") is None
+
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(store.session))
+    thread.start()
+    thread.join()
+    assert sessions[0] is not store.session  # One session per thread
+
+    with pytest.raises(TypeError):
+        pydoca.SessionResultStore(pydoca.InMemorySession)
+
+
+class SubCmd(pydoca.Command):
+    amount: int
+
+
+class Sub(pydoca.UseCase):
+    def exec(self, cmd: SubCmd) -> int:
+        return -cmd.amount
+
+
+class Apply(pydoca.UseCase):
+    def exec(self, cmd: pydoca.Command) -> str:
+        return type(cmd).__name__
+
+
+class Trace(pydoca.Middleware):
+    def __init__(self, name: str, calls: list[str]) -> None:
+        self.name = name
+        self.calls = calls
+
+    def __call__(self, use_case, cmd, call_next):
+        self.calls.append(f"{self.name}:{type(use_case).__name__}")
+        return call_next(use_case, cmd)
+
+
+class RejectNegative(pydoca.Middleware):
+    __commands__ = (AddCmd,)
+
+    def __call__(self, use_case, cmd, call_next):
+        if cmd.amount < 0:
+            return None
+        return call_next(use_case, cmd)
+
+
+@pytest.fixture
+def middlewares():
+    yield
+    pydoca.set_middlewares([])
+
+
+def test_middlewares(add, middlewares, sink):
+    calls: list[str] = []
+
+    def outer(use_case, cmd, call_next):
+        calls.append("outer")
+        return call_next(use_case, cmd)
+
+    pydoca.bootstrap(middlewares=[outer, Trace("trace", calls), RejectNegative()])
+    assert add.exec(AddCmd(amount=1)) == 1
+    assert add.exec(AddCmd(amount=-1)) is None  # Rejected before the execution
+    assert Add.executions == [1]
+    assert Sub().exec(SubCmd(amount=1)) == -1
+    assert calls == ["outer", "trace:Add"] * 2 + ["outer", "trace:Sub"]
+    assert sink.histogram("use_case.exec", use_case="Add", command="AddCmd").count == 2
+
+    # Only the middlewares of its command type are chained
+    calls.clear()
+    Sub().exec(SubCmd(amount=-1))
+    assert calls == ["outer", "trace:Sub"]
+
+    # Exec annotated with the base Command checks the command class
+    assert Apply().exec(AddCmd(amount=-1)) is None
+    assert Apply().exec(SubCmd(amount=-1)) == "SubCmd"
+
+    class Later(pydoca.UseCase):
+        def exec(self, cmd: SubCmd) -> int:
+            return cmd.amount
+
+    calls.clear()
+    assert Later().exec(SubCmd(amount=1)) == 1
+    assert calls == ["outer", "trace:Later"]
+
+    pydoca.set_middlewares([])
+    assert Sub.exec.__wrapped__ is Sub.__exec__
+
+
+class Convert(pydoca.UseCase):
+    __bulkhead__ = pydoca.Bulkhead(max_in_flight=1, max_queued=1)
+    started: ClassVar[threading.Event] = threading.Event()
+    release: ClassVar[threading.Event] = threading.Event()
+
+    def exec(self, cmd: SubCmd) -> int:
+        self.started.set()
+        self.release.wait()
+        return cmd.amount
+
+
+@pytest.fixture
+def convert():
+    Convert.started.clear()
+    Convert.release.clear()
+    yield Convert()
+    Convert.release.set()
+
+
+def test_bulkhead_threads(convert, sink):
+    results = []
+
+    def run(amount: int) -> None:
+        results.append(convert.exec(SubCmd(amount=amount)))
+
+    running = threading.Thread(target=run, args=[1])
+    running.start()
+    Convert.started.wait()
+    queued = threading.Thread(target=run, args=[2])
+    queued.start()
+    while Convert.__bulkhead__.queued == 0:
+        pass
+    with pytest.raises(pydoca.BulkheadFullError) as exc_info:
+        convert.exec(SubCmd(amount=3))  # Rejected at once
+    assert exc_info.value.reason == "queue_full"
+    assert Sub().exec(SubCmd(amount=1)) == -1  # Other use cases are not limited
+
+    Convert.release.set()
+    for thread in (running, queued):
+        thread.join()
+    assert results == [1, 2]
+    assert Convert.__bulkhead__.in_flight == 0
+    assert sink.counter("bulkhead.rejected", use_case="Convert", reason="queue_full")
+    queue_wait = sink.histogram("bulkhead.queue_wait", use_case="Convert")
+    assert queue_wait.count == 2 and queue_wait.percentile(100) > 0
+
+    bulkhead = pydoca.Bulkhead(max_in_flight=1, max_queued=1, timeout=0.01)
+    bulkhead.acquire()
+    with pytest.raises(pydoca.BulkheadFullError) as exc_info:
+        bulkhead.acquire()
+    assert exc_info.value.reason == "timeout"
+    assert bulkhead.queued == 0
+    bulkhead.release()
+    assert bulkhead.in_flight == 0
+
+
+def test_bulkhead_asyncio(convert):
+    async def main() -> None:
+        running = asyncio.create_task(convert.aexec(SubCmd(amount=1)))
+        await asyncio.to_thread(Convert.started.wait)
+        queued = asyncio.create_task(convert.aexec(SubCmd(amount=2)))
+        await asyncio.sleep(0)
+        assert Convert.__bulkhead__.queued == 1
+        with pytest.raises(pydoca.BulkheadFullError):
+            await convert.aexec(SubCmd(amount=3))
+        with pytest.raises(pydoca.BulkheadFullError):
+            convert.exec(SubCmd(amount=3))  # Threads share the limits
+
+        queued.cancel()  # Leaves the queue
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert Convert.__bulkhead__.queued == 0
+        last = asyncio.create_task(convert.aexec(SubCmd(amount=4)))
+        await asyncio.sleep(0)
+        Convert.release.set()
+        assert await running == 1
+        assert await last == 4
+        assert await Sub().aexec(SubCmd(amount=1)) == -1
+
+    asyncio.run(main())
+    assert Convert.__bulkhead__.in_flight == 0
+
+
+def test_subclass_compiles_its_class_variables(convert):
+    class LimitedConvert(Convert):
+        __bulkhead__ = pydoca.Bulkhead(max_in_flight=1, max_queued=0)
+
+    running = threading.Thread(target=LimitedConvert().exec, args=[SubCmd(amount=1)])
+    running.start()
+    Convert.started.wait()
+    # Not the parent bulkhead
+    assert LimitedConvert.__bulkhead__.in_flight == 1
+    assert Convert.__bulkhead__.in_flight == 0
+    with pytest.raises(pydoca.BulkheadFullError):
+        LimitedConvert().exec(SubCmd(amount=2))
+    Convert.release.set()
+    running.join()
+    assert LimitedConvert.__bulkhead__.in_flight == 0
+
+
+def test_super_exec_calls_the_declared_exec(sink):
+    class Parent(pydoca.UseCase):
+        def exec(self, cmd: SubCmd) -> int:
+            return cmd.amount
+
+    class Child(Parent):
+        def exec(self, cmd: SubCmd) -> int:
+            return super().exec(cmd) + 1
+
+    assert Child().exec(SubCmd(amount=1)) == 2
+
+    def executions(name: str) -> int:
+        return sink.histogram("use_case.exec", use_case=name, command="SubCmd").count
+
+    assert (executions("Parent"), executions("Child")) == (0, 1)
+    assert Parent().exec(SubCmd(amount=1)) == 1
+    assert executions("Parent") == 1